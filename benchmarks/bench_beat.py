@@ -0,0 +1,89 @@
+"""
+Онсеты/бит на синтетическом треке с известной разметкой.
+
+    python -m benchmarks.bench_beat                 # 124 BPM, 60 с
+    python -m benchmarks.bench_beat --bpm 96 --block 1024
+
+Меряет задержку детекции онсета (время hop'а с онсетом минус время удара),
+ошибку темпа, расхождение предсказанных битов с ударами и стоимость hop'а.
+"""
+import argparse
+import time
+import numpy as np
+
+from smartctl.beat import BeatConfig, BeatTracker
+
+
+def synth_track(bpm: float, seconds: float, sr: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    x = (0.002 * rng.normal(size=n)).astype(np.float32)
+    period = 60.0 / bpm
+    kicks = np.arange(0.5, seconds - 0.5, period)
+    t = np.arange(int(0.25 * sr)) / sr
+    kick = (0.6 * np.sin(2 * np.pi * (50.0 + 80.0 * np.exp(-t * 30.0)) * t) * np.exp(-t * 12.0)).astype(np.float32)
+    hat_t = np.arange(int(0.05 * sr)) / sr
+    for k in kicks:
+        i = int(k * sr)
+        m = min(len(kick), n - i)
+        x[i:i + m] += kick[:m]
+        # хай-хэт на слабую долю
+        j = int((k + period / 2) * sr)
+        if j + len(hat_t) < n:
+            x[j:j + len(hat_t)] += (0.08 * rng.normal(size=len(hat_t)) * np.exp(-hat_t * 80.0)).astype(np.float32)
+    return x, kicks
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--bpm", type=float, default=124.0)
+    p.add_argument("--seconds", type=float, default=60.0)
+    p.add_argument("--samplerate", type=int, default=44100)
+    p.add_argument("--hop", type=int, default=256)
+    p.add_argument("--n-fft", type=int, default=1024)
+    p.add_argument("--block", type=int, default=256, help="device block fed to the tracker")
+    args = p.parse_args(argv)
+
+    sr = args.samplerate
+    x, kicks = synth_track(args.bpm, args.seconds, sr)
+    tr = BeatTracker(BeatConfig(n_fft=args.n_fft, hop=args.hop), sr)
+
+    onsets, beats, cost = [], [], []
+    for b0 in range(0, len(x) - args.block + 1, args.block):
+        now = (b0 + args.block) / sr
+        t0 = time.perf_counter()
+        res = tr.feed(x[b0:b0 + args.block], now)
+        cost.append(time.perf_counter() - t0)
+        for r in res:
+            if r["onset"]:
+                onsets.append(r["now"])
+            if r["beat"]:
+                beats.append((r["now"], r["beat_time"]))
+    onsets = np.asarray(onsets)
+    hops_per_block = max(1, args.block // args.hop)
+    us = np.asarray(cost) * 1e6 / hops_per_block
+
+    lat = []
+    for k in kicks:
+        hit = onsets[(onsets >= k) & (onsets < k + 0.1)]
+        if len(hit):
+            lat.append(hit[0] - k)
+    lat_ms = np.asarray(lat) * 1e3
+    settled = [(fired, bt) for fired, bt in beats if bt > 10.0]
+    phase_ms = np.asarray([1e3 * (bt - kicks[np.argmin(np.abs(kicks - bt))]) for _, bt in settled])
+    fire_ms = np.asarray([1e3 * (fired - bt) for fired, bt in settled])
+
+    print(f"bpm={args.bpm} sr={sr} hop={args.hop} n_fft={args.n_fft} block={args.block}")
+    print(f"onsets: detected {len(lat)}/{len(kicks)} kicks, {len(onsets)} total; "
+          f"latency p50={np.percentile(lat_ms, 50):.1f} ms p99={np.percentile(lat_ms, 99):.1f} ms "
+          f"max={lat_ms.max():.1f} ms" if len(lat) else "onsets: none detected")
+    print(f"tempo: estimate={tr.bpm:.2f} BPM  error={tr.bpm - args.bpm:+.2f}  confidence={tr.confidence:.1f}")
+    if len(settled):
+        print(f"beats after 10 s: {len(settled)}  phase vs kick: mean={phase_ms.mean():+.1f} ms "
+              f"|p99|={np.percentile(np.abs(phase_ms), 99):.1f} ms  fired late by p99={np.percentile(fire_ms, 99):.1f} ms")
+    print(f"cost per hop: mean={us.mean():.1f} us p99={np.percentile(us, 99):.1f} us "
+          f"(budget {1e6 * args.hop / sr:.0f} us)")
+
+
+if __name__ == "__main__":
+    main()
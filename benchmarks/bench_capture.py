@@ -0,0 +1,148 @@
+"""
+Захват в процессе против захвата в отдельном процессе (SharedBlockRing) под нагрузкой на GIL.
+
+    python -m benchmarks.bench_capture                         # 20 с, блок 1024, стопоры по 30 мс
+    python -m benchmarks.bench_capture --blocksize 128 --stall-ms 50 --stall-every-ms 200
+
+Звуковой карты не нужно: источник — синтетический "callback", который просыпается по расписанию
+блоков и пишет блок в кольцо, как AudioStream._callback. Основной процесс читает блоки, считает
+RMS и периодически держит GIL stall-ms (как сброс логов или медленная отправка MIDI).
+
+Опоздание callback'а — насколько позже расписания он отработал; опоздание больше device-buffers
+периодов блока на реальном устройстве — потерянный блок (input overflow в PortAudio).
+"""
+import argparse
+import multiprocessing as mp
+import threading
+import time
+from typing import List
+import numpy as np
+
+from smartctl.ringbuf import BlockRing
+from smartctl.shm_ring import SharedBlockRing
+
+
+def _produce(ring, blocksize: int, samplerate: int, seconds: float) -> np.ndarray:
+    period = blocksize / samplerate
+    x = (0.01 * np.random.default_rng(0).normal(size=blocksize)).astype(np.float32)
+    n_blocks = int(seconds / period)
+    late = np.empty(n_blocks)
+    t0 = time.perf_counter()
+    for n in range(n_blocks):
+        target = t0 + (n + 1) * period
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        now = time.perf_counter()
+        late[n] = now - target
+        slot = ring.acquire()
+        if slot is not None:
+            slot[:] = x
+            ring.commit(blocksize, 0.0, 0.0, now)
+    return late
+
+
+def _producer_process(name: str, capacity: int, blocksize: int, samplerate: int, seconds: float, wakeup, out):
+    ring = SharedBlockRing.attach(name, capacity, blocksize, wakeup)
+    late = _produce(ring, blocksize, samplerate, seconds)
+    out.put(late.tobytes())
+    ring.close()
+
+
+def _stall(n: int):
+    # sum по range — цикл на C, GIL не отпускается всё время вызова
+    return sum(range(n))
+
+
+def _calibrate_stall(ms: float) -> int:
+    n = 1_000_000
+    t0 = time.perf_counter()
+    _stall(n)
+    dt = time.perf_counter() - t0
+    return max(1, int(n * ms / 1e3 / dt))
+
+
+def _consume(ring, seconds: float, stall_n: int, stall_every: float) -> List[float]:
+    """Основной цикл: RMS по блоку + периодический захват GIL. Возвращает задержки доставки."""
+    delivery: List[float] = []
+    end = time.perf_counter() + seconds + 0.5
+    next_stall = time.perf_counter() + stall_every
+    while time.perf_counter() < end:
+        blk = ring.read(timeout=0.1)
+        if blk is not None:
+            i = ring.current_slot()
+            delivery.append(time.perf_counter() - float(ring.cb_perf[i]))
+            float(np.sqrt(np.mean(blk * blk)))
+        if stall_n and time.perf_counter() >= next_stall:
+            _stall(stall_n)
+            next_stall += stall_every
+    ring.release()
+    return delivery
+
+
+def run_inprocess(args, stall_n: int):
+    ring = BlockRing(args.ring_blocks, args.blocksize)
+    result = {}
+    t = threading.Thread(target=lambda: result.update(late=_produce(ring, args.blocksize, args.samplerate,
+                                                                    args.seconds)), daemon=True)
+    t.start()
+    delivery = _consume(ring, args.seconds, stall_n, args.stall_every_ms / 1e3)
+    t.join()
+    return result["late"], np.asarray(delivery), ring.overruns
+
+
+def run_process(args, stall_n: int):
+    ctx = mp.get_context("spawn")
+    wakeup = ctx.BoundedSemaphore(1)
+    out = ctx.Queue()
+    ring = SharedBlockRing.create(args.ring_blocks, args.blocksize, wakeup=wakeup)
+    p = ctx.Process(target=_producer_process, args=(ring.name, args.ring_blocks, args.blocksize, args.samplerate,
+                                                    args.seconds, wakeup, out), daemon=True)
+    p.start()
+    # ждём, пока дочерний процесс поднимется, чтобы не считать его запуск задержкой
+    while ring.pending() == 0 and p.is_alive():
+        time.sleep(0.001)
+    delivery = _consume(ring, args.seconds, stall_n, args.stall_every_ms / 1e3)
+    late = np.frombuffer(out.get(timeout=10.0), dtype=np.float64)
+    p.join(timeout=5.0)
+    overruns = ring.overruns
+    ring.close()
+    return late, np.asarray(delivery), overruns
+
+
+def _report(label: str, late: np.ndarray, delivery: np.ndarray, overruns: int, period: float, buffers: int):
+    lost = int(np.count_nonzero(late > buffers * period))
+    ms = late * 1e3
+    print(f"{label:<12} blocks={len(late):5d}  late>{buffers}x{period * 1e3:.1f}ms (device overflow)={lost:4d} "
+          f"({100.0 * lost / max(1, len(late)):.2f}%)  ring overruns={overruns}")
+    print(f"{'':<12} callback lateness p50={np.percentile(ms, 50):.2f} ms  p99={np.percentile(ms, 99):.2f} ms  "
+          f"max={ms.max():.2f} ms   delivery p50={np.percentile(delivery, 50) * 1e3:.2f} ms  "
+          f"p99={np.percentile(delivery, 99) * 1e3:.2f} ms")
+    return lost
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--samplerate", type=int, default=44100)
+    p.add_argument("--blocksize", type=int, default=1024)
+    p.add_argument("--ring-blocks", type=int, default=32)
+    p.add_argument("--seconds", type=float, default=20.0)
+    p.add_argument("--stall-ms", type=float, default=30.0, help="how long the main process holds the GIL")
+    p.add_argument("--stall-every-ms", type=float, default=100.0)
+    p.add_argument("--device-buffers", type=int, default=2,
+                   help="callback lateness (in block periods) that a real device would survive")
+    args = p.parse_args(argv)
+
+    period = args.blocksize / args.samplerate
+    stall_n = _calibrate_stall(args.stall_ms) if args.stall_ms > 0 else 0
+    print(f"sr={args.samplerate} blocksize={args.blocksize} ({period * 1e3:.1f} ms) seconds={args.seconds} "
+          f"GIL stall {args.stall_ms:.0f} ms every {args.stall_every_ms:.0f} ms")
+    lost_in = _report("in-process", *run_inprocess(args, stall_n), period, args.device_buffers)
+    lost_proc = _report("process", *run_process(args, stall_n), period, args.device_buffers)
+    ok = lost_proc <= lost_in
+    print("OK" if ok else "FAIL: capture process lost more blocks than in-process capture")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,146 @@
+"""
+Время восстановления после сбоя входа и перезапуска loopMIDI (DeviceSupervisor на подменных бэкендах).
+
+    python -m benchmarks.bench_failover                        # по 6 сбоев входа и MIDI-порта
+    python -m benchmarks.bench_failover --rounds 20 --fail-opens 3 --down-ms 500 --target-ms 800
+
+Звуковой карты и loopMIDI не нужно (benchmarks/fakes.py). Цикл обработки — как в
+smart_audio_runner: блок -> LevelDetector -> OnOffFSM -> SceneController (cc_gate), между
+блоками — досылка состояния сцены после восстановления MIDI. Сигнал громкий, сцена включена.
+
+Сбой входа: unplug() — callback'и прекращаются, первые --fail-opens переоткрытия не удаются.
+Время — от последнего живого блока до первого блока после переоткрытия.
+Сбой MIDI: порт пропадает на --down-ms и возвращается на другом индексе. Время — от возврата
+порта до момента, когда приёмник снова получил текущее состояние сцены (CC 127).
+
+После каждого сбоя проверяется, что калибровка (baseline) и состояние FSM не потерялись.
+Код выхода 1, если худшее время больше --target-ms или состояние потерялось.
+"""
+import argparse
+import logging
+import threading
+import time
+import numpy as np
+
+from benchmarks.fakes import FakeRtMidi, FakeSoundDevice
+from smartctl.audio_input import AudioStream
+from smartctl.controller import SceneController, SceneTriggerConfig
+from smartctl.detectors import LevelConfig, LevelDetector
+from smartctl.failover import DeviceSupervisor
+from smartctl.midi_io import MidiSender
+from smartctl.state_machine import FSMConfig, OnOffFSM
+
+_CC = 20
+
+
+def _wait(cond, timeout: float, step: float = 0.002) -> bool:
+    deadline = time.perf_counter() + timeout
+    while not cond():
+        if time.perf_counter() >= deadline:
+            return False
+        time.sleep(step)
+    return True
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=6, help="сбоев каждого вида")
+    ap.add_argument("--samplerate", type=int, default=44100)
+    ap.add_argument("--blocksize", type=int, default=1024)
+    ap.add_argument("--stall-ms", type=float, default=250.0)
+    ap.add_argument("--fail-opens", type=int, default=2, help="неудачных переоткрытий входа за сбой (макс.)")
+    ap.add_argument("--down-ms", type=float, default=300.0, help="сколько порт loopMIDI отсутствует")
+    ap.add_argument("--target-ms", type=float, default=1000.0)
+    ap.add_argument("-v", "--verbose", action="store_true", help="логи [Failover]/[MIDI] в консоль")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL, format="%(message)s")
+
+    sd, rt = FakeSoundDevice(), FakeRtMidi()
+    audio = AudioStream(args.samplerate, args.blocksize, 1, device_name="QUAD", backend=sd)
+    midi = MidiSender("loopMIDI", backend=rt)
+    scene = SceneController(midi, SceneTriggerConfig(mode="cc_gate", channel=1, velocity=127, cc=_CC))
+    level_cfg = LevelConfig(ema_alpha=0.3, dynamic_threshold=True, on_multiplier=3.0, off_multiplier=2.0,
+                            min_on_threshold=0.005, min_off_threshold=0.003, on_threshold=0.02, off_threshold=0.01,
+                            startup_grace_seconds=0.0, min_on_seconds=0.05, min_off_seconds=0.2,
+                            silence_hold_seconds=0.3, calibration_seconds=0.3)
+    det = LevelDetector(level_cfg)
+    fsm = OnOffFSM(FSMConfig(0.0, 0.05, 0.2, 0.3, 0.3))
+    sup = DeviceSupervisor(lambda: audio, lambda: midi, stall_seconds=args.stall_ms / 1e3)
+
+    audio.start()
+    sup.start()
+    t0 = time.time()
+    while time.time() - t0 < level_cfg.calibration_seconds:
+        blk = audio.read_block(timeout=0.2)
+        if blk is not None:
+            det.calibrate_step(blk)
+    baseline = det.state.baseline
+    sd.amplitude = 0.2
+
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            for name, _, _ in sup.take_recovered():
+                if name == "midi":
+                    scene.resend()
+            blk = audio.read_block(timeout=0.05)
+            if blk is not None:
+                fsm.step(det.state, det.update(blk), on_event=scene.turn_on, off_event=scene.turn_off)
+
+    worker = threading.Thread(target=loop, name="bench-loop", daemon=True)
+    worker.start()
+    ok = _wait(lambda: scene.is_on, 3.0)
+    if not ok:
+        print("scene never turned on")
+        stop.set()
+        return 1
+
+    rng = np.random.default_rng(0)
+    audio_ms, midi_ms, lost_state = [], [], 0
+    for r in range(args.rounds):
+        # --- вход ---
+        n_before = sup.audio.recoveries
+        sd.unplug(fail_opens=int(rng.integers(0, args.fail_opens + 1)))
+        if not _wait(lambda: sup.audio.recoveries > n_before, 10.0):
+            print(f"round {r}: audio did not recover")
+            lost_state += 1
+            break
+        audio_ms.append(sup.audio.last_outage * 1e3)
+        # --- MIDI ---
+        n_rx = len(rt.received)
+        back_at = rt.restart_port("loopMIDI", down_seconds=args.down_ms / 1e3 * (0.5 + rng.random()))
+        got = _wait(lambda: any(m == [0xB0, _CC, 127] and t >= back_at for t, _, m in rt.received[n_rx:]), 10.0)
+        if not got:
+            print(f"round {r}: scene state was not re-sent")
+            lost_state += 1
+            break
+        t_rx = next(t for t, _, m in rt.received[n_rx:] if m == [0xB0, _CC, 127] and t >= back_at)
+        midi_ms.append((t_rx - back_at) * 1e3)
+        if det.state.baseline != baseline or fsm.state != "ON":
+            lost_state += 1
+        time.sleep(0.2)
+
+    stop.set()
+    worker.join(timeout=1.0)
+    sup.stop()
+    audio.stop()
+    midi.close()
+
+    print(f"rounds={args.rounds} stall={args.stall_ms:.0f}ms fail_opens<={args.fail_opens} "
+          f"port_down~{args.down_ms:.0f}ms; opens={sd.opens} reopen_failures={sup.audio.failed_attempts + sup.midi.failed_attempts}")
+    worst = 0.0
+    for name, xs in (("audio: last block -> first block after reopen", audio_ms),
+                     ("midi: port back -> scene state received", midi_ms)):
+        if xs:
+            a = np.asarray(xs)
+            worst = max(worst, float(a.max()))
+            print(f"  {name:<48} p50={np.percentile(a, 50):7.1f}ms  max={a.max():7.1f}ms  (n={len(a)})")
+    print(f"  calibration/FSM state lost: {lost_state} time(s); MIDI failed={midi.failed} sent={midi.sent}")
+    passed = lost_state == 0 and worst <= args.target_ms and len(audio_ms) == len(midi_ms) == args.rounds
+    print(f"{'PASS' if passed else 'FAIL'}: worst recovery {worst:.1f}ms (target {args.target_ms:.0f}ms)")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,110 @@
+"""
+Выделения памяти и время на блок: даунмикс в callback + RMS детектора (FeatureKernel.block_rms)
+против прежнего пути np.mean(indata, axis=1) + np.sqrt(np.mean(x * x)); для справки — полный
+набор признаков FeatureKernel.compute (пик/crest/ZCR/DC, вне горячего пути).
+
+    python -m benchmarks.bench_features                      # блоки 128/1024/4096, 1 и 2 канала
+    python -m benchmarks.bench_features --blocksizes 256 --channels 4 --numba
+
+Память — tracemalloc: peak — наибольший временный объём сверх исходного за прогон (это и
+есть выделения на блок: всё, что выделено на блок, освобождается до следующего), net —
+сколько осталось после --blocks блоков. Время — лучший из --repeat прогонов, без tracemalloc.
+Код выхода 1, если путь детектора (callback + block_rms) выделяет на блок больше
+--max-peak-bytes или медленнее прежнего пути.
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+
+from smartctl.audio_input import AudioStream
+from smartctl.features import FeatureKernel
+
+
+def _legacy_callback(ring):
+    # прежний AudioStream._callback: тот же путь через кольцо, даунмикс через np.mean
+    def cb(indata):
+        dst = ring.acquire()
+        np.mean(indata, axis=1, out=dst)
+        ring.commit(len(dst), 0.0, 0.0, time.perf_counter())
+        return ring.read(timeout=0)
+    return cb
+
+
+def _legacy_features(x):
+    return float(np.sqrt(np.mean(x * x))) + 1e-12
+
+
+def _measure(step, blocks: int, repeat: int):
+    for _ in range(10):
+        step()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(blocks):
+            step()
+        best = min(best, (time.perf_counter() - t0) / blocks)
+    tracemalloc.start()
+    step()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for _ in range(blocks):
+        step()
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak - base, cur - base
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--blocksizes", type=int, nargs="+", default=[128, 1024, 4096])
+    ap.add_argument("--channels", type=int, nargs="+", default=[1, 2])
+    ap.add_argument("--blocks", type=int, default=2000)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--numba", action="store_true", help="ещё и FeatureKernel(use_numba=True)")
+    ap.add_argument("--max-peak-bytes", type=int, default=4096)
+    args = ap.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    print(f"{'block':>6} {'ch':>3}  {'path':<34} {'us/block':>9} {'peak B':>8} {'net B':>7}")
+    worst, slower = 0, []
+    for bs in args.blocksizes:
+        for ch in args.channels:
+            indata = (0.1 * rng.standard_normal((bs, ch))).astype(np.float32)
+            stream = AudioStream(44100, bs, ch, ring_blocks=8)
+            legacy_cb = _legacy_callback(AudioStream(44100, bs, ch, ring_blocks=8).ring)
+            kernels = [("numpy", FeatureKernel(bs, use_numba=False))]
+            if args.numba:
+                kernels.append(("numba", FeatureKernel(bs, use_numba=True)))
+
+            def legacy():
+                _legacy_features(legacy_cb(indata))
+
+            def detector(kernel=kernels[0][1]):
+                stream._callback(indata, bs, None, None)
+                return kernel.block_rms(stream.ring.read(timeout=0))
+
+            def full(kernel):
+                stream._callback(indata, bs, None, None)
+                kernel.compute(stream.ring.read(timeout=0))
+                return float(kernel.rms)
+
+            rows = [("np.mean downmix + sqrt(mean(x*x))", legacy), ("callback + block_rms (detector)", detector)]
+            rows += [(f"callback + compute[{name}] (all)", (lambda k=k: full(k))) for name, k in kernels]
+            times = {}
+            for name, step in rows:
+                t, peak, net = _measure(step, args.blocks, args.repeat)
+                times[step] = t
+                if step is detector:
+                    worst = max(worst, peak)
+                print(f"{bs:>6} {ch:>3}  {name:<34} {t * 1e6:9.2f} {peak:>8} {net:>7}")
+            if times[detector] > times[legacy]:
+                slower.append(f"bs{bs}/ch{ch}")
+    passed = worst <= args.max_peak_bytes and not slower
+    print(f"{'PASS' if passed else 'FAIL'}: detector path worst per-block allocation peak {worst} B "
+          f"(limit {args.max_peak_bytes} B)" + (f"; slower than the old path at {', '.join(slower)}" if slower else ""))
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
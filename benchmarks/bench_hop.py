@@ -0,0 +1,108 @@
+"""
+hop-режим: стоимость одного hop'а и задержка срабатывания против поблочного режима.
+
+    python -m benchmarks.bench_hop                     # окно 1024, hop 128, 44.1 кГц
+    python -m benchmarks.bench_hop --hop 64 --window 2048
+
+Стоимость — SlidingRms.push + LevelDetector.update_value + OnOffFSM.step на hop и, для сравнения,
+пересчёт RMS всего окна на каждом hop'е. Задержка — от начала тона до ON в FSM на синтетическом
+сигнале (тишина, затем тон) по симулированному времени: блок 1024 против hop'а.
+"""
+import argparse
+import time
+from dataclasses import replace
+import numpy as np
+
+from smartctl.detectors import LevelConfig, LevelDetector
+from smartctl.sliding import SlidingRms, rescale_alpha
+from smartctl.state_machine import FSMConfig, OnOffFSM
+
+LEVEL = LevelConfig(ema_alpha=0.3, dynamic_threshold=False, on_multiplier=4.0, off_multiplier=2.0,
+                    min_on_threshold=0.005, min_off_threshold=0.003, on_threshold=0.02, off_threshold=0.01,
+                    startup_grace_seconds=0.0, min_on_seconds=0.2, min_off_seconds=0.0,
+                    silence_hold_seconds=0.3, calibration_seconds=0.0)
+FSM = FSMConfig(startup_grace_seconds=0.0, min_on_seconds=0.2, min_off_seconds=0.0, silence_hold_seconds=0.3,
+                calibration_seconds=0.0)
+
+
+def _signal(sr: int, seconds: float, onset: float, rng) -> np.ndarray:
+    t = np.arange(int(seconds * sr)) / sr
+    x = 1e-4 * rng.normal(size=t.size)
+    x[t >= onset] += 0.1 * np.sin(2 * np.pi * 220.0 * t[t >= onset])
+    return x.astype(np.float32)
+
+
+def trigger_latency(x: np.ndarray, sr: int, step: int, window: int, onset: float) -> float:
+    """Время от onset до ON; step == window — поблочный режим, иначе hop-режим со скользящим окном."""
+    level = LEVEL if step == window else replace(LEVEL, ema_alpha=rescale_alpha(LEVEL.ema_alpha, window, step))
+    det = LevelDetector(level, clock=lambda: 0.0)
+    fsm = OnOffFSM(FSM, clock=lambda: 0.0)
+    sliding = SlidingRms(window, step)
+    fired = []
+    for end in range(step, len(x) + 1, step):
+        now = end / sr
+        for rms in sliding.push(x[end - step:end]):
+            info = det.update_value(rms, now)
+            fsm.step(det.state, info, on_event=lambda: fired.append(now), off_event=lambda: None)
+        if fired:
+            return fired[0] - onset
+    return float("nan")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--samplerate", type=int, default=44100)
+    p.add_argument("--window", type=int, default=1024)
+    p.add_argument("--hop", type=int, default=128)
+    p.add_argument("--seconds", type=float, default=60.0)
+    args = p.parse_args(argv)
+    sr, hop, window = args.samplerate, args.hop, args.window
+    rng = np.random.default_rng(0)
+
+    # стоимость на hop
+    n_hops = int(args.seconds * sr) // hop
+    x = (0.05 * rng.normal(size=n_hops * hop)).astype(np.float32)
+    blocks = x.reshape(n_hops, hop)
+    level = replace(LEVEL, ema_alpha=rescale_alpha(LEVEL.ema_alpha, window, hop))
+    det = LevelDetector(level)
+    fsm = OnOffFSM(FSM)
+    sliding = SlidingRms(window, hop)
+    noop = lambda: None
+    cost = np.empty(n_hops)
+    for i, blk in enumerate(blocks):
+        t0 = time.perf_counter()
+        for rms in sliding.push(blk):
+            fsm.step(det.state, det.update_value(rms, i), on_event=noop, off_event=noop)
+        cost[i] = time.perf_counter() - t0
+
+    # для сравнения: RMS всего окна заново на каждом hop'е
+    naive = np.empty(n_hops)
+    for i in range(window // hop, n_hops):
+        t0 = time.perf_counter()
+        w = x[(i + 1) * hop - window:(i + 1) * hop]
+        float(np.sqrt(np.mean(w * w)))
+        naive[i] = time.perf_counter() - t0
+    naive = naive[window // hop:]
+
+    budget_us = 1e6 * hop / sr
+    us = cost[64:] * 1e6
+    p50, p99 = np.percentile(us, [50, 99])
+    print(f"sr={sr} window={window} hop={hop} hops={n_hops}")
+    print(f"per-hop (sliding RMS + EMA + FSM): mean={us.mean():.2f} us  p50={p50:.2f} us  p99={p99:.2f} us")
+    print(f"window RMS recomputed per hop:     mean={naive.mean() * 1e6:.2f} us (RMS only)")
+    print(f"budget={budget_us:.1f} us/hop  load={100.0 * us.mean() / budget_us:.2f}% of one core")
+
+    # задержка срабатывания
+    onset = 2.0
+    sig = _signal(sr, 4.0, onset, rng)
+    lat_block = trigger_latency(sig, sr, window, window, onset)
+    lat_hop = trigger_latency(sig, sr, hop, window, onset)
+    print(f"trigger latency (onset -> ON): block {window}: {lat_block * 1e3:.1f} ms   "
+          f"hop {hop}: {lat_hop * 1e3:.1f} ms")
+    ok = p99 < budget_us and lat_hop <= lat_block
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,146 @@
+"""
+Точность отправки MidiScheduler под нагрузкой: опоздание событий и дрожание MIDI clock.
+
+    python -m benchmarks.bench_midi_scheduler                    # 5 с, 2000 событий, clock 128 BPM
+    python -m benchmarks.bench_midi_scheduler --events 20000 --load-threads 2 --spin-ms 1
+
+MIDI-порта не нужно: отправитель записывает момент отправки. Нагрузка — потоки, которые
+держат GIL (чистый Python) и гоняют numpy, как обработка блоков в основном цикле.
+Для сравнения — наивный вариант: поток на time.sleep(t - now) до каждого события по
+отсортированному списку (без добегания).
+
+Отдельно — стоимость постановки и выемки при N ожидающих событиях: куча против линейного
+поиска минимума в списке.
+"""
+import argparse
+import heapq
+import threading
+import time
+from typing import List
+import numpy as np
+
+from smartctl.midi_scheduler import MidiScheduler
+
+
+class _StampingSender:
+    def __init__(self):
+        self.stamps: List[float] = []
+        self.msgs: List[list] = []
+
+    def send_now(self, msg) -> bool:
+        self.stamps.append(time.perf_counter())
+        self.msgs.append(msg)
+        return True
+
+
+def _load(stop: threading.Event, kind: int):
+    x = np.random.default_rng(kind).standard_normal(4096).astype(np.float32)
+    while not stop.is_set():
+        if kind % 2 == 0:
+            s = 0
+            for i in range(20000):   # чистый Python — держит GIL до switch interval
+                s += i * i
+        else:
+            np.sqrt(np.mean(x * x))
+            np.fft.rfft(x)
+
+
+def _naive(times: np.ndarray) -> np.ndarray:
+    sent = np.empty(len(times))
+    for i, t in enumerate(times):
+        d = t - time.perf_counter()
+        if d > 0:
+            time.sleep(d)
+        sent[i] = time.perf_counter()
+    return sent
+
+
+def _pct(a: np.ndarray) -> str:
+    a = a * 1e3
+    return f"p50={np.percentile(a, 50):7.3f}ms  p99={np.percentile(a, 99):7.3f}ms  max={a.max():7.3f}ms"
+
+
+def _bench_queue(n_pending: int, ops: int = 2000):
+    rng = np.random.default_rng(0)
+    base = list(rng.random(n_pending))
+    heap = [(t, i) for i, t in enumerate(base)]
+    heapq.heapify(heap)
+    lst = list(heap)
+    new = rng.random(ops)
+    t0 = time.perf_counter()
+    for i in range(ops):
+        heapq.heappush(heap, (new[i], n_pending + i))
+        heapq.heappop(heap)
+    t_heap = (time.perf_counter() - t0) / ops
+    t0 = time.perf_counter()
+    for i in range(ops):
+        lst.append((new[i], n_pending + i))
+        lst.pop(min(range(len(lst)), key=lst.__getitem__))
+    t_lin = (time.perf_counter() - t0) / ops
+    return t_heap, t_lin
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--events", type=int, default=2000, help="событий со случайными моментами за --seconds")
+    ap.add_argument("--bpm", type=float, default=128.0)
+    ap.add_argument("--latency-ms", type=float, default=10.0, help="задержка порта (события уходят раньше)")
+    ap.add_argument("--spin-ms", type=float, default=None, help="по умолчанию — как у MidiScheduler")
+    ap.add_argument("--load-threads", type=int, default=2)
+    args = ap.parse_args(argv)
+
+    stop = threading.Event()
+    loaders = [threading.Thread(target=_load, args=(stop, i), daemon=True) for i in range(args.load_threads)]
+    for t in loaders:
+        t.start()
+
+    rng = np.random.default_rng(1)
+    sender = _StampingSender()
+    sched = MidiScheduler(spin_seconds=None if args.spin_ms is None else args.spin_ms / 1e3,
+                          max_pending=max(10000, 2 * args.events))
+    lat = args.latency_ms / 1e3
+    sched.add_port("main", sender, lat)
+    sched.start()
+    t0 = time.perf_counter() + 0.2
+    due = np.sort(t0 + lat + rng.random(args.events) * args.seconds)   # момент прихода к приёмнику
+    for i, t in enumerate(due):
+        sched.schedule(float(t), [0x90, i % 128, 100])
+    sched.start_clock(args.bpm, send_start=False)
+    time.sleep(args.seconds + 0.4)
+    sched.stop_clock(send_stop=False)
+    sched.stop()
+
+    stamps = np.asarray(sender.stamps)
+    is_note = np.array([m[0] == 0x90 for m in sender.msgs])
+    note_late = np.sort(stamps[is_note]) - (due - lat)
+    ticks = stamps[~is_note]
+    period = 60.0 / (args.bpm * 24)
+    dev = np.abs(np.diff(ticks) - period)
+
+    naive_late = None
+    if args.events:
+        n = min(args.events, 500)
+        times = np.sort(time.perf_counter() + 0.05 + rng.random(n) * min(args.seconds, 2.0))
+        naive_late = _naive(times) - times
+    stop.set()
+
+    print(f"{args.events} events over {args.seconds:.1f}s + clock {args.bpm:.0f} BPM, "
+          f"spin={sched.spin_seconds * 1e3:.1f}ms, load threads={args.load_threads}")
+    print(f"  scheduler lateness   {_pct(np.abs(note_late))}  (n={len(note_late)})")
+    if naive_late is not None:
+        print(f"  naive sleep-until    {_pct(np.abs(naive_late))}  (n={len(naive_late)})")
+    if len(dev):
+        print(f"  clock |interval - {period * 1e3:.3f}ms|  {_pct(dev)}  (ticks={len(ticks)}, "
+              f"drift={(ticks[-1] - ticks[0]) - (len(ticks) - 1) * period:+.6f}s)")
+    for line in sched.format():
+        print(f"  {line}")
+    print("pending events   heap push+pop   linear min+pop")
+    for n in (100, 1000, 10000):
+        h, l = _bench_queue(n)
+        print(f"  {n:>13}   {h * 1e6:10.2f}us   {l * 1e6:11.2f}us")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,66 @@
+"""
+Пропускная способность оффлайн-реплея LevelDetector + OnOffFSM.
+
+    python -m benchmarks.bench_replay                 # синтетический сет
+    python -m benchmarks.bench_replay --file set.wav  # реальная запись
+"""
+import argparse
+import os
+import tempfile
+import numpy as np
+
+from smartctl import config as cfgmod
+from smartctl.replay import replay_file
+from smartctl.builders import build_level_cfg, build_fsm_cfg
+
+
+def synth_set(path: str, seconds: float, sr: int, seed: int = 0):
+    # шумовой пол + чередование "трек/пауза" по 20/5 секунд
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    out = np.memmap(path, dtype="<f4", mode="w+", shape=(n,))
+    chunk = sr * 5
+    for i, s0 in enumerate(range(0, n, chunk)):
+        s1 = min(n, s0 + chunk)
+        x = rng.normal(0.0, 1e-5, s1 - s0).astype(np.float32)
+        if i % 5 != 4:
+            t = np.arange(s0, s1, dtype=np.float32) / sr
+            x += (0.05 * np.sin(2 * np.pi * 110.0 * t)).astype(np.float32)
+        out[s0:s1] = x
+    out.flush()
+    del out
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--file", help="WAV/raw PCM file (default: synthetic raw float32)")
+    p.add_argument("--minutes", type=float, default=60.0, help="length of the synthetic set")
+    p.add_argument("--config", default="config.yaml")
+    p.add_argument("--blocksize", type=int, default=None)
+    p.add_argument("--batch", action="store_true", help="use the vectorized update_batch path")
+    args = p.parse_args(argv)
+
+    cfg = cfgmod.load(args.config)
+    sr = cfg["audio"]["samplerate"]
+    bs = args.blocksize or cfg["audio"]["blocksize"]
+
+    tmp = None
+    path = args.file
+    if path is None:
+        fd, tmp = tempfile.mkstemp(suffix=".f32")
+        os.close(fd)
+        synth_set(tmp, args.minutes * 60.0, sr)
+        path = tmp
+    try:
+        src, report = replay_file(path, bs, build_level_cfg(cfg), build_fsm_cfg(cfg), raw_samplerate=sr,
+                                  batch=args.batch)
+        print(f"file={args.file or 'synthetic'} sr={src.samplerate} blocksize={bs} "
+              f"path={'batch' if args.batch else 'per-block'}")
+        print(report.format())
+    finally:
+        if tmp is not None:
+            os.remove(tmp)
+
+
+if __name__ == "__main__":
+    main()
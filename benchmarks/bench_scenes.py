@@ -0,0 +1,121 @@
+"""
+Стоимость контроллера сцен на блок и на переключение в зависимости от числа сцен.
+
+    python -m benchmarks.bench_scenes                      # 6..96 сцен, 20000 блоков
+    python -m benchmarks.bench_scenes --scenes 48 --toggle-prob 0.05
+
+MIDI-порта не нужно: сообщения складываются в счётчик. Для сравнения — прямолинейный вариант:
+на каждый блок для каждой сцены проверить источник, группу и cooldown и вызвать
+SceneController.turn_on/turn_off (работа растёт линейно с числом сцен).
+"""
+import argparse
+import logging
+import time
+from typing import List
+import numpy as np
+
+from smartctl.controller import SceneController, SceneTriggerConfig
+from smartctl.scenes import MultiSceneController, SceneRule
+
+
+class _CountingMidi:
+    def __init__(self):
+        self.messages = 0
+
+    def send_batch(self, msgs):
+        self.messages += len(msgs)
+
+
+def make_rules(n_scenes: int, n_sources: int, group_size: int) -> List[SceneRule]:
+    rules = []
+    for i in range(n_scenes):
+        rules.append(SceneRule(
+            name=f"s{i}", source=f"src{i % n_sources}",
+            trigger=SceneTriggerConfig(mode="same_note", channel=1 + i % 16, velocity=127, note=i % 128),
+            priority=i % group_size, group=f"g{i // group_size}" if group_size > 1 else None,
+            cooldown_seconds=0.5 if i % 3 == 0 else 0.0,
+        ))
+    return rules
+
+
+class NaiveScenes:
+    """Линейный вариант: каждый блок обходит все сцены."""
+
+    def __init__(self, midi, rules: List[SceneRule]):
+        self.rules = rules
+        self.scenes = [SceneController(midi, r.trigger) for r in rules]
+        self.blocked_until = [0.0] * len(rules)
+        self.sources = {}
+
+    def step(self, now: float):
+        winners = {}
+        for i, r in enumerate(self.rules):
+            if not self.sources.get(r.source) or now < self.blocked_until[i]:
+                continue
+            key = r.group or r.name
+            if key not in winners or r.priority > self.rules[winners[key]].priority:
+                winners[key] = i
+        chosen = set(winners.values())
+        for i, sc in enumerate(self.scenes):
+            if i in chosen:
+                sc.turn_on()
+            elif sc.is_on:
+                sc.turn_off()
+                self.blocked_until[i] = now + self.rules[i].cooldown_seconds
+
+
+def run(n_scenes: int, n_sources: int, group_size: int, blocks: int, toggle_prob: float, dt: float):
+    rng = np.random.default_rng(0)
+    toggles = rng.random((blocks, n_sources)) < toggle_prob
+    rules = make_rules(n_scenes, n_sources, group_size)
+
+    midi = _CountingMidi()
+    now = [0.0]
+    ctrl = MultiSceneController(midi, rules, clock=lambda: now[0])
+    inputs = [ctrl.inputs[f"src{k}"] for k in range(n_sources)]
+    state = [False] * n_sources
+    t0 = time.perf_counter()
+    for b in range(blocks):
+        now[0] = b * dt
+        for k in np.flatnonzero(toggles[b]).tolist():
+            state[k] = not state[k]
+            inputs[k].set(state[k])
+        ctrl.tick(now[0])
+    t_fast = time.perf_counter() - t0
+
+    naive_midi = _CountingMidi()
+    naive = NaiveScenes(naive_midi, rules)
+    state = [False] * n_sources
+    t0 = time.perf_counter()
+    for b in range(blocks):
+        for k in np.flatnonzero(toggles[b]).tolist():
+            state[k] = not state[k]
+            naive.sources[f"src{k}"] = state[k]
+        naive.step(b * dt)
+    t_naive = time.perf_counter() - t0
+    return t_fast, ctrl.switches, midi.messages, t_naive, naive_midi.messages
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--scenes", type=int, nargs="*", default=[6, 12, 24, 48, 96])
+    p.add_argument("--sources", type=int, default=6)
+    p.add_argument("--group-size", type=int, default=4)
+    p.add_argument("--blocks", type=int, default=20000)
+    p.add_argument("--toggle-prob", type=float, default=0.02, help="per source per block")
+    p.add_argument("--block-ms", type=float, default=23.2)
+    args = p.parse_args(argv)
+    logging.getLogger("player").setLevel(logging.WARNING)
+
+    print(f"{'scenes':>6} {'table us/blk':>13} {'switches':>9} {'us/switch*':>10} {'naive us/blk':>13} "
+          f"{'msgs table/naive':>17}")
+    for n in args.scenes:
+        t_fast, switches, msgs, t_naive, naive_msgs = run(n, args.sources, args.group_size, args.blocks,
+                                                          args.toggle_prob, args.block_ms / 1e3)
+        print(f"{n:6d} {1e6 * t_fast / args.blocks:13.2f} {switches:9d} {1e6 * t_fast / max(1, switches):10.1f} "
+              f"{1e6 * t_naive / args.blocks:13.2f} {msgs:>8d}/{naive_msgs:<8d}")
+    print("* all table-path time divided by the number of switches (includes per-block tick and input toggling)")
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
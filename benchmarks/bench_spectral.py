@@ -0,0 +1,67 @@
+"""
+Стоимость SpectralDetector на один hop в одном потоке.
+
+    python -m benchmarks.bench_spectral                       # 44.1 кГц, hop 256, n_fft 1024
+    python -m benchmarks.bench_spectral --hop 128 --n-fft 2048
+
+Бюджет hop'а — hop / samplerate секунд; детектор успевает, если p99 заметно меньше бюджета.
+"""
+import argparse
+import time
+import numpy as np
+
+from smartctl.detectors import LevelConfig
+from smartctl.spectral import BandSpec, SpectralConfig, SpectralDetector
+
+BANDS = [BandSpec("sub", 20, 60), BandSpec("bass", 60, 250), BandSpec("mid", 250, 4000),
+         BandSpec("high", 4000, 16000)]
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--samplerate", type=int, default=44100)
+    p.add_argument("--hop", type=int, default=256)
+    p.add_argument("--n-fft", type=int, default=1024)
+    p.add_argument("--seconds", type=float, default=60.0)
+    args = p.parse_args(argv)
+
+    sr, hop = args.samplerate, args.hop
+    level_cfg = LevelConfig(ema_alpha=0.3, dynamic_threshold=False, on_multiplier=4.0, off_multiplier=2.0,
+                            min_on_threshold=0.005, min_off_threshold=0.003, on_threshold=0.02,
+                            off_threshold=0.01, startup_grace_seconds=0.5, min_on_seconds=0.2,
+                            min_off_seconds=0.4, silence_hold_seconds=0.3, calibration_seconds=1.0)
+    det = SpectralDetector(SpectralConfig(n_fft=args.n_fft, hop=hop, bands=BANDS), sr,
+                           {b.name: level_cfg for b in BANDS})
+
+    rng = np.random.default_rng(0)
+    n_hops = int(args.seconds * sr) // hop
+    t = np.arange(n_hops * hop, dtype=np.float64) / sr
+    x = (0.1 * np.sin(2 * np.pi * 55.0 * t) * (np.sin(2 * np.pi * 2.0 * t) > 0)
+         + 0.02 * rng.normal(size=t.size)).astype(np.float32)
+    blocks = x.reshape(n_hops, hop)
+
+    # прогрев: FFT-планы, кэши
+    for blk in blocks[:64]:
+        det.feed(blk, now=0.0)
+
+    cost = np.empty(n_hops, dtype=np.float64)
+    now = 0.0
+    for i, blk in enumerate(blocks):
+        now += hop / sr
+        t0 = time.perf_counter()
+        det.feed(blk, now)
+        cost[i] = time.perf_counter() - t0
+
+    budget_us = 1e6 * hop / sr
+    us = cost * 1e6
+    p50, p99 = np.percentile(us, [50, 99])
+    print(f"sr={sr} hop={hop} n_fft={args.n_fft} bands={len(BANDS)} hops={n_hops}")
+    print(f"per-hop: mean={us.mean():.1f} us  p50={p50:.1f} us  p99={p99:.1f} us  max={us.max():.1f} us")
+    print(f"budget={budget_us:.1f} us/hop  load={100.0 * us.mean() / budget_us:.1f}% of one core  "
+          f"realtime x{budget_us / us.mean():.0f}")
+    print("OK: keeps up" if p99 < budget_us else "FAIL: p99 exceeds hop budget")
+    return 0 if p99 < budget_us else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
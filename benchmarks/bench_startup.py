@@ -0,0 +1,156 @@
+"""
+Куда уходит время старта: интерпретатор, импорты, конфиг, поиск устройств, калибровка.
+
+    python -m benchmarks.bench_startup                   # config.yaml, 5 повторов
+    python -m benchmarks.bench_startup --config my.yaml --repeat 10
+
+Импорты и чтение конфига меряются в свежих процессах (как при перезапуске). Поиск MIDI-порта
+и аудиоустройства — с подсказкой из кэша и без неё; если python-rtmidi или sounddevice не
+установлены, строка пропускается. Калибровка — calibration_seconds из конфига против тёплого
+старта с сохранённым baseline.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code: str) -> str:
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return out.stdout.strip()
+
+
+def _timed_subprocess(code: str, repeat: int) -> float:
+    """Медиана времени в мс, которое печатает код (последняя строка stdout)."""
+    return statistics.median(float(_run(code).splitlines()[-1]) for _ in range(repeat))
+
+
+def interpreter_ms(repeat: int) -> float:
+    ts = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        ts.append((time.perf_counter() - t0) * 1e3)
+    return statistics.median(ts)
+
+
+def import_breakdown(module: str) -> Dict[str, float]:
+    """Совокупное время импорта (мс) самого модуля и его прямых импортов по -X importtime."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stderr
+    top: Dict[str, float] = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue   # строка заголовка
+        # вложенность — по два пробела отступа в имени
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        if depth <= 1 and name.strip() != "site":   # site — часть старта интерпретатора
+            top[name.strip()] = int(cumulative) / 1e3
+    return top
+
+
+def config_load_ms(config: str, repeat: int) -> Dict[str, float]:
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, "config.yaml")
+        shutil.copy(config, path)
+        code = ("import time; t=time.perf_counter(); from smartctl import config as c; c.load(%r); "
+                "print((time.perf_counter()-t)*1e3)" % path)
+        cold = []
+        for _ in range(repeat):
+            shutil.rmtree(os.path.join(tmp, "__pycache__"), ignore_errors=True)
+            cold.append(float(_run(code)))
+        cached = _timed_subprocess(code, repeat)
+        return {"cold (yaml)": statistics.median(cold), "cached (marshal)": cached}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def midi_discovery_ms(substr: str, repeat: int):
+    code = ("import time, logging; logging.disable(logging.INFO)\n"
+            "from smartctl.midi_io import MidiSender\n"
+            "m = MidiSender(%r, threaded=False); hint = (m.port_index, m.port_name); m.close()\n"
+            "t = time.perf_counter(); MidiSender(%r, threaded=False).close(); t1 = time.perf_counter()\n"
+            "MidiSender(%r, threaded=False, port_hint=hint).close(); t2 = time.perf_counter()\n"
+            "print((t1 - t) * 1e3, (t2 - t1) * 1e3)") % (substr, substr, substr)
+    try:
+        runs = [tuple(map(float, _run(code).split())) for _ in range(repeat)]
+    except subprocess.CalledProcessError as e:
+        return None, (e.stderr.strip().splitlines() or ["failed"])[-1]
+    return (statistics.median(r[0] for r in runs), statistics.median(r[1] for r in runs)), None
+
+
+def audio_discovery_ms(repeat: int):
+    code = ("import time\n"
+            "t = time.perf_counter(); import sounddevice as sd; t1 = time.perf_counter()\n"
+            "devs = sd.query_devices(); t2 = time.perf_counter()\n"
+            "i = next((k for k, d in enumerate(devs) if d['max_input_channels'] > 0), 0)\n"
+            "sd.query_devices(i); t3 = time.perf_counter()\n"
+            "print((t1 - t) * 1e3, (t2 - t1) * 1e3, (t3 - t2) * 1e3)")
+    try:
+        runs = [tuple(map(float, _run(code).split())) for _ in range(repeat)]
+    except subprocess.CalledProcessError as e:
+        return None, (e.stderr.strip().splitlines() or ["failed"])[-1]
+    return tuple(statistics.median(r[k] for r in runs) for k in range(3)), None
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--config", default=os.path.join(ROOT, "config.yaml"))
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--top", type=int, default=8, help="how many top-level imports to list")
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, ROOT)
+    from smartctl import config as cfgmod
+    cfg = cfgmod.load(args.config)
+
+    rows: List[tuple] = []
+    rows.append(("interpreter (python -c pass)", interpreter_ms(args.repeat)))
+    runner = import_breakdown("smart_audio_runner")
+    rows.append(("import smart_audio_runner", runner.get("smart_audio_runner", float("nan"))))
+    for name, ms in sorted(((n, v) for n, v in runner.items() if n != "smart_audio_runner"),
+                           key=lambda x: -x[1])[:args.top]:
+        rows.append((f"  {name}", ms))
+    for k, v in config_load_ms(args.config, args.repeat).items():
+        rows.append((f"config load, {k}", v))
+
+    midi, err = midi_discovery_ms(cfg["midi"]["output_port_name_contains"], args.repeat)
+    if midi is None:
+        rows.append(("MIDI port discovery", f"skipped: {err}"))
+    else:
+        rows.append(("MIDI open, enumerate ports", midi[0]))
+        rows.append(("MIDI open, cached port hint", midi[1]))
+    audio, err = audio_discovery_ms(args.repeat)
+    if audio is None:
+        rows.append(("audio device discovery", f"skipped: {err}"))
+    else:
+        rows.append(("import sounddevice (PortAudio init)", audio[0]))
+        rows.append(("query_devices(), full list", audio[1]))
+        rows.append(("query_devices(index), cached hint", audio[2]))
+
+    calib = float(cfg["audio"]["calibration_seconds"]) * 1e3
+    grace = float(cfg["logic"]["startup_grace_seconds"]) * 1e3
+    rows.append(("calibration (cold start)", calib))
+    rows.append(("calibration (warm start)", 0.0))
+    rows.append(("startup grace (both)", grace))
+
+    width = max(len(r[0]) for r in rows)
+    for name, v in rows:
+        print(f"{name:<{width}}  " + (f"{v:9.1f} ms" if isinstance(v, float) else v))
+    print("\nThe runner logs the same breakdown for a real start as '[Startup] live in ...'.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,437 @@
+"""
+Регрессионный набор для горячего пути: callback захвата, LevelDetector, OnOffFSM, переключение
+сцены и кодирование MIDI — по размерам блока и числу каналов, на подменных sounddevice/rtmidi
+(benchmarks.fakes), без звуковой карты и loopMIDI.
+
+    python -m benchmarks.bench_suite                              # прогон и сравнение с baseline.json
+    python -m benchmarks.bench_suite --json out.json              # результаты ещё и в файл ("-" — stdout)
+    python -m benchmarks.bench_suite --update-baseline            # записать текущие цифры как baseline
+    python -m benchmarks.bench_suite --only callback level. --blocksizes 1024
+
+Каждый случай — одна операция (вызов callback с чтением блока из кольца, update детектора,
+шаг FSM, пара включить+выключить сцены, одно MIDI-сообщение). Время — лучший из --repeat
+прогонов timeit (сборщик мусора выключен; прогоны чередуются между случаями), в
+микросекундах на операцию.
+
+Сравнение с baseline: случай считается регрессией, если он медленнее baseline больше чем на
+--tolerance (доля) и при этом больше чем на --slack-us (чтобы дрожание субмикросекундных
+случаев не валило прогон). Baseline предварительно умножается на медиану отношений
+"сейчас / baseline" по всем случаям: общая медлительность машины (частота, нагрузка, другой
+процессор) регрессией не считается, а замедление отдельного участка на этом фоне видно.
+Обратная сторона — равномерное замедление всего сразу так не ловится (--no-scale).
+Случаи с регрессией перемеряются --recheck раз (вдвое больше прогонов), засчитывается лучшее.
+Код выхода 1 при регрессии.
+
+Перед замером пакетный путь догоняющего цикла сверяется с поблочным (check_batch):
+update_batch() против update() — и с шумовым фоном, и в hop-режиме, — и его выход через
+TelemetryRing.record_batch и async_runner.level_event. Расхождение — код выхода 1 без замера и без записи baseline
+(--no-check — пропустить сверку).
+
+Baseline всё равно зависит от машины: его записывают на той машине (или той же модели), где
+прогон потом сравнивают, — в meta лежат платформа, процессор и версии Python/numpy, при
+расхождении печатается предупреждение.
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import platform
+import sys
+import timeit
+from dataclasses import replace
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+from benchmarks.fakes import FakeRtMidi, FakeSoundDevice
+from smartctl.audio_input import AudioStream
+from smartctl.controller import SceneController, SceneTriggerConfig
+from smartctl.detectors import LevelConfig, LevelDetector, LevelState
+from smartctl.midi_io import MidiSender
+from smartctl.replay import SimClock
+from smartctl.state_machine import FSMConfig, OnOffFSM
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# поправка на скорость машины — только когда случаев достаточно, чтобы медиана что-то значила
+_MIN_SCALE_CASES = 8
+
+_LEVEL = LevelConfig(ema_alpha=0.3, dynamic_threshold=True, on_multiplier=4.0, off_multiplier=2.5,
+                     min_on_threshold=0.002, min_off_threshold=0.001, on_threshold=0.02, off_threshold=0.01,
+                     startup_grace_seconds=0.5, min_on_seconds=0.2, min_off_seconds=0.4,
+                     silence_hold_seconds=0.4, calibration_seconds=1.0)
+_FSM = FSMConfig(0.5, 0.2, 0.4, 0.4, 1.0)
+_TRIGGERS = {
+    "same_note": SceneTriggerConfig(mode="same_note", channel=1, velocity=127, note=60),
+    "separate_notes": SceneTriggerConfig(mode="separate_notes", channel=1, velocity=127, note_on=60, note_off=61),
+    "cc_gate": SceneTriggerConfig(mode="cc_gate", channel=1, velocity=127, cc=20),
+}
+
+Case = Tuple[str, Callable[[], None]]
+
+
+def _fake_midi() -> MidiSender:
+    rt = FakeRtMidi()
+    midi = MidiSender("loopMIDI", threaded=False, backend=rt)
+    # received растёт на каждое сообщение — для замера хватит последнего
+    rt.received = collections.deque(maxlen=1)
+    return midi
+
+
+def callback_cases(blocksizes: List[int], channels: List[int]) -> List[Case]:
+    """AudioStream._callback с блоком от FakeSoundDevice; чтение из кольца — чтобы оно не переполнялось."""
+    cases = []
+    sd = FakeSoundDevice(amplitude=0.1)
+    for bs in blocksizes:
+        for ch in channels:
+            mono = sd.next_block(bs, 44100)
+            indata = np.ascontiguousarray(np.repeat(mono[:, None], ch, axis=1))
+            for levels in ([False, True] if ch > 1 else [False]):
+                stream = AudioStream(44100, bs, ch, ring_blocks=8, channel_levels=levels, backend=sd)
+
+                def step(stream=stream, indata=indata, bs=bs):
+                    stream._callback(indata, bs, None, None)
+                    stream.ring.read(timeout=0)
+
+                name = "callback_levels" if levels else "callback"
+                cases.append((f"{name}/bs{bs}/ch{ch}", step))
+    return cases
+
+
+def level_cases(blocksizes: List[int]) -> List[Case]:
+    cases = []
+    rng = np.random.default_rng(0)
+    for bs in blocksizes:
+        block = (0.05 * rng.standard_normal(bs)).astype(np.float32)
+        clock = SimClock()
+        det = LevelDetector(_LEVEL, clock=clock)
+        det.calibrate_step(block)
+
+        def update(det=det, block=block, clock=clock):
+            clock.t += 0.01
+            det.update(block)
+
+        cases.append((f"level.update/bs{bs}", update))
+        cal = LevelDetector(_LEVEL, clock=SimClock())
+        cases.append((f"level.calibrate_step/bs{bs}", lambda cal=cal, block=block: cal.calibrate_step(block)))
+    return cases
+
+
+def fsm_cases() -> List[Case]:
+    """OnOffFSM.step: громко/тихо по 2 с на блоках 23 мс — FSM и включается, и выключается."""
+    dt, period = 0.023, 87
+    clock = SimClock()
+    fsm = OnOffFSM(_FSM, clock=clock)
+    state = LevelState(started_at=0.0)
+    info = {"now": 0.0}
+    n = [0]
+    noop = lambda: None
+
+    def step():
+        i = n[0] = n[0] + 1
+        now = info["now"] = clock.t = i * dt
+        if (i // period) & 1:
+            if state.above_since is None:
+                state.above_since, state.below_since = now, None
+        elif state.below_since is None:
+            state.below_since, state.above_since = now, None
+        fsm.step(state, info, noop, noop)
+
+    return [("fsm.step", step)]
+
+
+def scene_cases() -> List[Case]:
+    """SceneController: включить + выключить (два перехода) через MidiSender на FakeRtMidi."""
+    cases = []
+    for mode, trig in _TRIGGERS.items():
+        scene = SceneController(_fake_midi(), trig)
+
+        def toggle(scene=scene):
+            scene.turn_on()
+            scene.turn_off()
+
+        cases.append((f"scene.on_off/{mode}", toggle))
+    return cases
+
+
+def midi_cases() -> List[Case]:
+    """Одно сообщение MidiSender (сборка байтов + отправка в порт) без потока отправки."""
+    midi = _fake_midi()
+    return [("midi.note_on", lambda: midi.note_on(60, 127, 1)),
+            ("midi.note_off", lambda: midi.note_off(60, 1)),
+            ("midi.cc", lambda: midi.cc(20, 64, 1))]
+
+
+def all_cases(blocksizes: List[int], channels: List[int]) -> List[Case]:
+    return (callback_cases(blocksizes, channels) + level_cases(blocksizes) + fsm_cases()
+            + scene_cases() + midi_cases())
+
+
+def _close(a, b, scale, n: int = 4) -> bool:
+    """
+    a и b совпадают до n ulp от scale — самого большого уровня прогона: ошибка склейки EMA
+    абсолютная, на тихих блоках после громких она больше ulp самого значения.
+    """
+    return bool(np.all(np.abs(np.asarray(a) - np.asarray(b)) <= n * np.spacing(scale)))
+
+
+def _check_variant(variant: str, blocks: np.ndarray, times: np.ndarray, peak: float, chunk: int) -> List[str]:
+    """Один вариант цепочки (plain / noise_floor / hop): поблочный путь и пакеты по chunk блоков."""
+    from smartctl.async_runner import level_event
+    from smartctl.noise_floor import NoiseFloor
+    from smartctl.sliding import SlidingRms
+    from smartctl.telemetry import TelemetryRing
+
+    n_blocks, bs = blocks.shape
+    if variant == "hop":
+        # блок устройства — hop, окно RMS — исходный блок; уровни по hop'ам
+        hop = bs // 4
+        blocks = blocks.reshape(-1, hop)
+        times = times[0] + np.arange(len(blocks)) * (hop / 44100)
+        n_blocks = len(blocks)
+    level_cfg = _LEVEL
+    if variant == "noise_floor":
+        # минимумы ниже фона — иначе пороги стоят на min_*_threshold и фон их не двигает
+        level_cfg = replace(_LEVEL, min_on_threshold=1e-5, min_off_threshold=5e-6)
+    clock = SimClock()
+    dets, slidings = [], []
+    for _ in range(2):
+        nf = NoiseFloor(50, percentile=10.0, max_rate_db_per_s=6.0) if variant == "noise_floor" else None
+        d = LevelDetector(level_cfg, clock=clock if not dets else SimClock(), noise_floor=nf)
+        d.calibrate_step(blocks[0])
+        dets.append(d)
+        slidings.append(SlidingRms(window=bs, hop=bs // 4) if variant == "hop" else None)
+    ref, det = dets
+    # телеметрия меньше прогона — record_batch проходит и через перенос по кольцу
+    ring_ref, ring_batch = TelemetryRing(n_blocks // 3), TelemetryRing(n_blocks // 3)
+    infos = []
+    for i, blk in enumerate(blocks):
+        clock.t = times[i]
+        if slidings[0] is None:
+            info = ref.update(blk)
+        else:
+            (level,) = slidings[0].push(blk)
+            info = ref.update_value(level, times[i])
+        info.update(above_since=ref.state.above_since, below_since=ref.state.below_since)
+        infos.append(info)
+    for s in range(0, n_blocks, chunk):
+        part, ts = infos[s:s + chunk], times[s:s + chunk]
+        k = len(part)
+        on = bool((s // chunk) % 2)   # FSM в пакете известна только на конец — одно значение на кусок
+        if slidings[1] is None:
+            b = det.update_batch(blocks[s:s + chunk], ts)
+        else:
+            b = det.update_values(slidings[1].push_many(blocks[s:s + chunk]), ts)
+        ok = len(b["rms"]) == k
+        ok = ok and np.array_equal(b["rms"], [p["rms"] for p in part]) and np.array_equal(b["now"], ts)
+        ok = ok and _close(b["smooth"], [p["smooth"] for p in part], peak)
+        for key in ("on_th", "off_th"):
+            ok = ok and np.array_equal(np.broadcast_to(b[key], (k,)), [p[key] for p in part])
+        for key in ("above_since", "below_since"):
+            want = np.array([np.nan if p[key] is None else p[key] for p in part])
+            ok = ok and np.array_equal(b[key], want, equal_nan=True)
+        if not ok:
+            return [f"batch differs from per-block in blocks {s}..{s + k - 1}"]
+        ring_batch.record_batch(b, on)
+        for p in part:
+            ring_ref.record(p["now"], p["rms"], p["smooth"], p["on_th"], p["off_th"], on)
+        ev_batch, ev_ref = level_event(b, on), level_event(part[-1], on)
+        smooth_b, smooth_r = ev_batch.pop("smooth"), ev_ref.pop("smooth")
+        # событие уходит в JSON (UDP/WebSocket): только числа Python, не numpy
+        if (ev_batch != ev_ref or not _close(smooth_b, smooth_r, peak)
+                or any(type(v) not in (str, float, bool) for v in ev_batch.values())):
+            return [f"level_event of a batch {ev_batch} != last per-block {ev_ref}"]
+    errors = []
+    if not _close(ref.state.smooth, det.state.smooth, peak) or ref.state.baseline != det.state.baseline:
+        errors.append(f"final state {det.state} != {ref.state}")
+    got, want = ring_batch.snapshot(), ring_ref.snapshot()
+    same = all(np.array_equal(got[f], want[f]) for f in ("t", "rms", "on_th", "off_th", "on"))
+    if not same or not _close(got["smooth"], want["smooth"], np.float32(peak), 1) or ring_batch.written != ring_ref.written:
+        errors.append("TelemetryRing.record_batch differs from per-block record()")
+    return errors
+
+
+def check_batch(blocksizes: List[int], n_blocks: int = 240, chunk: int = 7) -> List[str]:
+    """
+    Пакетный путь догоняющего цикла против поблочного, на сигнале с паузами (пороги
+    пересекаются в обе стороны): update_batch() кусками по chunk блоков против update(),
+    то же с шумовым фоном (пороги по блокам) и в hop-режиме (push_many + update_values против
+    push + update_value); выход пакета — через TelemetryRing.record_batch и
+    async_runner.level_event. RMS, пороги и отметки времени должны совпасть бит в бит,
+    smooth (EMA считается иначе) — до нескольких ulp (~1e-17 при уровнях порядка 0.1).
+    Возвращает описания расхождений (пусто — всё сходится).
+    """
+    errors = []
+    rng = np.random.default_rng(1)
+    for bs in blocksizes:
+        # 20 блоков громко / 20 тихо; громкость плавает, чтобы EMA не стояла на месте
+        loud = np.repeat((np.arange(n_blocks) // 20) % 2 == 1, bs).reshape(n_blocks, bs)
+        amp = np.where(loud, 0.05 + 0.05 * rng.random((n_blocks, 1)), 0.0002)
+        blocks = (amp * rng.standard_normal((n_blocks, bs))).astype(np.float32)
+        times = 1.0 + np.arange(n_blocks) * (bs / 44100)
+        peak = float(np.abs(blocks).max())
+        for variant in ("plain", "noise_floor", "hop"):
+            errors += [f"bs{bs}/{variant}: {e}" for e in _check_variant(variant, blocks, times, peak, chunk)]
+    return errors
+
+
+def _number(timer: timeit.Timer, min_time: float) -> int:
+    """Число операций в прогоне, чтобы он длился не меньше min_time."""
+    number = 1
+    while True:
+        t = timer.timeit(number)
+        if t >= min_time:
+            return number
+        number = max(number * 2, int(number * min_time / max(t, 1e-9) * 1.2))
+
+
+def measure(cases: List[Case], repeat: int, min_time: float) -> Dict[str, Tuple[float, int]]:
+    """
+    Лучшее время одной операции (с) для каждого случая и число операций в прогоне. Прогоны идут
+    кругами по всем случаям, а не подряд для одного: если машину на время заняло что-то
+    постороннее, это портит по одному прогону у многих случаев, а не все прогоны одного.
+    """
+    timers = [(name, timeit.Timer(step)) for name, step in cases]
+    numbers = {name: _number(timer, min_time) for name, timer in timers}
+    best = {name: float("inf") for name, _ in timers}
+    for _ in range(repeat):
+        for name, timer in timers:
+            best[name] = min(best[name], timer.timeit(numbers[name]))
+    return {name: (best[name] / numbers[name], numbers[name]) for name, _ in timers}
+
+
+def meta() -> Dict[str, str]:
+    return {"platform": platform.platform(), "machine": platform.machine(),
+            "processor": platform.processor() or platform.machine(), "cpus": str(os.cpu_count()),
+            "python": platform.python_version(), "numpy": np.__version__}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float, slack_us: float,
+            scale: float = 1.0) -> Dict[str, str]:
+    """Статус каждого случая: ok / REGRESSION / faster / new. scale — скорость машины относительно baseline."""
+    status = {}
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            status[name] = "new"
+            continue
+        expected = b["us"] * scale
+        if r["us"] > expected * (1.0 + tolerance) and r["us"] - expected > slack_us:
+            status[name] = "REGRESSION"
+        elif r["us"] < expected / (1.0 + tolerance):
+            status[name] = "faster"
+        else:
+            status[name] = "ok"
+    return status
+
+
+def _load(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--blocksizes", type=int, nargs="+", default=[128, 512, 1024, 4096])
+    ap.add_argument("--channels", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--only", nargs="+", default=None, help="только случаи, в имени которых есть подстрока")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--min-time", type=float, default=0.05, help="длительность одного прогона, с")
+    ap.add_argument("--recheck", type=int, default=2, help="сколько раз перемерить случаи с регрессией")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--update-baseline", action="store_true", help="записать результаты в --baseline")
+    ap.add_argument("--tolerance", type=float, default=0.5, help="допустимое замедление, доля")
+    ap.add_argument("--slack-us", type=float, default=0.5, help="замедление меньше этого не считается")
+    ap.add_argument("--no-scale", action="store_true", help="не поправлять baseline на скорость машины (медиану)")
+    ap.add_argument("--json", default=None, help="куда записать результаты (- — stdout)")
+    ap.add_argument("--no-check", action="store_true", help="не сверять пакетный путь с поблочным перед замером")
+    args = ap.parse_args(argv)
+    logging.getLogger("player").setLevel(logging.WARNING)
+    logging.getLogger("audio_diag").setLevel(logging.WARNING)
+
+    cases = all_cases(args.blocksizes, args.channels)
+    if args.only:
+        cases = [(n, s) for n, s in cases if any(o in n for o in args.only)]
+    if not cases:
+        print("no cases selected", file=sys.stderr)
+        return 2
+    by_name = dict(cases)
+
+    if not args.no_check:
+        # быстрый, но неверный пакетный путь не должен попасть ни в замер, ни в baseline
+        errors = check_batch(args.blocksizes)
+        for e in errors:
+            print(f"CHECK FAILED: {e}", file=sys.stderr)
+        if errors:
+            return 1
+
+    doc = {} if args.update_baseline else _load(args.baseline)
+    base: Dict[str, Dict] = doc.get("results", {})
+    cur_meta = meta()
+    differ = [k for k in ("machine", "processor", "cpus", "python", "numpy")
+              if doc.get("meta") and doc["meta"].get(k) != cur_meta[k]]
+    if differ:
+        print(f"WARNING: baseline recorded on a different setup ({', '.join(differ)}); "
+              f"consider --update-baseline on this machine", file=sys.stderr)
+
+    results: Dict[str, Dict] = {}
+    for name, (t, number) in measure(cases, args.repeat, args.min_time).items():
+        results[name] = {"us": round(t * 1e6, 4), "number": number, "repeat": args.repeat}
+    scale = 1.0
+    common = [n for n in results if n in base]
+    if len(common) >= _MIN_SCALE_CASES and not args.no_scale:
+        scale = float(np.median([results[n]["us"] / base[n]["us"] for n in common]))
+    status = compare(results, base, args.tolerance, args.slack_us, scale) if base else {}
+    for _ in range(args.recheck):
+        suspects = [n for n, s in status.items() if s == "REGRESSION"]
+        if not suspects:
+            break
+        # замедление должно повториться: перемеряем только подозрительные и берём лучшее
+        for name, (t, number) in measure([(n, by_name[n]) for n in suspects], 2 * args.repeat, args.min_time).items():
+            results[name]["us"] = round(min(results[name]["us"], t * 1e6), 4)
+        status.update(compare({n: results[n] for n in suspects}, base, args.tolerance, args.slack_us, scale))
+    regressions = sorted(n for n, s in status.items() if s == "REGRESSION")
+
+    out = sys.stderr if args.json == "-" else sys.stdout
+    print(f"{'case':<30} {'us/op':>9} {'baseline':>9} {'ratio':>6}  status", file=out)
+    for name, r in results.items():
+        b = base.get(name)
+        b_txt = f"{b['us'] * scale:9.3f}" if b else f"{'-':>9}"
+        r_txt = f"{r['us'] / (b['us'] * scale):6.2f}" if b else f"{'-':>6}"
+        print(f"{name:<30} {r['us']:9.3f} {b_txt} {r_txt}  {status.get(name, '-')}", file=out)
+    if scale != 1.0:
+        print(f"baseline scaled by x{scale:.3f} (median ratio: machine speed now vs baseline)", file=out)
+
+    report = {"meta": cur_meta, "results": results}
+    if base:
+        report["comparison"] = {"baseline": args.baseline, "scale": round(scale, 4), "tolerance": args.tolerance,
+                                "slack_us": args.slack_us, "status": status, "regressions": regressions}
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        # при --only обновляются только выбранные случаи, остальные берутся из старого файла
+        merged = _load(args.baseline).get("results", {})
+        merged.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"meta": cur_meta, "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written: {args.baseline} ({len(results)} case(s))", file=out)
+        return 0
+    if not base:
+        print(f"no baseline at {args.baseline}; run with --update-baseline to record one", file=out)
+        return 0
+    if regressions:
+        print(f"FAIL: {len(regressions)} regression(s): {', '.join(regressions)}", file=out)
+        return 1
+    print(f"PASS: {len(results)} case(s) within {args.tolerance:.0%} (+{args.slack_us} us) of baseline", file=out)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
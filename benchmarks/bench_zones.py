@@ -0,0 +1,123 @@
+"""
+Зоны по входным каналам: цена блока ZoneDetector (все зоны одним шагом) против отдельного
+LevelDetector + OnOffFSM на каждую зону, от 1 до 8 каналов (зона на канал).
+
+    python -m benchmarks.bench_zones
+    python -m benchmarks.bench_zones --channels 1 2 4 8 16 --seconds 120
+
+Сигнал синтетический: у каждого канала свои пачки громкого звука поверх шума, время — по
+блокам (SimClock), поэтому переключения воспроизводимы. Для каждого числа каналов проверяется,
+что ZoneDetector даёт те же переключения, что и набор отдельных детекторов. Отдельно — цена
+callback'а AudioStream с channel_levels (даунмикс + средний квадрат по каналам).
+Код выхода 1, если переключения разошлись.
+"""
+import argparse
+import time
+from typing import List
+import numpy as np
+
+from smartctl.audio_input import AudioStream
+from smartctl.detectors import LevelConfig, LevelDetector
+from smartctl.replay import SimClock
+from smartctl.state_machine import FSMConfig, OnOffFSM
+from smartctl.zones import ZoneDetector, ZoneSpec
+
+_LEVEL = LevelConfig(ema_alpha=0.3, dynamic_threshold=True, on_multiplier=4.0, off_multiplier=2.5,
+                     min_on_threshold=0.002, min_off_threshold=0.001, on_threshold=0.02, off_threshold=0.01,
+                     startup_grace_seconds=0.5, min_on_seconds=0.2, min_off_seconds=0.4,
+                     silence_hold_seconds=0.4, calibration_seconds=1.0)
+_FSM = FSMConfig(0.5, 0.2, 0.4, 0.4, 1.0)
+
+
+def synth_chan_ms(n_blocks: int, n_ch: int, dt: float, seed: int = 0) -> np.ndarray:
+    """Средний квадрат по каналам на блок: шум 1e-4 и у каждого канала свои пачки 2-10 с."""
+    rng = np.random.default_rng(seed)
+    level = np.full((n_blocks, n_ch), 1e-4)
+    for c in range(n_ch):
+        t = 1.5 + rng.uniform(0, 3)
+        while t < n_blocks * dt:
+            dur = rng.uniform(2, 10)
+            i0, i1 = int(t / dt), int((t + dur) / dt)
+            level[i0:i1, c] = rng.uniform(0.02, 0.2)
+            t += dur + rng.uniform(2, 10)
+    level *= rng.uniform(0.7, 1.3, size=level.shape)
+    return (level * level).astype(np.float32)
+
+
+def run_vector(ms: np.ndarray, dt: float, calib_blocks: int):
+    clock = SimClock()
+    n_ch = ms.shape[1]
+    z = ZoneDetector([ZoneSpec(f"z{c}", [c]) for c in range(n_ch)], n_ch, [_LEVEL] * n_ch, _FSM, clock=clock)
+    ev: List[tuple] = []
+    on = lambda j: ev.append((round(clock(), 6), j, "on"))
+    off = lambda j: ev.append((round(clock(), 6), j, "off"))
+    t0 = time.perf_counter()
+    for i, row in enumerate(ms):
+        clock.t = (i + 1) * dt
+        if i < calib_blocks:
+            z.calibrate_step(row)
+        else:
+            z.update(row, on, off, clock.t)
+    return time.perf_counter() - t0, ev
+
+
+def run_loop(ms: np.ndarray, dt: float, calib_blocks: int):
+    clock = SimClock()
+    n_ch = ms.shape[1]
+    dets = [LevelDetector(_LEVEL, clock=clock) for _ in range(n_ch)]
+    fsms = [OnOffFSM(_FSM, clock=clock) for _ in range(n_ch)]
+    ev: List[tuple] = []
+    handlers = [(lambda c=c: ev.append((round(clock(), 6), c, "on")),
+                 lambda c=c: ev.append((round(clock(), 6), c, "off"))) for c in range(n_ch)]
+    t0 = time.perf_counter()
+    for i, row in enumerate(ms):
+        clock.t = (i + 1) * dt
+        rms = np.sqrt(row.astype(np.float64)) + 1e-12
+        for c in range(n_ch):
+            if i < calib_blocks:
+                dets[c].calibrate_value(float(rms[c]))
+            else:
+                info = dets[c].update_value(float(rms[c]), clock.t)
+                fsms[c].step(dets[c].state, info, on_event=handlers[c][0], off_event=handlers[c][1])
+    return time.perf_counter() - t0, ev
+
+
+def callback_cost(bs: int, n_ch: int, blocks: int = 2000) -> float:
+    stream = AudioStream(44100, bs, n_ch, ring_blocks=8, channel_levels=True)
+    indata = (0.1 * np.random.default_rng(0).standard_normal((bs, n_ch))).astype(np.float32)
+    t0 = time.perf_counter()
+    for _ in range(blocks):
+        stream._callback(indata, bs, None, None)
+        stream.ring.read(timeout=0)
+    return (time.perf_counter() - t0) / blocks
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--channels", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--seconds", type=float, default=60.0, help="длина синтетического сигнала")
+    ap.add_argument("--samplerate", type=int, default=44100)
+    ap.add_argument("--blocksize", type=int, default=1024)
+    args = ap.parse_args(argv)
+
+    dt = args.blocksize / args.samplerate
+    n_blocks = int(args.seconds / dt)
+    calib = int(_LEVEL.calibration_seconds / dt)
+    print(f"{n_blocks} blocks of {args.blocksize} ({dt * 1e3:.1f} ms)")
+    print(f"{'channels':>8} {'ZoneDetector us':>16} {'per-zone loop us':>17} {'callback us':>12} {'switches':>9}")
+    ok = True
+    for n_ch in args.channels:
+        ms = synth_chan_ms(n_blocks, n_ch, dt)
+        tv, ev_v = run_vector(ms, dt, calib)
+        tl, ev_l = run_loop(ms, dt, calib)
+        same = ev_v == ev_l
+        ok &= same
+        cb = callback_cost(args.blocksize, n_ch)
+        print(f"{n_ch:>8} {tv / n_blocks * 1e6:>16.2f} {tl / n_blocks * 1e6:>17.2f} {cb * 1e6:>12.2f} "
+              f"{len(ev_v):>9}{'' if same else '  MISMATCH'}")
+    print("PASS: same switches as per-zone detectors" if ok else "FAIL: switches differ")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,193 @@
+"""
+Подменные бэкенды sounddevice и rtmidi для бенчмарков и прогонов без звуковой карты и loopMIDI.
+
+    from benchmarks.fakes import FakeSoundDevice, FakeRtMidi, install
+    sd, rt = FakeSoundDevice(), FakeRtMidi()
+    AudioStream(44100, 1024, 1, device_name="QUAD", backend=sd)
+    MidiSender("loopMIDI", backend=rt)
+    install(sd, rt)     # или подменить модули целиком (для smart_audio_runner.main)
+
+FakeSoundDevice отдаёт блоки в реальном темпе из своего потока; громкость — атрибут amplitude
+(0 — только слабый шум), channel_gains — множители по входным каналам (None — все каналы одинаковы). unplug() обрывает открытые потоки (callback'и перестают приходить, как
+при сбое USB), следующие fail_opens открытий бросают исключение.
+
+FakeRtMidi хранит всё отправленное в received (время perf_counter, имя порта, байты).
+restart_port() — перезапуск loopMIDI: порт пропадает на down_seconds, открытые на него
+дескрипторы перестают отправлять, вернувшийся порт встаёт в конец списка (другой индекс).
+"""
+import sys
+import threading
+import time
+import types
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+
+class _FakeInputStream:
+    def __init__(self, owner: "FakeSoundDevice", channels: int, samplerate: int, blocksize: int, callback):
+        self.owner = owner
+        self.channels = channels
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.dead = False
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="fake-portaudio", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        period = self.blocksize / float(self.samplerate)
+        t_next = time.perf_counter() + period
+        ti = types.SimpleNamespace(inputBufferAdcTime=0.0, currentTime=0.0)
+        while self._running and not self.dead:
+            delay = t_next - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            t_next += period
+            if not self._running or self.dead:
+                break
+            x = self.owner.next_block(self.blocksize, self.samplerate)
+            ti.currentTime = time.perf_counter()
+            ti.inputBufferAdcTime = ti.currentTime - period
+            blk = np.repeat(x[:, None], self.channels, axis=1) if self.channels > 1 else x[:, None]
+            gains = self.owner.channel_gains
+            if gains is not None:
+                blk = blk * np.asarray(gains[:self.channels], dtype=np.float32)
+            self.callback(blk, self.blocksize, ti, None)
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    abort = stop
+
+    def close(self):
+        self.stop()
+
+
+class FakeSoundDevice:
+    """Вместо модуля sounddevice: query_devices, InputStream и сбои по команде."""
+
+    def __init__(self, devices: Sequence[Tuple[str, int]] = (("Microsoft Sound Mapper", 2), ("QUAD-CAPTURE", 2)),
+                 amplitude: float = 0.0, noise: float = 1e-4, seed: int = 0):
+        self.devices = [{"name": n, "max_input_channels": c, "max_output_channels": 0} for n, c in devices]
+        self.amplitude = amplitude
+        self.noise = noise
+        self.channel_gains: Optional[Sequence[float]] = None
+        self.fail_opens = 0
+        self.opens = 0
+        self.streams: List[_FakeInputStream] = []
+        self._rng = np.random.default_rng(seed)
+        self._frame = 0
+        self._lock = threading.Lock()
+
+    def query_devices(self, device: Optional[int] = None):
+        if device is None:
+            return list(self.devices)
+        return self.devices[device]
+
+    def next_block(self, n: int, samplerate: int) -> np.ndarray:
+        t = (self._frame + np.arange(n)) / samplerate
+        self._frame += n
+        x = self.noise * self._rng.standard_normal(n)
+        if self.amplitude:
+            x += self.amplitude * np.sin(2 * np.pi * 220.0 * t)
+        return x.astype(np.float32)
+
+    def InputStream(self, channels: int, samplerate: int, blocksize: int, device=None, callback=None, **kw):
+        with self._lock:
+            self.opens += 1
+            if self.fail_opens > 0:
+                self.fail_opens -= 1
+                raise RuntimeError("Error opening InputStream: Device unavailable [PaErrorCode -9985] (fake)")
+        stream = _FakeInputStream(self, channels, samplerate, blocksize, callback)
+        self.streams.append(stream)
+        return stream
+
+    def unplug(self, fail_opens: int = 0):
+        """Все открытые потоки замолкают; следующие fail_opens открытий не удаются."""
+        with self._lock:
+            self.fail_opens = fail_opens
+            for s in self.streams:
+                s.dead = True
+            self.streams = []
+
+
+class _FakeMidiOut:
+    def __init__(self, owner: "FakeRtMidi"):
+        self.owner = owner
+        self._port: Optional[Tuple[str, int]] = None   # (имя, поколение порта)
+
+    def get_ports(self) -> List[str]:
+        return self.owner.ports()
+
+    def get_port_count(self) -> int:
+        return len(self.owner.ports())
+
+    def get_port_name(self, i: int) -> Optional[str]:
+        ports = self.owner.ports()
+        return ports[i] if 0 <= i < len(ports) else None
+
+    def open_port(self, i: int):
+        ports = self.owner.ports()
+        if not 0 <= i < len(ports):
+            raise RuntimeError(f"Invalid port number {i} (fake)")
+        self._port = (ports[i], self.owner.generation[ports[i]])
+
+    def close_port(self):
+        self._port = None
+
+    def send_message(self, msg):
+        if self._port is None or not self.owner.alive(*self._port):
+            raise RuntimeError("MIDI port is closed (fake)")
+        self.owner.received.append((time.perf_counter(), self._port[0], list(msg)))
+
+
+class FakeRtMidi:
+    """Вместо модуля rtmidi: MidiOut, список портов и перезапуск порта по команде."""
+
+    def __init__(self, ports: Sequence[str] = ("Microsoft GS Wavetable Synth", "loopMIDI Port")):
+        self._ports = list(ports)
+        self.generation: Dict[str, int] = {p: 0 for p in ports}
+        self._down: Dict[str, float] = {}
+        self.received: List[Tuple[float, str, List[int]]] = []
+        self._lock = threading.Lock()
+
+    def MidiOut(self):
+        return _FakeMidiOut(self)
+
+    def ports(self) -> List[str]:
+        with self._lock:
+            now = time.perf_counter()
+            for name, until in list(self._down.items()):
+                if now >= until:
+                    del self._down[name]
+                    self._ports.append(name)
+            return list(self._ports)
+
+    def alive(self, name: str, generation: int) -> bool:
+        return name not in self._down and self.generation.get(name) == generation
+
+    def restart_port(self, name_contains: str = "loopMIDI", down_seconds: float = 0.2) -> float:
+        """Порт пропадает на down_seconds; возвращает момент (perf_counter), когда он вернётся."""
+        with self._lock:
+            name = next(p for p in self._ports if name_contains.lower() in p.lower())
+            self._ports.remove(name)
+            self.generation[name] += 1
+            until = time.perf_counter() + down_seconds
+            self._down[name] = until
+            return until
+
+
+def install(sd: Optional[FakeSoundDevice] = None, rt: Optional[FakeRtMidi] = None):
+    """Подменить модули sounddevice и rtmidi (до первого их импорта); возвращает (sd, rt)."""
+    sd = sd if sd is not None else FakeSoundDevice()
+    rt = rt if rt is not None else FakeRtMidi()
+    sys.modules["sounddevice"] = sd
+    sys.modules["rtmidi"] = rt
+    return sd, rt
@@ -1,6 +1,10 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
+import time
 
 # Папка для логов
 LOG_DIR = "logs"
@@ -12,6 +16,40 @@ def is_log_type_enabled(name: str) -> bool:
     """
     return True
 
+# Ёмкость очереди записей на логгер; при переполнении записи отбрасываются, а не блокируют поток
+LOG_QUEUE_SIZE = 10000
+
+_listeners = {}
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler для горячего потока: запись кладётся в ограниченную очередь (сообщение
+    подставляется сразу, форматтеры — в потоке слушателя), при переполнении отбрасывается
+    и считается в dropped.
+    """
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # снимок сообщения: аргументы (массивы, dict состояния) могут поменяться, пока запись в очереди
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # traceback форматируем сразу: объект исключения может измениться к моменту записи
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
 def _make_handlers(filename: str):
     file_handler = logging.FileHandler(os.path.join(LOG_DIR, filename), encoding="utf-8")
     formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
@@ -21,6 +59,43 @@ def _make_handlers(filename: str):
     stream_handler.setFormatter(formatter)
     return file_handler, stream_handler
 
+def _attach_queue(logger: logging.Logger, filename: str):
+    """Файл и консоль обслуживает фоновый QueueListener; в логгере остаётся только постановка в очередь."""
+    file_h, stream_h = _make_handlers(filename)
+    q = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    qh = DroppingQueueHandler(q)
+    listener = logging.handlers.QueueListener(q, file_h, stream_h, respect_handler_level=True)
+    listener.start()
+    _listeners[logger.name] = (listener, qh)
+    logger.addHandler(qh)
+    logger.setLevel(logging.DEBUG)
+
+
+def dropped_records() -> int:
+    """Сколько записей отброшено из-за переполненной очереди (по всем логгерам)."""
+    return sum(qh.dropped for _, qh in _listeners.values())
+
+
+def shutdown_logging():
+    """Дописать всё, что в очередях, и остановить фоновые потоки логирования."""
+    for name, (listener, qh) in list(_listeners.items()):
+        logging.getLogger(name).removeHandler(qh)
+        while True:
+            try:
+                listener.stop()
+                break
+            except queue.Full:
+                time.sleep(0.01)  # очередь полна — слушатель её разбирает, маркер остановки встанет позже
+        for h in listener.handlers:
+            h.close()
+        if qh.dropped:
+            sys.stderr.write(f"[logging] {name}: {qh.dropped} record(s) dropped (queue full)\n")
+    _listeners.clear()
+
+
+atexit.register(shutdown_logging)
+
+
 def setup_audio_diag_logger():
     """
     Настройка логгера audio_diag
@@ -29,10 +104,7 @@ def setup_audio_diag_logger():
     # Не дублировать хендлеры при повторном вызове
     if logger.handlers:
         return
-    file_h, stream_h = _make_handlers("audio_diag.log")
-    logger.addHandler(file_h)
-    logger.addHandler(stream_h)
-    logger.setLevel(logging.DEBUG)
+    _attach_queue(logger, "audio_diag.log")
 
 def setup_player_logger():
     """
@@ -42,7 +114,4 @@ def setup_player_logger():
     # Не дублировать хендлеры при повторном вызове
     if logger.handlers:
         return
-    file_h, stream_h = _make_handlers("player.log")
-    logger.addHandler(file_h)
-    logger.addHandler(stream_h)
-    logger.setLevel(logging.DEBUG)
\ No newline at end of file
+    _attach_queue(logger, "player.log")
\ No newline at end of file
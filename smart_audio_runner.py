@@ -1,121 +1,92 @@
+import sys
 import time
+_T_START = time.perf_counter()
 import logging
-from logging_config import setup_audio_diag_logger, setup_player_logger
+import argparse
+from logging_config import setup_audio_diag_logger, setup_player_logger, shutdown_logging, dropped_records
 setup_audio_diag_logger()
 setup_player_logger()
 audio_logger = logging.getLogger("audio_diag")
 player_logger = logging.getLogger("player")
 
 from smartctl import config as cfgmod
-from smartctl.audio_input import AudioStream
-from smartctl.midi_io import MidiSender
-from smartctl.detectors import LevelConfig, LevelDetector
-from smartctl.state_machine import FSMConfig, OnOffFSM
-from smartctl.controller import SceneController, SceneTriggerConfig
+from smartctl import builders, startup
+from smartctl.live import LiveRunner
 
-def _build_trigger_cfg(m: dict) -> SceneTriggerConfig:
-    mode = m.get("trigger_mode", "same_note")
-    ch = m.get("channel", 1)
-    vel = m.get("velocity", 127)
+def _parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Audio-driven MIDI scene trigger")
+    p.add_argument("--config", default="config.yaml")
+    p.add_argument("--replay", metavar="FILE",
+                   help="offline replay of a WAV/raw PCM file on a simulated clock (no audio/MIDI devices)")
+    p.add_argument("--raw-format", default="float32", choices=["float32", "int16", "int32"],
+                   help="sample format for raw PCM replay files")
+    p.add_argument("--raw-samplerate", type=int, default=None,
+                   help="sample rate for raw PCM replay files (default: audio.samplerate)")
+    p.add_argument("--raw-channels", type=int, default=1)
+    p.add_argument("--batch", action="store_true",
+                   help="replay through the vectorized LevelDetector.update_batch path")
+    p.add_argument("--asyncio", action="store_true",
+                   help="run the processing loop on asyncio with fan-out to sinks (same as async_runner.enabled)")
+    return p.parse_args(argv)
 
-    if mode == "same_note":
-        note = m.get("note")
-        if note is None:
-            raise ValueError("Config error: trigger_mode=same_note, but midi.note is missing. Example: midi.note: 60")
-        player_logger.info("[CFG] trigger_mode=same_note note=%s ch=%s vel=%s", note, ch, vel)
-        return SceneTriggerConfig(mode="same_note", channel=ch, velocity=vel, note=note)
+def run_replay(cfg: dict, args) -> int:
+    """
+    Оффлайн-прогон файла. Для записи чёрного ящика (рядом .json) — та же цепочка, что была
+    в живом цикле в момент триггера: настройки уровня, hop-режим и шумовой фон из context,
+    старт с записанного baseline (калибровки на звуке до триггера нет).
+    """
+    from smartctl.detectors import LevelConfig
+    from smartctl.replay import load_sidecar, replay_file, warm_state
 
-    if mode == "separate_notes":
-        notes = m.get("notes") or {}
-        note_on = notes.get("on")
-        note_off = notes.get("off")
-        if note_on is None or note_off is None:
-            raise ValueError("Config error: trigger_mode=separate_notes requires midi.notes.on and midi.notes.off. "
-                             "Example:\n  midi:\n    trigger_mode: separate_notes\n    notes:\n      on: 60\n      off: 61")
-        player_logger.info("[CFG] trigger_mode=separate_notes on=%s off=%s ch=%s vel=%s", note_on, note_off, ch, vel)
-        return SceneTriggerConfig(mode="separate_notes", channel=ch, velocity=vel, note_on=note_on, note_off=note_off)
-
-    if mode == "cc_gate":
-        cc = m.get("cc")
-        if cc is None:
-            raise ValueError("Config error: trigger_mode=cc_gate requires midi.cc (controller number).")
-        player_logger.info("[CFG] trigger_mode=cc_gate cc=%s ch=%s", cc, ch)
-        return SceneTriggerConfig(mode="cc_gate", channel=ch, velocity=vel, cc=cc)
-
-    raise ValueError(f"Unknown trigger_mode: {mode}")
-
-def main():
-    cfg = cfgmod.load("config.yaml")
-
-    # Audio
+    sidecar, warm = load_sidecar(args.replay), None
+    level_cfg = builders.build_level_cfg(cfg)
+    if sidecar is not None:
+        ctx = sidecar.get("context") or {}
+        if ctx.get("level"):
+            level_cfg = LevelConfig(**ctx["level"])
+        cfg = dict(cfg, audio=dict(cfg["audio"], **(ctx.get("audio") or {})),
+                   hop_mode=ctx.get("hop_mode", cfg["hop_mode"]), noise_floor=ctx.get("noise_floor", cfg["noise_floor"]))
+        warm = warm_state(sidecar)
     a = cfg["audio"]
-    audio = AudioStream(
-        samplerate=a["samplerate"],
-        blocksize=a["blocksize"],
-        channels=a["channels"],
-        device_index=a.get("device_index"),
+    sliding = builders.make_sliding(cfg)
+    step = sliding.hop if sliding is not None else a["blocksize"]
+    src, report = replay_file(
+        args.replay,
+        blocksize=step,
+        level_cfg=builders.loop_level_cfg(cfg, level_cfg),
+        fsm_cfg=builders.build_fsm_cfg(cfg),
+        raw_format=args.raw_format,
+        raw_samplerate=args.raw_samplerate or a["samplerate"],
+        raw_channels=args.raw_channels,
+        batch=args.batch,
+        noise_floor=builders.build_noise_floor(cfg),
+        features=builders.build_features(cfg),
+        sliding=sliding,
+        warm=warm,
     )
+    print(f"[Replay] {args.replay}: sr={src.samplerate} ch={src.channels} blocksize={step}")
+    if sidecar is not None:
+        trig = sidecar["trigger_offset_frames"] // sidecar["blocksize"]
+        print(f"[Replay] black box: live '{sidecar['reason']}' at block={trig}, "
+              + (f"warm start baseline={warm['baseline']:.6f} fsm={warm['fsm']}" if warm is not None
+                 else "no live baseline, calibrating on the recording"))
+    print(report.format())
+    return 0
 
-    # MIDI
-    m = cfg["midi"]
-    midi = MidiSender(port_substr=m["output_port_name_contains"])
-    trig_cfg = _build_trigger_cfg(m)
-    scene = SceneController(midi, trig_cfg)
+def main(argv=None):
+    timer = startup.StartupTimer(_T_START)
+    timer.mark("imports")
+    args = _parse_args(argv)
+    cfg = cfgmod.load(args.config)
+    timer.mark("config")
 
-    # Detector + FSM
-    l = cfg["logic"]
-    level_cfg = LevelConfig(
-        ema_alpha=a["ema_alpha"],
-        dynamic_threshold=l["dynamic_threshold"],
-        on_multiplier=l.get("on_multiplier", 2.5),
-        off_multiplier=l.get("off_multiplier", 1.6),
-        min_on_threshold=l.get("min_on_threshold", 0.00006),
-        min_off_threshold=l.get("min_off_threshold", 0.00004),
-        on_threshold=l.get("on_threshold", 0.00005),
-        off_threshold=l.get("off_threshold", 0.00003),
-        startup_grace_seconds=l["startup_grace_seconds"],
-        min_on_seconds=l["min_on_seconds"],
-        min_off_seconds=l["min_off_seconds"],
-        silence_hold_seconds=l["silence_hold_seconds"],
-        calibration_seconds=a["calibration_seconds"],
-    )
-    det = LevelDetector(level_cfg)
-    fsm = OnOffFSM(FSMConfig(
-        startup_grace_seconds=l["startup_grace_seconds"],
-        min_on_seconds=l["min_on_seconds"],
-        min_off_seconds=l["min_off_seconds"],
-        silence_hold_seconds=l["silence_hold_seconds"],
-        calibration_seconds=a["calibration_seconds"],
-    ))
+    if args.replay:
+        return run_replay(cfg, args)
 
-    audio_logger.info("[Audio] starting input stream")
-    audio.start()
     try:
-        # Калибровка тишины
-        t0 = time.time()
-        while (time.time() - t0) < a["calibration_seconds"]:
-            blk = audio.read_block(timeout=0.2)
-            if blk is not None:
-                det.calibrate_step(blk)
-        audio_logger.info("[Calib] baseline=%.6f", det.state.baseline or -1.0)
-
-        # Основной цикл
-        while True:
-            blk = audio.read_block(timeout=0.5)
-            if blk is None:
-                continue
-            info = det.update(blk)
-            if audio_logger.isEnabledFor(logging.DEBUG):
-                audio_logger.debug("lvl=%.5f on=%.5f off=%.5f", info["smooth"], info["on_th"], info["off_th"])
-            fsm.step(det.state, info, on_event=scene.turn_on, off_event=scene.turn_off)
-
-    except KeyboardInterrupt:
-        audio_logger.info("[Audio] stopped by user")
+        LiveRunner(cfg, args.config, use_asyncio=args.asyncio, timer=timer, dropped_records=dropped_records).run()
     finally:
-        scene.turn_off()
-        audio.stop()
-        midi.close()
-        player_logger.info("[MIDI] closed")
+        shutdown_logging()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,241 @@
+import abc
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Literal, Optional, Tuple
+import numpy as np
+
+from smartctl.metrics import LatencyHistogram
+
+player_logger = logging.getLogger("player")
+
+DropPolicy = Literal["drop_oldest", "drop_newest"]
+
+
+class Sink(abc.ABC):
+    """
+    Вторичный выход конвейера: своя ограниченная очередь и своя задача asyncio.
+    offer() вызывается из стадии детектора и никогда не ждёт: при полной очереди
+    drop_oldest выкидывает самое старое событие (для состояний — важно последнее),
+    drop_newest — новое (для потоков, где важна непрерывность начала).
+    """
+
+    def __init__(self, name: str, maxsize: int = 64, policy: DropPolicy = "drop_oldest"):
+        if policy not in ("drop_oldest", "drop_newest"):
+            raise ValueError(f"Unknown sink drop policy: {policy}")
+        if maxsize < 1:
+            raise ValueError(f"Sink queue size must be >= 1, got {maxsize}")
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self._q: Deque[Tuple[dict, float]] = deque()
+        self._ready: Optional[asyncio.Event] = None
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latency = LatencyHistogram(f"sink_{name}")
+
+    def offer(self, event: dict):
+        if len(self._q) >= self.maxsize:
+            self.dropped += 1
+            if self.policy == "drop_newest":
+                return
+            self._q.popleft()
+        self._q.append((event, time.perf_counter()))
+        if self._ready is not None:
+            self._ready.set()
+
+    def accepts(self, event: dict) -> bool:
+        """Фильтр до постановки в очередь (по умолчанию — все события)."""
+        return True
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abc.abstractmethod
+    async def handle(self, event: dict):
+        """Доставить одно событие; исключение считается в failed, цикл sink'а продолжается."""
+
+    async def run(self):
+        self._ready = asyncio.Event()
+        await self.open()
+        try:
+            while True:
+                if not self._q:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                event, t_enq = self._q.popleft()
+                try:
+                    await self.handle(event)
+                except Exception as e:
+                    self.failed += 1
+                    if self.failed == 1 or self.failed % 1000 == 0:
+                        player_logger.warning("[Sink %s] handler failed (%d): %s", self.name, self.failed, e)
+                    continue
+                self.delivered += 1
+                self.latency.record(time.perf_counter() - t_enq)
+        finally:
+            await self.close()
+
+    def format(self) -> str:
+        return (f"{self.name}: delivered={self.delivered} dropped={self.dropped} failed={self.failed} "
+                f"queue={len(self._q)}/{self.maxsize} ({self.policy}); {self.latency.format()}")
+
+
+class SceneSink(Sink):
+    """Переключение сцены (например, DMX) по событиям on/off."""
+
+    def __init__(self, name: str, scene, maxsize: int = 16, policy: DropPolicy = "drop_oldest"):
+        super().__init__(name, maxsize, policy)
+        self.scene = scene
+
+    def accepts(self, event: dict) -> bool:
+        return event["kind"] in ("on", "off")
+
+    async def handle(self, event: dict):
+        if event["kind"] == "on":
+            self.scene.turn_on()
+        else:
+            self.scene.turn_off()
+
+
+class UdpTelemetrySink(Sink):
+    """JSON-датаграмма на каждое событие (уровни раз в every блоков, переключения — всегда)."""
+
+    def __init__(self, host: str, port: int, every: int = 1, maxsize: int = 8,
+                 policy: DropPolicy = "drop_oldest"):
+        super().__init__("udp_telemetry", maxsize, policy)
+        self.addr = (host, port)
+        self.every = max(1, every)
+        self._n = 0
+        self._transport: Optional[asyncio.DatagramTransport] = None
+
+    def accepts(self, event: dict) -> bool:
+        if event["kind"] != "level":
+            return True
+        self._n += 1
+        return self._n % self.every == 0
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol,
+                                                                 remote_addr=self.addr)
+        player_logger.info("[Sink udp_telemetry] sending to %s:%d", *self.addr)
+
+    async def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def handle(self, event: dict):
+        self._transport.sendto(json.dumps(event, separators=(",", ":")).encode("utf-8"))
+
+
+def level_event(info: Dict[str, Any], on: bool) -> dict:
+    """
+    Событие "level" из результата LevelDetector: update()/update_value() — числа,
+    update_batch()/update_values() — массивы на пакет (берётся последний блок, пороги — числа).
+    """
+    def last(x):
+        return float(x[-1]) if isinstance(x, np.ndarray) else float(x)
+
+    return {"kind": "level", "t": last(info["now"]), "rms": last(info["rms"]), "smooth": last(info["smooth"]),
+            "on_th": last(info["on_th"]), "off_th": last(info["off_th"]), "on": on}
+
+
+class FanOut:
+    """Раздача событий по вторичным выходам; publish() — O(число выходов), без ожиданий."""
+
+    def __init__(self, sinks: List[Sink]):
+        self.sinks = sinks
+        self._tasks: List[asyncio.Task] = []
+
+    def publish(self, event: dict):
+        for s in self.sinks:
+            if s.accepts(event):
+                s.offer(event)
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(s.run(), name=f"sink-{s.name}") for s in self.sinks]
+        await asyncio.sleep(0)   # дать выходам открыться до первых событий
+
+    async def stop(self, drain_timeout: float = 0.5):
+        # даём выходам дослать очередь (например, финальный OFF), потом снимаем задачи
+        deadline = time.monotonic() + drain_timeout
+        while any(s._q for s in self.sinks) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+class AsyncBlockSource:
+    """
+    Блоки AudioStream в цикле asyncio. Callback после записи блока в кольцо будит цикл через
+    loop.call_soon_threadsafe (не чаще одного раза до пробуждения — пачка блоков даёт один
+    вызов). Источник без хука on_block (процесс захвата) читается из пула потоков.
+    get_audio — текущий поток (при горячей перезагрузке он может смениться).
+    """
+
+    def __init__(self, get_audio: Callable[[], Any], loop: asyncio.AbstractEventLoop):
+        self.get_audio = get_audio
+        self.loop = loop
+        self._event = asyncio.Event()
+        self._scheduled = False
+        self.wakeups = 0
+        self.attach(get_audio())
+
+    def attach(self, audio):
+        if hasattr(audio, "on_block"):
+            audio.on_block = self._notify
+
+    def _notify(self):
+        # из потока callback'а; флаг гонится безвредно — в худшем случае лишнее пробуждение
+        if not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        self._scheduled = False
+        self.wakeups += 1
+        self._event.set()
+
+    async def next_block(self, timeout: float):
+        audio = self.get_audio()
+        if not hasattr(audio, "on_block"):
+            return await self.loop.run_in_executor(None, audio.read_block, timeout)
+        blk = audio.read_block(timeout=0)
+        if blk is not None:
+            return blk
+        self._event.clear()
+        blk = audio.read_block(timeout=0)   # блок мог прийти между проверкой и clear()
+        if blk is not None:
+            return blk
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return audio.read_block(timeout=0)
+
+
+def build_sinks(acfg: Dict[str, Any], dmx_scene=None) -> List[Sink]:
+    """Выходы из секции async_runner.sinks конфига."""
+    sinks: List[Sink] = []
+    sc = acfg.get("sinks") or {}
+    d = sc.get("dmx") or {}
+    if dmx_scene is not None:
+        sinks.append(SceneSink("dmx", dmx_scene, maxsize=int(d.get("queue", 16)),
+                               policy=d.get("policy", "drop_oldest")))
+    u = sc.get("udp_telemetry") or {}
+    if u.get("enabled"):
+        sinks.append(UdpTelemetrySink(u.get("host", "127.0.0.1"), int(u.get("port", 9109)),
+                                      every=int(u.get("every_blocks", 1)), maxsize=int(u.get("queue", 8)),
+                                      policy=u.get("policy", "drop_oldest")))
+    return sinks
@@ -1,33 +1,130 @@
-import queue
-import threading
-from typing import Optional, Callable
+import time
+from typing import Any, Optional, Callable, Tuple
 import numpy as np
-import sounddevice as sd
 import logging
+from smartctl.ringbuf import BlockRing, BlockTiming
 
 audio_logger = logging.getLogger("audio_diag")
 
+
+def resolve_input_device(name_contains: Optional[str], device_index: Optional[int] = None,
+                         hint: Optional[Tuple[int, str]] = None, sd=None) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Индекс входного устройства по подстроке имени. hint — (индекс, имя) из кэша прошлого запуска:
+    проверяется одним query_devices(index); полный перебор устройств — только если не совпал.
+    """
+    if sd is None:
+        import sounddevice as sd
+
+    if not name_contains:
+        return device_index, None
+    needle = name_contains.lower()
+    if hint is not None:
+        try:
+            d = sd.query_devices(hint[0])
+            if d["name"] == hint[1] and d["max_input_channels"] > 0 and needle in d["name"].lower():
+                return hint[0], d["name"]
+        except Exception:
+            pass
+    for i, d in enumerate(sd.query_devices()):
+        if d["max_input_channels"] > 0 and needle in d["name"].lower():
+            return i, d["name"]
+    raise RuntimeError(f"No input device matching '{name_contains}'")
+
+
 class AudioStream:
-    def __init__(self, samplerate: int, blocksize: int, channels: int, device_index: Optional[int] = None):
+    def __init__(self, samplerate: int, blocksize: int, channels: int, device_index: Optional[int] = None,
+                 ring_blocks: int = 32, ring=None, device_name: Optional[str] = None,
+                 device_hint: Optional[Tuple[int, str]] = None, backend=None, channel_levels: bool = False):
         self.sr = samplerate
         self.bs = blocksize
         self.ch = channels
+        self._mix_w = np.full(max(channels, 1), 1.0 / max(channels, 1), dtype=np.float32)
         self.dev = device_index
-        self.q: "queue.Queue[np.ndarray]" = queue.Queue(maxsize=32)
-        self._stream: Optional[sd.InputStream] = None
+        # device_name — подстрока имени устройства; индекс выясняется в start() (с подсказкой из кэша)
+        self.device_name = device_name
+        self.device_hint = device_hint
+        self.resolved_device: Optional[Tuple[Optional[int], Optional[str]]] = None
+        # ring можно передать снаружи (например, кольцо в общей памяти у процесса захвата)
+        self.ring = ring if ring is not None else BlockRing(ring_blocks, blocksize, channels if channel_levels else 0)
+        # channel_levels (или кольцо с chan_ms): callback пишет ещё и средний квадрат каждого канала
+        self._sq = np.zeros((blocksize, channels), dtype=np.float32) if self.ring.chan_ms is not None else None
+        self._mean_w = np.full(blocksize, 1.0 / blocksize, dtype=np.float32)
+        self.last_timing: Optional[BlockTiming] = None
+        # счётчики callback'а (пишет только поток PortAudio)
+        self.callbacks = 0
+        self.status_count = 0
+        self.input_overflows = 0
+        self.input_underflows = 0
+        # вызывается из потока PortAudio после записи каждого блока (например, разбудить цикл asyncio)
+        self.on_block: Optional[Callable[[], None]] = None
+        self._stream: Any = None
+        # модуль с InputStream/query_devices вместо sounddevice (подмена в бенчмарках)
+        self.backend = backend
+
+    @property
+    def overruns(self) -> int:
+        return self.ring.overruns
+
+    def pending(self) -> int:
+        return self.ring.pending()
 
     def _callback(self, indata, frames, time_info, status):
+        self.callbacks += 1
         if status:
+            self.status_count += 1
+            if status.input_overflow:
+                self.input_overflows += 1
+            if status.input_underflow:
+                self.input_underflows += 1
             audio_logger.debug("Sounddevice status: %s", status)
         if indata is None or len(indata) == 0:
             return
-        data = np.mean(indata, axis=1).astype(np.float32) if indata.ndim > 1 else indata.astype(np.float32)
-        try:
-            self.q.put_nowait(data.copy())
-        except queue.Full:
-            pass
+        slot = self.ring.acquire()
+        if slot is None:
+            return  # переполнение уже учтено в ring.overruns
+        n = len(indata)
+        if n > self.bs:
+            n = self.bs
+            indata = indata[:n]
+        dst = slot if n == self.bs else slot[:n]
+        # даунмикс в моно сразу в слот кольца, без промежуточных массивов: для float32 — gemv
+        # (np.dot на веса 1/ch) — в разы быстрее np.mean(axis=1, out=), которая ещё и выделяет
+        # буфер итератора на каждый блок
+        if indata.ndim == 1:
+            np.copyto(dst, indata)
+        elif indata.shape[1] == 1:
+            np.copyto(dst, indata[:, 0])
+        elif indata.dtype == np.float32:
+            np.dot(indata, self._mix_w, out=dst)
+        else:
+            np.mean(indata, axis=1, out=dst)
+        if self._sq is not None and indata.ndim > 1:
+            # средний квадрат по каналам: тоже gemv, вектор 1/n слева
+            sq = self._sq if n == self.bs else self._sq[:n]
+            np.multiply(indata, indata, out=sq)
+            w = self._mean_w if n == self.bs else np.full(n, 1.0 / n, dtype=np.float32)
+            np.dot(w, sq, out=self.ring.chan_ms_slot())
+        if time_info is not None:
+            self.ring.commit(n, time_info.inputBufferAdcTime, time_info.currentTime, time.perf_counter())
+        else:
+            self.ring.commit(n, 0.0, 0.0, time.perf_counter())
+        cb = self.on_block
+        if cb is not None:
+            cb()
+
+    def _sd(self):
+        if self.backend is None:
+            # sounddevice (и инициализация PortAudio) — только когда поток действительно открывается
+            import sounddevice
+            self.backend = sounddevice
+        return self.backend
 
     def start(self):
+        sd = self._sd()
+        if self.device_name:
+            self.dev, name = resolve_input_device(self.device_name, self.dev, self.device_hint, sd)
+            self.resolved_device = (self.dev, name)
         self._stream = sd.InputStream(
             channels=self.ch,
             samplerate=self.sr,
@@ -39,10 +136,46 @@ class AudioStream:
         audio_logger.info("[Audio] listening...")
 
     def read_block(self, timeout: float = 0.5) -> Optional[np.ndarray]:
-        try:
-            return self.q.get(timeout=timeout)
-        except queue.Empty:
-            return None
+        # view на слот кольца: валиден до следующего read_block
+        blk = self.ring.read(timeout=timeout)
+        if blk is not None:
+            i = self.ring.current_slot()
+            self.last_timing = BlockTiming(self.ring.adc_time[i], self.ring.cb_time[i], self.ring.cb_perf[i],
+                                           time.perf_counter())
+        return blk
+
+    def read_blocks(self, max_blocks: int) -> np.ndarray:
+        # все уже накопленные блоки одним 2-D view (для догоняющей пакетной обработки);
+        # last_timing — отметки самого нового блока пакета
+        blks = self.ring.read_many(max_blocks)
+        if len(blks):
+            i = self.ring.current_slot() + len(blks) - 1
+            self.last_timing = BlockTiming(self.ring.adc_time[i], self.ring.cb_time[i], self.ring.cb_perf[i],
+                                           time.perf_counter())
+        return blks
+
+    def channel_ms(self) -> np.ndarray:
+        """Средний квадрат по каналам для блоков последнего read_block/read_blocks: (n, channels)."""
+        return self.ring.held_chan_ms()
+
+    def restart(self):
+        """
+        Переоткрыть устройство после сбоя на том же кольце: номера блоков, читатель и чёрный ящик
+        не сбиваются. Устройство ищется заново по имени (индекс из прошлого открытия только
+        проверяется). PortAudio не переинициализируется — это глобально и сломало бы другие
+        открытые потоки, поэтому устройство, появившееся под новым индексом, PortAudio видит,
+        только если драйвер сам обновил список. Ошибка открытия пробрасывается (повторяет супервизор).
+        """
+        old, self._stream = self._stream, None
+        if old is not None:
+            try:
+                old.abort()
+                old.close()
+            except Exception:
+                pass
+        if self.resolved_device is not None:
+            self.device_hint = self.resolved_device
+        self.start()
 
     def stop(self):
         try:
@@ -0,0 +1,162 @@
+import logging
+import multiprocessing as mp
+import signal
+import time
+from typing import Optional, Tuple
+import numpy as np
+
+from smartctl.ringbuf import BlockTiming
+from smartctl.shm_ring import SharedBlockRing, H_CALLBACKS, H_OVERRUNS, H_STATUS, H_OVERFLOWS, H_UNDERFLOWS
+
+audio_logger = logging.getLogger("audio_diag")
+
+# как часто процесс захвата публикует счётчики callback'а и проверяет, жив ли родитель
+_STATS_PERIOD_S = 0.2
+
+
+def _capture_main(name: str, capacity: int, blocksize: int, samplerate: int, channels: int,
+                  device_index: Optional[int], wakeup, stop, device_name: Optional[str] = None,
+                  device_hint: Optional[Tuple[int, str]] = None, channel_levels: bool = False):
+    """
+    Точка входа процесса захвата: AudioStream пишет прямо в кольцо в общей памяти.
+    Логгеры здесь те же, что настраивает импорт главного модуля (spawn импортирует его заново).
+    """
+    # Ctrl+C в консоли приходит всей группе процессов — останавливает захват родитель через stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    ring = SharedBlockRing.attach(name, capacity, blocksize, wakeup, channels if channel_levels else 0)
+    from smartctl.audio_input import AudioStream
+
+    stream = AudioStream(samplerate, blocksize, channels, device_index, ring=ring, device_name=device_name,
+                         device_hint=device_hint)
+    parent = mp.parent_process()
+    # после перезапуска процесса счётчики продолжают значения предыдущего
+    base = [int(ring.hdr[h]) for h in (H_CALLBACKS, H_STATUS, H_OVERFLOWS, H_UNDERFLOWS)]
+
+    def publish():
+        ring.publish_stats(base[0] + stream.callbacks, base[1] + stream.status_count,
+                           base[2] + stream.input_overflows, base[3] + stream.input_underflows)
+
+    try:
+        stream.start()
+        while not stop.wait(_STATS_PERIOD_S):
+            publish()
+            if parent is not None and not parent.is_alive():
+                break
+    finally:
+        stream.stop()
+        publish()
+        ring.close()
+
+
+class ProcessAudioStream:
+    """
+    Захват в отдельном процессе: свой интерпретатор и свой GIL, поэтому сброс логов или
+    медленная отправка MIDI в основном процессе не задерживают callback PortAudio.
+    Блоки приходят через SharedBlockRing; интерфейс совпадает с AudioStream
+    (read_block/read_blocks/pending/overruns/last_timing, счётчики callback'а).
+    """
+
+    def __init__(self, samplerate: int, blocksize: int, channels: int, device_index: Optional[int] = None,
+                 ring_blocks: int = 32, device_name: Optional[str] = None,
+                 device_hint: Optional[Tuple[int, str]] = None, channel_levels: bool = False):
+        self.sr = samplerate
+        self.bs = blocksize
+        self.ch = channels
+        self.dev = device_index
+        self.device_name = device_name
+        self.device_hint = device_hint
+        # устройство выбирает процесс захвата — основной процесс его не узнаёт (в кэш не попадает)
+        self.resolved_device = None
+        self._ctx = mp.get_context("spawn")   # как на Windows: без fork'а потоков родителя
+        self._wakeup = self._ctx.BoundedSemaphore(1)
+        self._stop = self._ctx.Event()
+        self.channel_levels = channel_levels
+        self.ring = SharedBlockRing.create(ring_blocks, blocksize, wakeup=self._wakeup,
+                                           channels=channels if channel_levels else 0)
+        self.last_timing: Optional[BlockTiming] = None
+        self._proc = None
+        # под супервизором смерть процесса захвата — не ошибка чтения: его перезапустят
+        self.supervised = False
+        self._final_hdr: Optional[np.ndarray] = None   # счётчики после stop(), когда кольцо уже закрыто
+
+    def _hdr(self) -> np.ndarray:
+        return self.ring.hdr if self.ring is not None else self._final_hdr
+
+    @property
+    def overruns(self) -> int:
+        return int(self._hdr()[H_OVERRUNS])
+
+    @property
+    def callbacks(self) -> int:
+        return int(self._hdr()[H_CALLBACKS])
+
+    @property
+    def status_count(self) -> int:
+        return int(self._hdr()[H_STATUS])
+
+    @property
+    def input_overflows(self) -> int:
+        return int(self._hdr()[H_OVERFLOWS])
+
+    @property
+    def input_underflows(self) -> int:
+        return int(self._hdr()[H_UNDERFLOWS])
+
+    def pending(self) -> int:
+        return self.ring.pending() if self.ring is not None else 0
+
+    def start(self):
+        self._proc = self._ctx.Process(
+            target=_capture_main,
+            args=(self.ring.name, self.ring.capacity, self.bs, self.sr, self.ch, self.dev, self._wakeup, self._stop,
+                  self.device_name, self.device_hint, self.channel_levels),
+            name="audio-capture",
+            daemon=True,
+        )
+        self._proc.start()
+        audio_logger.info("[Audio] capture process started (pid=%s, shared ring %s x %d)",
+                          self._proc.pid, self.ring.capacity, self.bs)
+
+    def read_block(self, timeout: float = 0.5) -> Optional[np.ndarray]:
+        blk = self.ring.read(timeout=timeout)
+        if blk is None:
+            if self._proc is not None and not self.supervised and not self._proc.is_alive():
+                raise RuntimeError(f"Audio capture process exited (code {self._proc.exitcode})")
+            return None
+        i = self.ring.current_slot()
+        self.last_timing = BlockTiming(float(self.ring.adc_time[i]), float(self.ring.cb_time[i]),
+                                       float(self.ring.cb_perf[i]), time.perf_counter())
+        return blk
+
+    def read_blocks(self, max_blocks: int) -> np.ndarray:
+        blks = self.ring.read_many(max_blocks)
+        if len(blks):
+            i = self.ring.current_slot() + len(blks) - 1
+            self.last_timing = BlockTiming(float(self.ring.adc_time[i]), float(self.ring.cb_time[i]),
+                                           float(self.ring.cb_perf[i]), time.perf_counter())
+        return blks
+
+    def channel_ms(self) -> np.ndarray:
+        return self.ring.held_chan_ms()
+
+    def _stop_process(self, timeout: float = 2.0):
+        if self._proc is not None:
+            self._stop.set()
+            self._proc.join(timeout=timeout)
+            if self._proc.is_alive():
+                self._proc.terminate()
+                self._proc.join(timeout=1.0)
+            self._proc = None
+
+    def restart(self):
+        """Новый процесс захвата на том же кольце в общей памяти (номер записи он берёт из заголовка)."""
+        self._stop_process(timeout=0.5)
+        self._stop = self._ctx.Event()
+        self.start()
+
+    def stop(self):
+        self._stop_process()
+        if self.ring is not None:
+            self._final_hdr = self.ring.hdr.copy()
+            self.ring.close()
+            self.ring = None
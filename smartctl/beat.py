@@ -0,0 +1,221 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+import numpy as np
+
+from smartctl.spectral import HopFramer, _RFFT_HAS_OUT
+
+
+@dataclass
+class BeatConfig:
+    n_fft: int = 1024
+    hop: int = 256
+    min_bpm: float = 70.0
+    max_bpm: float = 180.0
+    threshold_seconds: float = 1.0      # окно адаптивного порога spectral flux
+    threshold_k: float = 2.0            # порог = среднее + k * СКО
+    min_onset_interval: float = 0.08    # рефрактерный период между онсетами
+    tempo_memory_seconds: float = 6.0   # постоянная времени автокорреляции
+    phase_memory_seconds: float = 4.0   # постоянная времени накопителя фазы
+    phase_bins: int = 64                # разрешение фазы внутри периода
+    hold_beats: float = 8.0             # сколько битов идти "по инерции" без онсетов
+
+
+class BeatTracker:
+    """
+    Онсеты по spectral flux и темп/фаза бита в реальном времени.
+
+    На каждый hop: один rfft, flux по лог-амплитудам с весами по октавам, адаптивный порог по скользящим
+    сумме и сумме квадратов (O(1)), инкрементальная автокорреляция огибающей только по
+    лагам диапазона min_bpm..max_bpm (O(число лагов), история не пересчитывается).
+    Фаза — затухающий гребёнчатый накопитель огибающей по долям периода: бит ставится туда,
+    где периодическая энергия сильнее (бочка, а не хэт на слабую долю).
+    """
+
+    def __init__(self, cfg: BeatConfig, samplerate: int, clock: Callable[[], float] = time.time):
+        if cfg.min_bpm <= 0 or cfg.max_bpm <= cfg.min_bpm:
+            raise ValueError(f"Beat tracker needs 0 < min_bpm < max_bpm, got {cfg.min_bpm}..{cfg.max_bpm}")
+        self.cfg = cfg
+        self.sr = samplerate
+        self.clock = clock
+        self.hop_s = cfg.hop / float(samplerate)
+        n = cfg.n_fft
+        n_bins = n // 2 + 1
+
+        self.framer = HopFramer(n, cfg.hop)
+        self.window = np.hanning(n).astype(np.float32)
+        self._windowed = np.empty(n, dtype=np.float32)
+        self._spec = np.empty(n_bins, dtype=np.complex64)
+        self._mag = np.zeros(n_bins, dtype=np.float32)
+        self._prev = np.zeros(n_bins, dtype=np.float32)
+        self._diff = np.empty(n_bins, dtype=np.float32)
+        # вес бина = 1 / число бинов в его октаве: иначе широкополосные хэты заглушают бочку,
+        # у которой всего несколько низких бинов
+        octave = np.floor(np.log2(np.maximum(np.arange(n_bins), 1))).astype(np.int64)
+        counts = np.bincount(octave)
+        self._weights = (1.0 / counts[octave]).astype(np.float32)
+        self._weights[0] = 0.0  # DC
+
+        # адаптивный порог: кольцо последних значений flux + бегущие суммы
+        self._fl = np.zeros(max(4, int(round(cfg.threshold_seconds / self.hop_s))))
+        self._fl_i = 0
+        self._fl_n = 0
+        self._fl_sum = 0.0
+        self._fl_sq = 0.0
+        self._mean = 0.0
+
+        # автокорреляция огибающей: история пишется дважды (i и i+H), чтобы окно лагов
+        # всегда было непрерывным срезом; acf хранится в порядке убывания лага
+        self._lag_min = max(1, int(math.floor(60.0 / cfg.max_bpm / self.hop_s)))
+        self._lag_max = int(math.ceil(60.0 / cfg.min_bpm / self.hop_s))
+        self._H = self._lag_max + 1
+        self._hist = np.zeros(2 * self._H)
+        self._hi = 0
+        k = self._lag_max - self._lag_min + 1
+        self._acf = np.zeros(k)
+        self._tmp = np.empty(k)
+        self._decay = math.exp(-self.hop_s / cfg.tempo_memory_seconds)
+        lags = np.arange(self._lag_max, self._lag_min - 1, -1, dtype=np.float64)
+        # мягкий приоритет темпов около 120 BPM, чтобы не прыгать на половину/удвоение
+        self._prior = np.exp(-0.5 * (np.log2(60.0 / (lags * self.hop_s) / 120.0) / 0.9) ** 2)
+
+        self._phase_acc = np.zeros(cfg.phase_bins)
+        self._phase_decay = math.exp(-self.hop_s / cfg.phase_memory_seconds)
+        self.phase = 0.0          # текущая доля периода, [0, 1)
+
+        self.flux = 0.0
+        self.threshold = 0.0
+        self.period: Optional[float] = None
+        self.bpm = 0.0
+        self.confidence = 0.0
+        self.next_beat: Optional[float] = None
+        self.last_beat: Optional[float] = None
+        self.last_onset: Optional[float] = None
+        self._above = False
+        self.onsets = 0
+        self.beats = 0
+
+    def _flux(self, frame: np.ndarray) -> float:
+        np.multiply(frame, self.window, out=self._windowed)
+        if _RFFT_HAS_OUT:
+            np.fft.rfft(self._windowed, out=self._spec)
+            np.abs(self._spec, out=self._mag)
+        else:
+            np.abs(np.fft.rfft(self._windowed), out=self._mag, casting="unsafe")
+        np.log1p(self._mag, out=self._mag)
+        np.subtract(self._mag, self._prev, out=self._diff)
+        np.maximum(self._diff, 0.0, out=self._diff)
+        self._prev, self._mag = self._mag, self._prev
+        return float(np.dot(self._diff, self._weights))
+
+    def _threshold(self, flux: float) -> float:
+        old = self._fl[self._fl_i]
+        self._fl[self._fl_i] = flux
+        self._fl_i = (self._fl_i + 1) % len(self._fl)
+        if self._fl_n < len(self._fl):
+            self._fl_n += 1
+            old = 0.0
+        self._fl_sum += flux - old
+        self._fl_sq += flux * flux - old * old
+        mean = self._fl_sum / self._fl_n
+        var = max(0.0, self._fl_sq / self._fl_n - mean * mean)
+        self._mean = mean
+        return mean + self.cfg.threshold_k * math.sqrt(var)
+
+    def _tempo(self, novelty: float):
+        H = self._H
+        self._hist[self._hi] = novelty
+        self._hist[self._hi + H] = novelty
+        newest = self._hi + H
+        self._hi = (self._hi + 1) % H
+        lagged = self._hist[newest - self._lag_max:newest - self._lag_min + 1]
+        np.multiply(lagged, novelty, out=self._tmp)
+        self._acf *= self._decay
+        self._acf += self._tmp
+        np.multiply(self._acf, self._prior, out=self._tmp)
+        j = int(np.argmax(self._tmp))
+        peak = self._tmp[j]
+        if peak <= 0.0:
+            return
+        # параболическая интерполяция пика — период точнее одного hop'а
+        off = 0.0
+        if 0 < j < len(self._tmp) - 1:
+            a, b, c = self._tmp[j - 1], peak, self._tmp[j + 1]
+            den = a - 2.0 * b + c
+            if den < 0.0:
+                off = 0.5 * (a - c) / den
+        lag = self._lag_max - (j + off)
+        self.period = lag * self.hop_s
+        self.bpm = 60.0 / self.period
+        self.confidence = float(peak / (np.add.reduce(self._tmp) / len(self._tmp) + 1e-12))
+
+    def _beat_phase(self, novelty: float) -> float:
+        """Доля периода, на которую приходится бит (по максимуму накопителя)."""
+        nb = len(self._phase_acc)
+        acc = self._phase_acc
+        acc *= self._phase_decay
+        acc[int(self.phase * nb) % nb] += novelty
+        j = int(np.argmax(acc))
+        a, b, c = acc[j - 1], acc[j], acc[(j + 1) % nb]
+        den = a - 2.0 * b + c
+        off = 0.5 * (a - c) / den if den < 0.0 else 0.0
+        return ((j + 0.5 + off) / nb) % 1.0
+
+    def update(self, frame: np.ndarray, now: Optional[float] = None) -> dict:
+        if now is None:
+            now = self.clock()
+        flux = self._flux(frame)
+        thr = self._threshold(flux)
+        self.flux, self.threshold = flux, thr
+        novelty = max(0.0, flux - self._mean)
+        self._tempo(novelty)
+
+        # онсет — пересечение порога снизу вверх (без ожидания пика: минус один hop задержки)
+        above = flux > thr
+        onset = (above and not self._above
+                 and (self.last_onset is None or now - self.last_onset >= self.cfg.min_onset_interval))
+        self._above = above
+        if onset:
+            self.onsets += 1
+            self.last_onset = now
+
+        beat = False
+        beat_time = None
+        self.next_beat = None
+        if self.period is not None:
+            dphi = self.hop_s / self.period
+            self.phase = (self.phase + dphi) % 1.0
+            target = self._beat_phase(novelty)
+            ahead = (target - self.phase) % 1.0          # сколько периода до бита
+            live = self.last_onset is not None and now - self.last_onset <= self.cfg.hold_beats * self.period
+            if live:
+                # бит попадает в текущий hop (±пол-hop'а) — выстрел сейчас, а не на hop позже
+                if ahead <= 0.5 * dphi or ahead >= 1.0 - 0.5 * dphi:
+                    bt = now + (ahead if ahead < 0.5 else ahead - 1.0) * self.period
+                    if self.last_beat is None or bt - self.last_beat >= 0.5 * self.period:
+                        beat = True
+                        beat_time = bt
+                        self.last_beat = bt
+                        self.beats += 1
+                self.next_beat = now + (ahead if ahead > 0.5 * dphi else ahead + 1.0) * self.period
+
+        return {
+            "flux": flux,
+            "threshold": thr,
+            "onset": onset,
+            "beat": beat,
+            "beat_time": beat_time,
+            "next_beat": self.next_beat,
+            "bpm": self.bpm,
+            "confidence": self.confidence,
+            "now": now,
+        }
+
+    def feed(self, samples: np.ndarray, now: Optional[float] = None) -> List[dict]:
+        """Блок любой длины; на каждый hop — результат update(). now — время конца блока."""
+        if now is None:
+            now = self.clock()
+        n = len(samples)
+        return [self.update(self.framer.frame(), now - (n - end) / self.sr)
+                for end in self.framer.push(samples)]
@@ -0,0 +1,266 @@
+import datetime
+import json
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+audio_logger = logging.getLogger("audio_diag")
+
+_WAV_HEADER = 44
+
+
+def _wav_header(n_frames: int, samplerate: int) -> bytes:
+    """Заголовок WAV float32 mono (WAVE_FORMAT_IEEE_FLOAT) — читается и replay'ем (--replay)."""
+    data_len = n_frames * 4
+    return (b"RIFF" + struct.pack("<I", 36 + data_len) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 3, 1, samplerate, samplerate * 4, 4, 32)
+            + b"data" + struct.pack("<I", data_len))
+
+
+@dataclass
+class _Recording:
+    start_block: int          # первый блок окна (до триггера)
+    trigger_block: int        # блок, на обработке которого сработал триггер
+    end_block: int            # первый блок после окна
+    reason: str
+    wall_time: float
+    state: Dict[str, Any]
+    triggers: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class BlackBoxRecorder:
+    """
+    "Чёрный ящик": по триггеру (переход FSM или запрос вручную) пишет в WAV последние
+    pre_seconds звука до него и post_seconds после, рядом — JSON с состоянием детектора.
+
+    Истории отдельно не копируем: кольцо захвата выделяется с запасом на pre_seconds, и блоки,
+    уже отданные основному циклу, лежат в нём, пока производитель их не перезапишет. trigger()
+    из цикла обработки только запоминает номер блока и кладёт заявку в очередь. Номер — блока,
+    на обработке которого принято решение (а не голова захвата: при отставании цикла она
+    впереди), поэтому trigger_offset_frames в JSON совпадает с блоком решения; копирует слоты
+    кольца в memmap WAV фоновый поток. Копия блока k годна, если после неё ring.head() всё ещё
+    меньше k + capacity (производитель не мог начать писать в этот слот); иначе блок обнуляется
+    и учитывается в lost_blocks.
+
+    В JSON — состояние детектора в момент триггера (baseline, шумовой фон, FSM) и context с
+    настройками живой цепочки: по ним --replay стартует с тех же порогов, без калибровки на
+    звуке до триггера. Зоны не воспроизводятся: в WAV — моно-сумма каналов.
+
+    Триггеры во время уже идущей записи попадают в её JSON. Место на диске ограничено:
+    после каждой записи старые файлы удаляются сверх max_files / max_bytes.
+    """
+
+    def __init__(self, ring, samplerate: int, pre_seconds: float = 10.0, post_seconds: float = 3.0,
+                 out_dir: str = "logs/blackbox", max_files: int = 20, max_bytes: int = 200 * 1024 * 1024,
+                 context: Optional[Dict[str, Any]] = None):
+        self.out_dir = out_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.context = context or {}
+        self._lock = threading.Lock()
+        self.ring = None
+        self._generation = 0   # номер кольца: номера блоков старого кольца к новому не относятся
+        self.attach(ring, samplerate)
+        self._q: "queue.Queue" = queue.Queue(maxsize=64)
+        self._active: Optional[_Recording] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.recordings = 0
+        self.dropped_triggers = 0
+        self.lost_blocks = 0
+
+    @staticmethod
+    def blocks_for(seconds: float, samplerate: int, blocksize: int) -> int:
+        return int(np.ceil(seconds * samplerate / blocksize))
+
+    def attach(self, ring, samplerate: int):
+        """Новое кольцо (например, после горячей перезагрузки аудио); идущая запись обрывается."""
+        with self._lock:
+            self.ring = ring
+            self._generation += 1
+            self.samplerate = samplerate
+            self.blocksize = ring.blocksize
+            self.pre_blocks = self.blocks_for(self.pre_seconds, samplerate, ring.blocksize)
+            self.post_blocks = self.blocks_for(self.post_seconds, samplerate, ring.blocksize)
+            if self.pre_blocks >= ring.capacity:
+                raise ValueError(f"Capture ring ({ring.capacity} blocks) is too small for "
+                                 f"{self.pre_seconds}s of pre-trigger history ({self.pre_blocks} blocks)")
+
+    def detach(self):
+        """Отцепиться от кольца до того, как его закроют."""
+        with self._lock:
+            self.ring = None
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._worker, name="blackbox", daemon=True)
+        self._thread.start()
+        audio_logger.info("[BlackBox] keeping %.1fs before / %.1fs after triggers -> %s",
+                          self.pre_seconds, self.post_seconds, self.out_dir)
+
+    def stop(self, timeout: float = 5.0):
+        """Дописать идущую запись тем, что уже есть в кольце, и остановить поток."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def trigger(self, reason: str, state: Optional[Dict[str, Any]] = None, block: Optional[int] = None):
+        """
+        Из цикла обработки: только номер блока и заявка в очередь, без копий и диска.
+        block — номер обработанного блока кольца (ring.consumed() - 1 и раньше в пакете);
+        без него — последний записанный в кольцо блок.
+        """
+        ring = self.ring
+        if ring is None:
+            return
+        if block is None:
+            block = ring.head() - 1
+        try:
+            self._q.put_nowait((self._generation, block, reason, time.time(), state or {}))
+        except queue.Full:
+            self.dropped_triggers += 1
+
+    # --- фоновый поток ---
+
+    def _worker(self):
+        writer = None
+        while True:
+            stopping = self._stop.is_set()
+            # пока идёт запись — просыпаемся раз в блок, чтобы копировать окно после триггера вовремя
+            timeout = 0.1 if self._active is None else min(0.1, self.blocksize / float(self.samplerate))
+            try:
+                item = self._q.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is not None and item[0] != self._generation:
+                item = None   # заявка к кольцу, которое уже заменили
+            if item is not None:
+                _, block, reason, wall, state = item
+                rec = self._active
+                if rec is not None and block < rec.end_block:
+                    rec.triggers.append({"reason": reason, "block": block, "wall_time": wall, "state": state})
+                else:
+                    if rec is not None:
+                        self._finish(rec, writer)
+                    writer = self._begin(block, reason, wall, state)
+            if self._active is not None:
+                done = self._copy_available(writer)
+                if done or stopping:
+                    self._finish(self._active, writer)
+            if stopping and self._q.empty() and self._active is None:
+                return
+
+    def _begin(self, block: int, reason: str, wall: float, state: Dict[str, Any]):
+        start = max(0, block - self.pre_blocks)
+        rec = _Recording(start_block=start, trigger_block=block, end_block=block + 1 + self.post_blocks,
+                         reason=reason, wall_time=wall, state=state)
+        stamp = datetime.datetime.fromtimestamp(wall).strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        base = os.path.join(self.out_dir, f"bb_{stamp}_{reason}")
+        n_frames = (rec.end_block - start) * self.blocksize
+        with open(base + ".wav", "wb") as f:
+            f.write(_wav_header(n_frames, self.samplerate))
+            f.truncate(_WAV_HEADER + n_frames * 4)
+        data = np.memmap(base + ".wav", dtype="<f4", mode="r+", offset=_WAV_HEADER, shape=(n_frames,))
+        self._active = rec
+        return {"base": base, "data": data, "next": start, "frames": 0, "lost": 0, "gen": self._generation}
+
+    def _copy_available(self, w) -> bool:
+        """Скопировать всё, что уже записано в кольцо; True — окно записи заполнено."""
+        rec = self._active
+        with self._lock:
+            ring = self.ring
+            if ring is None or w["gen"] != self._generation:
+                return True
+            head = ring.head()
+            cap = ring.capacity
+            bs = self.blocksize
+            while w["next"] < min(head, rec.end_block):
+                k = w["next"]
+                dst = w["data"][(k - rec.start_block) * bs:(k - rec.start_block + 1) * bs]
+                if head - k >= cap:
+                    dst[:] = 0.0   # слот уже перезаписан (поток не успел)
+                    w["lost"] += 1
+                else:
+                    i = k % cap
+                    n = min(int(ring.lengths[i]), bs)
+                    dst[:n] = ring.buf[i, :n]
+                    if n < bs:
+                        dst[n:] = 0.0
+                    head = ring.head()
+                    if head - k >= cap:
+                        dst[:] = 0.0
+                        w["lost"] += 1
+                w["next"] = k + 1
+                w["frames"] += bs
+        return w["next"] >= rec.end_block
+
+    def _finish(self, rec: _Recording, w):
+        self._active = None
+        data = w["data"]
+        data.flush()
+        written = w["frames"]
+        del data
+        w["data"] = None
+        wav = w["base"] + ".wav"
+        total = (rec.end_block - rec.start_block) * self.blocksize
+        if written < total:
+            # оборванная запись (остановка, смена кольца): заголовок и размер — по факту
+            with open(wav, "r+b") as f:
+                f.write(_wav_header(written, self.samplerate))
+                f.truncate(_WAV_HEADER + written * 4)
+        sidecar = {
+            "reason": rec.reason,
+            "wall_time": rec.wall_time,
+            "samplerate": self.samplerate,
+            "blocksize": self.blocksize,
+            "pre_seconds": (rec.trigger_block - rec.start_block) * self.blocksize / self.samplerate,
+            "post_seconds": max(0, written // self.blocksize - (rec.trigger_block + 1 - rec.start_block))
+                            * self.blocksize / self.samplerate,
+            "trigger_offset_frames": (rec.trigger_block - rec.start_block) * self.blocksize,
+            "lost_blocks": w["lost"],
+            "state": rec.state,
+            "later_triggers": [dict(t, offset_frames=(t["block"] - rec.start_block) * self.blocksize)
+                               for t in rec.triggers],
+            "context": self.context,
+        }
+        with open(w["base"] + ".json", "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, indent=1, default=float)
+        self.recordings += 1
+        self.lost_blocks += w["lost"]
+        audio_logger.info("[BlackBox] %s: %.1fs (trigger at %.1fs)%s", wav, written / self.samplerate,
+                          sidecar["pre_seconds"], " lost %d block(s)" % w["lost"] if w["lost"] else "")
+        self._rotate()
+
+    def _rotate(self):
+        try:
+            names = [n for n in os.listdir(self.out_dir) if n.startswith("bb_") and n.endswith(".wav")]
+        except OSError:
+            return
+        files = []
+        for n in names:
+            p = os.path.join(self.out_dir, n)
+            try:
+                st = os.stat(p)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, p))
+        files.sort()
+        total = sum(f[1] for f in files)
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            _, size, p = files.pop(0)
+            total -= size
+            for path in (p, p[:-4] + ".json"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
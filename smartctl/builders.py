@@ -0,0 +1,379 @@
+"""
+Сборка объектов по секциям конфига: настройки детектора/FSM/сцен, аудиопоток, опциональные
+блоки (полосы, зоны, бит, расписание MIDI, DMX, чёрный ящик). Общие для живого цикла,
+горячей перезагрузки и --replay; тяжёлые модули импортируются только под включённую секцию.
+"""
+import logging
+import time
+from typing import Any, Tuple
+
+from smartctl.controller import SceneController, SceneTriggerConfig, BeatTrigger, BeatTriggerConfig, BeatQuantizedScene
+from smartctl.detectors import LevelConfig
+from smartctl.midi_io import MidiSender
+from smartctl.sliding import SlidingRms, rescale_alpha
+from smartctl.state_machine import FSMConfig, OnOffFSM
+
+audio_logger = logging.getLogger("audio_diag")
+player_logger = logging.getLogger("player")
+
+# поля LevelConfig, которые полоса спектра или зона может задать сама (остальное — из logic)
+LEVEL_OVERRIDABLE = ("on_threshold", "off_threshold", "on_multiplier", "off_multiplier",
+                     "min_on_threshold", "min_off_threshold", "dynamic_threshold", "ema_alpha")
+
+
+def on_off(d: dict) -> Tuple[Any, Any]:
+    """Значения ключей on/off: YAML 1.1 читает их без кавычек как True/False."""
+    return d.get("on", d.get(True)), d.get("off", d.get(False))
+
+
+def build_trigger_cfg(m: dict) -> SceneTriggerConfig:
+    mode = m.get("trigger_mode", "same_note")
+    ch = m.get("channel", 1)
+    vel = m.get("velocity", 127)
+
+    if mode == "same_note":
+        note = m.get("note")
+        if note is None:
+            raise ValueError("Config error: trigger_mode=same_note, but midi.note is missing. Example: midi.note: 60")
+        player_logger.info("[CFG] trigger_mode=same_note note=%s ch=%s vel=%s", note, ch, vel)
+        return SceneTriggerConfig(mode="same_note", channel=ch, velocity=vel, note=note)
+
+    if mode == "separate_notes":
+        note_on, note_off = on_off(m.get("notes") or {})
+        if note_on is None or note_off is None:
+            raise ValueError("Config error: trigger_mode=separate_notes requires midi.notes.on and midi.notes.off. "
+                             "Example:\n  midi:\n    trigger_mode: separate_notes\n    notes:\n      on: 60\n      off: 61")
+        player_logger.info("[CFG] trigger_mode=separate_notes on=%s off=%s ch=%s vel=%s", note_on, note_off, ch, vel)
+        return SceneTriggerConfig(mode="separate_notes", channel=ch, velocity=vel, note_on=note_on, note_off=note_off)
+
+    if mode == "cc_gate":
+        cc = m.get("cc")
+        if cc is None:
+            raise ValueError("Config error: trigger_mode=cc_gate requires midi.cc (controller number).")
+        player_logger.info("[CFG] trigger_mode=cc_gate cc=%s ch=%s", cc, ch)
+        return SceneTriggerConfig(mode="cc_gate", channel=ch, velocity=vel, cc=cc)
+
+    raise ValueError(f"Unknown trigger_mode: {mode}")
+
+
+def build_level_cfg(cfg: dict) -> LevelConfig:
+    a = cfg["audio"]
+    l = cfg["logic"]
+    return LevelConfig(
+        ema_alpha=a["ema_alpha"],
+        dynamic_threshold=l["dynamic_threshold"],
+        on_multiplier=l.get("on_multiplier", 2.5),
+        off_multiplier=l.get("off_multiplier", 1.6),
+        min_on_threshold=l.get("min_on_threshold", 0.00006),
+        min_off_threshold=l.get("min_off_threshold", 0.00004),
+        on_threshold=l.get("on_threshold", 0.00005),
+        off_threshold=l.get("off_threshold", 0.00003),
+        startup_grace_seconds=l["startup_grace_seconds"],
+        min_on_seconds=l["min_on_seconds"],
+        min_off_seconds=l["min_off_seconds"],
+        silence_hold_seconds=l["silence_hold_seconds"],
+        calibration_seconds=a["calibration_seconds"],
+    )
+
+
+def build_fsm_cfg(cfg: dict) -> FSMConfig:
+    a = cfg["audio"]
+    l = cfg["logic"]
+    return FSMConfig(
+        startup_grace_seconds=l["startup_grace_seconds"],
+        min_on_seconds=l["min_on_seconds"],
+        min_off_seconds=l["min_off_seconds"],
+        silence_hold_seconds=l["silence_hold_seconds"],
+        calibration_seconds=a["calibration_seconds"],
+    )
+
+
+def audio_params(cfg: dict):
+    a = cfg["audio"]
+    return (a["samplerate"], a["blocksize"], a["channels"], a.get("device_index"), a.get("device_name_contains"),
+            bool(a.get("capture_process")))
+
+
+def midi_params(cfg: dict):
+    m = cfg["midi"]
+    return m["output_port_name_contains"], m.get("threaded", True), m.get("queue_size"), m.get("batch_max")
+
+
+def make_midi(cfg: dict, port_hint=None) -> MidiSender:
+    """MidiSender по секции midi — и на старте, и при смене порта горячей перезагрузкой."""
+    m = cfg["midi"]
+    return MidiSender(port_substr=m["output_port_name_contains"], threaded=m.get("threaded", True),
+                      queue_size=int(m.get("queue_size", 256)), batch_max=int(m.get("batch_max", 64)),
+                      port_hint=port_hint)
+
+
+# секции, которые применяются только при перезапуске
+RESTART_SECTIONS = ("spectral", "beat", "dmx", "metrics", "latency", "telemetry", "reload", "hop_mode",
+                    "noise_floor", "async_runner", "scenes", "blackbox", "startup", "failover",
+                    "midi_scheduler", "zones")
+
+
+def build_noise_floor(cfg: dict):
+    """NoiseFloor по секции noise_floor (или None); горизонт считается в шагах детектора (блок или hop)."""
+    from smartctl.noise_floor import NoiseFloor
+
+    nf = cfg["noise_floor"]
+    if not nf.get("enabled"):
+        return None
+    a = cfg["audio"]
+    step = int(cfg["hop_mode"]["hop"]) if cfg["hop_mode"].get("enabled") else a["blocksize"]
+    horizon = max(1, int(round(float(nf["horizon_seconds"]) * a["samplerate"] / step)))
+    player_logger.info("[CFG] noise floor: p%s over %ss (%d steps), max %.1f dB/s", nf["percentile"],
+                       nf["horizon_seconds"], horizon, float(nf["max_rate_db_per_s"]))
+    return NoiseFloor(horizon, percentile=float(nf["percentile"]),
+                      max_rate_db_per_s=float(nf["max_rate_db_per_s"]))
+
+
+def make_audio(cfg: dict, device_hint=None):
+    """
+    AudioStream по конфигу; в hop-режиме блок устройства — hop, окно анализа — audio.blocksize.
+    device_hint — (индекс, имя) устройства из кэша прошлого запуска для audio.device_name_contains.
+    """
+    a = cfg["audio"]
+    blocksize, ring_blocks = a["blocksize"], 32
+    if cfg["hop_mode"].get("enabled"):
+        blocksize = int(cfg["hop_mode"]["hop"])
+        ring_blocks = max(32, 32 * a["blocksize"] // blocksize)   # тот же запас по времени, что и без hop'а
+    if cfg["blackbox"].get("enabled"):
+        # история для чёрного ящика живёт в самом кольце захвата — добавляем pre_seconds сверх запаса
+        from smartctl.blackbox import BlackBoxRecorder
+        ring_blocks += BlackBoxRecorder.blocks_for(float(cfg["blackbox"]["pre_seconds"]), a["samplerate"], blocksize)
+    if a.get("capture_process"):
+        # захват в отдельном процессе: sounddevice импортирует только он
+        from smartctl.audio_process import ProcessAudioStream as Stream
+    else:
+        # sounddevice/PortAudio нужен только живому режиму — реплей работает и без него
+        from smartctl.audio_input import AudioStream as Stream
+    return Stream(samplerate=a["samplerate"], blocksize=blocksize, channels=a["channels"],
+                  device_index=a.get("device_index"), ring_blocks=ring_blocks,
+                  device_name=a.get("device_name_contains"), device_hint=device_hint,
+                  channel_levels=bool(cfg["zones"].get("enabled")))
+
+
+def build_features(cfg):
+    a = cfg["audio"]
+    if not a.get("numba"):
+        return None   # numpy-ядро детектор создаст сам по первому блоку
+    from smartctl.features import FeatureKernel
+    block = int(cfg["hop_mode"]["hop"]) if cfg["hop_mode"].get("enabled") else int(a["blocksize"])
+    t0 = time.perf_counter()
+    kernel = FeatureKernel(block, use_numba=True)
+    audio_logger.info("[Audio] block features: numba kernel ready in %.0f ms", (time.perf_counter() - t0) * 1e3)
+    return kernel
+
+
+def build_failover(cfg: dict, get_audio, get_midi):
+    """DeviceSupervisor по секции failover; порог зависания — не меньше 4 блоков устройства."""
+    from smartctl.failover import DeviceSupervisor
+
+    fo, a = cfg["failover"], cfg["audio"]
+    block = (int(cfg["hop_mode"]["hop"]) if cfg["hop_mode"].get("enabled") else a["blocksize"]) / a["samplerate"]
+    stall = fo.get("stall_seconds")
+    if stall is None:
+        stall = max(0.25, 4 * block)
+    elif float(stall) < 4 * block:
+        # короче пары блоков — нормальная пауза между callback'ами сошла бы за зависание
+        player_logger.warning("[Failover] stall_seconds %.3fs is shorter than 4 device blocks, using %.3fs",
+                              float(stall), 4 * block)
+        stall = 4 * block
+    return DeviceSupervisor(get_audio, get_midi, stall_seconds=float(stall),
+                            poll_seconds=float(fo.get("poll_seconds", 0.02)),
+                            backoff_initial=float(fo.get("backoff_initial_seconds", 0.05)),
+                            backoff_max=float(fo.get("backoff_max_seconds", 0.5)),
+                            port_check_seconds=float(fo.get("midi_port_check_seconds", 0.1)))
+
+
+def build_blackbox(cfg: dict, audio, level_cfg: LevelConfig):
+    from smartctl.blackbox import BlackBoxRecorder
+
+    bb = cfg["blackbox"]
+    return BlackBoxRecorder(audio.ring, cfg["audio"]["samplerate"],
+                            pre_seconds=float(bb["pre_seconds"]), post_seconds=float(bb["post_seconds"]),
+                            out_dir=bb["dir"], max_files=int(bb["max_files"]),
+                            max_bytes=int(float(bb["max_mb"]) * 1024 * 1024),
+                            context=blackbox_context(cfg, level_cfg))
+
+
+def blackbox_context(cfg: dict, level_cfg: LevelConfig) -> dict:
+    """Настройки живой цепочки детектора для JSON чёрного ящика (по ним её собирает --replay)."""
+    from dataclasses import asdict
+    a = cfg["audio"]
+    return {"level": asdict(level_cfg), "hop_mode": cfg["hop_mode"], "noise_floor": cfg["noise_floor"],
+            "audio": {"samplerate": a["samplerate"], "blocksize": a["blocksize"], "numba": a.get("numba", False)}}
+
+
+def make_sliding(cfg: dict):
+    h = cfg["hop_mode"]
+    if not h.get("enabled"):
+        return None
+    return SlidingRms(window=cfg["audio"]["blocksize"], hop=int(h["hop"]))
+
+
+def loop_level_cfg(cfg: dict, level_cfg: LevelConfig) -> LevelConfig:
+    """ema_alpha задан на блок audio.blocksize; в hop-режиме EMA шагает каждый hop — пересчитываем."""
+    from dataclasses import replace
+    if not cfg["hop_mode"].get("enabled"):
+        return level_cfg
+    return replace(level_cfg, ema_alpha=rescale_alpha(level_cfg.ema_alpha, cfg["audio"]["blocksize"],
+                                                      int(cfg["hop_mode"]["hop"])))
+
+
+def band_level_cfgs(cfg: dict, level_cfg: LevelConfig):
+    """LevelConfig каждой полосы спектра: logic.* с переопределениями полосы."""
+    from dataclasses import replace
+
+    return {b["name"]: replace(level_cfg, **{k: b[k] for k in LEVEL_OVERRIDABLE if k in b})
+            for b in cfg["spectral"]["bands"]}
+
+
+def build_spectral(cfg: dict, level_cfg: LevelConfig, midi):
+    """Спектральный детектор и выходы полос: [(имя, OnOffFSM, SceneController)] для полос с midi."""
+    from smartctl.spectral import BandSpec, SpectralConfig, SpectralDetector
+
+    sp = cfg["spectral"]
+    m = cfg["midi"]
+    bands = [BandSpec(name=b["name"], lo_hz=float(b["lo"]), hi_hz=float(b["hi"])) for b in sp["bands"]]
+    outputs = []
+    spectral = SpectralDetector(SpectralConfig(n_fft=sp["n_fft"], hop=sp["hop"], bands=bands),
+                                cfg["audio"]["samplerate"], band_level_cfgs(cfg, level_cfg))
+    for b in sp["bands"]:
+        if not b.get("midi"):
+            continue
+        bm = dict(b["midi"])
+        bm.setdefault("channel", m.get("channel", 1))
+        bm.setdefault("velocity", m.get("velocity", 127))
+        scene = SceneController(midi, build_trigger_cfg(bm))
+        outputs.append((b["name"], OnOffFSM(build_fsm_cfg(cfg)), scene))
+        player_logger.info("[CFG] spectral band '%s' %s-%s Hz drives its own scene", b["name"], b["lo"], b["hi"])
+    return spectral, outputs
+
+
+def zone_level_cfgs(cfg: dict, level_cfg: LevelConfig):
+    from dataclasses import replace
+
+    # в hop-режиме блок зоны — hop устройства: ema_alpha пересчитывается, как у основного детектора
+    return [loop_level_cfg(cfg, replace(level_cfg, **{k: z[k] for k in LEVEL_OVERRIDABLE if k in z}))
+            for z in cfg["zones"]["groups"]]
+
+
+def build_zones(cfg: dict, level_cfg: LevelConfig, midi):
+    """ZoneDetector по входным каналам и сцена каждой зоны (свой MIDI-канал/ноты)."""
+    from smartctl.zones import ZoneDetector, ZoneSpec
+
+    m = cfg["midi"]
+    n_channels = int(cfg["audio"]["channels"])
+    specs, scenes = [], []
+    for i, z in enumerate(cfg["zones"]["groups"]):
+        name = z.get("name") or f"zone{i + 1}"
+        chans = z.get("channels")
+        chans = [chans] if isinstance(chans, int) else list(chans or [])
+        if not z.get("midi"):
+            raise ValueError(f"Config error: zones.groups[{i}] '{name}' needs a midi section")
+        specs.append(ZoneSpec(name=name, channels=[int(c) - 1 for c in chans]))
+        zm = dict(z["midi"])
+        zm.setdefault("channel", m.get("channel", 1))
+        zm.setdefault("velocity", m.get("velocity", 127))
+        scenes.append(SceneController(midi, build_trigger_cfg(zm)))
+        player_logger.info("[CFG] zone '%s' (inputs %s) drives its own scene on MIDI channel %s",
+                           name, ",".join(str(c) for c in chans), zm["channel"])
+    zones = ZoneDetector(specs, n_channels, zone_level_cfgs(cfg, level_cfg), build_fsm_cfg(cfg))
+    return zones, scenes
+
+
+def build_beat(cfg: dict, midi, scene: SceneController):
+    """BeatTracker, нота на бит (или None) и обёртка сцены для квантования (или None)."""
+    from smartctl.beat import BeatConfig, BeatTracker
+
+    b = cfg["beat"]
+    m = cfg["midi"]
+    tracker = BeatTracker(BeatConfig(n_fft=b["n_fft"], hop=b["hop"], min_bpm=float(b["min_bpm"]),
+                                     max_bpm=float(b["max_bpm"])), cfg["audio"]["samplerate"])
+    trigger = None
+    bm = b.get("midi") or {}
+    if bm.get("note") is not None:
+        trigger = BeatTrigger(midi, BeatTriggerConfig(
+            channel=bm.get("channel", m.get("channel", 1)),
+            note=bm["note"],
+            velocity=bm.get("velocity", m.get("velocity", 127)),
+            only_when_on=bm.get("only_when_on", True),
+        ), scene=scene)
+        player_logger.info("[CFG] beat note=%s ch=%s only_when_on=%s", trigger.cfg.note, trigger.cfg.channel,
+                           trigger.cfg.only_when_on)
+    quantized = BeatQuantizedScene(scene) if b.get("quantize_scene") else None
+    return tracker, trigger, quantized
+
+
+def build_scheduler(cfg: dict, midi):
+    """MidiScheduler по секции midi_scheduler: основной порт "main" с задержкой latency_ms."""
+    from smartctl.midi_scheduler import MidiScheduler
+
+    sc = cfg["midi_scheduler"]
+    ck = sc.get("clock") or {}
+    if ck.get("enabled") and ck.get("bpm") is None and not cfg["beat"].get("enabled"):
+        raise ValueError("Config error: midi_scheduler.clock without bpm follows the beat tracker; "
+                         "enable beat or set clock.bpm")
+    spin = sc.get("spin_ms")
+    scheduler = MidiScheduler(spin_seconds=None if spin is None else float(spin) / 1e3,
+                              max_pending=int(sc.get("max_pending", 10000)))
+    scheduler.add_port("main", midi, float(sc.get("latency_ms", 0.0)) / 1e3)
+    return scheduler
+
+
+def build_scenes(cfg: dict, midi, clock):
+    """MultiSceneController по секции scenes; источники проверяются по включённым детекторам."""
+    from smartctl.scenes import MultiSceneController, SceneRule
+
+    m = cfg["midi"]
+    band_names = {b["name"] for b in cfg["spectral"]["bands"]} if cfg["spectral"].get("enabled") else set()
+    rules = []
+    for r in cfg["scenes"].get("rules") or []:
+        name = r.get("name")
+        if not name or not r.get("midi"):
+            raise ValueError(f"Config error: scenes.rules entry needs name and midi: {r}")
+        source = r.get("source", "level")
+        if source == "beat":
+            if not cfg["beat"].get("enabled"):
+                raise ValueError(f"Config error: scene '{name}' uses source 'beat' but beat.enabled is false")
+        elif source.startswith("band:"):
+            if source[5:] not in band_names:
+                raise ValueError(f"Config error: scene '{name}' uses unknown or disabled spectral band '{source[5:]}'")
+        elif source != "level":
+            raise ValueError(f"Config error: scene '{name}' has unknown source '{source}' (level, band:<name>, beat)")
+        rm = dict(r["midi"])
+        rm.setdefault("channel", m.get("channel", 1))
+        rm.setdefault("velocity", m.get("velocity", 127))
+        rules.append(SceneRule(name=name, source=source, trigger=build_trigger_cfg(rm),
+                               priority=int(r.get("priority", 0)), group=r.get("group"),
+                               cooldown_seconds=float(r.get("cooldown_seconds", 0.0))))
+    ctrl = MultiSceneController(midi, rules, clock=clock)
+    player_logger.info("[CFG] %d scene rule(s), %d source(s), %d group(s)", len(rules), len(ctrl.source_names),
+                       ctrl.n_groups)
+    return ctrl
+
+
+def build_dmx(cfg: dict):
+    """DmxOutput и сцена на нём (или None, если в конфиге нет dmx.scene)."""
+    from smartctl.dmx_out import DmxOutput, DmxSceneController
+
+    d = cfg["dmx"]
+    dmx = DmxOutput(
+        universes=[int(u) for u in d["universes"]],
+        protocol=d["protocol"],
+        host=d.get("host"),
+        port=d.get("port"),
+        fps=float(d["fps"]),
+        keepalive_seconds=float(d["keepalive_seconds"]),
+    )
+    sc = d.get("scene")
+    dmx_scene = None
+    if sc:
+        on_values, off_values = on_off(sc)
+        on_values, off_values = on_values or {}, off_values or {}
+        dmx_scene = DmxSceneController(dmx, dmx.index_of(int(sc.get("universe", dmx.universe_ids[0]))),
+                                       on_values=on_values, off_values=off_values)
+    return dmx, dmx_scene
@@ -1,14 +1,20 @@
+import marshal
 import os
-import yaml
 
 _DEFAULT = {
     "audio": {
         "device_index": None,
+        # подстрока имени входного устройства (вместо device_index); найденный индекс кэшируется
+        "device_name_contains": None,
         "samplerate": 44100,
         "blocksize": 1024,
         "channels": 1,
         "calibration_seconds": 1.0,
         "ema_alpha": 0.3,
+        # захват в отдельном процессе (блоки через общую память) — callback не делит GIL с логикой
+        "capture_process": False,
+        # признаки блока (RMS, пик, crest, ZCR, DC) одним скомпилированным проходом — нужен numba
+        "numba": False,
     },
     "logic": {
         "dynamic_threshold": True,
@@ -30,14 +36,190 @@ _DEFAULT = {
         "channel": 1,
         "note": 60,
         "velocity": 127,
-    }
+        # отправка из отдельного потока через очередь (False — синхронно из цикла обработки)
+        "threaded": True,
+        # очередь потока отправки и сколько сообщений он забирает за раз (повторные CC в пачке схлопываются)
+        "queue_size": 256,
+        "batch_max": 64,
+    },
+    # отправка по расписанию: нота бита ставится заранее на предсказанный бит и уходит раньше на
+    # latency_ms (задержка за портом: loopMIDI + световой софт); clock — MIDI clock 24 тика на четверть
+    # с темпом clock.bpm или (bpm: None) темпом трекера бита
+    "midi_scheduler": {
+        "enabled": False,
+        "latency_ms": 0.0,
+        "spin_ms": None,
+        "max_pending": 10000,
+        "clock": {
+            "enabled": False,
+            "bpm": None,
+            "follow_tolerance_bpm": 0.5,
+            "start_stop": True,
+        },
+    },
+    # быстрый старт: кэш найденных устройства/MIDI-порта и последней калибровки;
+    # warm_start — начинать сразу с сохранённым baseline вместо calibration_seconds тишины
+    "startup": {
+        "cache_path": "logs/startup_cache.json",
+        "cache_devices": True,
+        "warm_start": False,
+        "warm_start_max_age_hours": 12.0,
+    },
+    # переподключение при сбое: вход без новых блоков дольше stall_seconds или ошибка отправки MIDI —
+    # устройство переоткрывается в фоне (отсрочка backoff_initial x2 .. backoff_max), состояние
+    # детектора/FSM сохраняется, после восстановления MIDI состояние сцен отправляется заново
+    "failover": {
+        "enabled": False,
+        "stall_seconds": None,   # None — max(0.25, 4 блока устройства)
+        "poll_seconds": 0.02,
+        "backoff_initial_seconds": 0.05,
+        "backoff_max_seconds": 0.5,
+        "midi_port_check_seconds": 0.1,
+    },
+    # задержки по стадиям (p50/p99/max в лог раз в report_seconds и при выходе)
+    "latency": {
+        "enabled": True,
+        "report_seconds": 30.0,
+    },
+    # покадровая телеметрия: в лог каждая N-я строка (0 — выключено), все блоки — в кольцо в памяти,
+    # которое сбрасывается в .npy по сигналу (SIGUSR1 / Ctrl+Break) и при выходе
+    "telemetry": {
+        "log_every_blocks": 43,
+        "ring_blocks": 8192,
+        "dump_path": "logs/telemetry.npy",
+        "dump_on_exit": True,
+    },
+    # HTTP-эндпоинт /metrics в формате Prometheus (только localhost)
+    "metrics": {
+        "enabled": False,
+        "host": "127.0.0.1",
+        "port": 9108,
+    },
+    # горячая перезагрузка: пороги, тайминги и MIDI-триггер меняются без перезапуска и без потери калибровки
+    "reload": {
+        "enabled": True,
+        "poll_seconds": 0.5,
+    },
+    # hop-режим: блок устройства hop отсчётов, RMS по скользящему окну audio.blocksize
+    "hop_mode": {
+        "enabled": False,
+        "hop": 128,
+    },
+    # шумовой фон после калибровки: низкий перцентиль RMS за horizon_seconds, меняется
+    # не быстрее max_rate_db_per_s; при dynamic_threshold подменяет baseline
+    "noise_floor": {
+        "enabled": False,
+        "horizon_seconds": 30.0,
+        "percentile": 10.0,
+        "max_rate_db_per_s": 3.0,
+    },
+    # событийный цикл asyncio: MIDI-сцена переключается сразу в стадии детектора, остальные
+    # выходы (DMX, UDP-телеметрия) — через свои ограниченные очереди, медленный выход не тормозит триггер
+    "async_runner": {
+        "enabled": False,
+        "sinks": {
+            "dmx": {"queue": 16, "policy": "drop_oldest"},
+            "udp_telemetry": {
+                "enabled": False,
+                "host": "127.0.0.1",
+                "port": 9109,
+                "every_blocks": 1,
+                "queue": 8,
+                "policy": "drop_oldest",
+            },
+        },
+    },
+    # чёрный ящик: pre_seconds звука до переключения FSM (или запроса по сигналу) и post_seconds после —
+    # в WAV float32 + JSON с состоянием детектора; старые записи удаляются сверх max_files / max_mb
+    "blackbox": {
+        "enabled": False,
+        "pre_seconds": 10.0,
+        "post_seconds": 3.0,
+        "on_transitions": True,
+        "dir": "logs/blackbox",
+        "max_files": 20,
+        "max_mb": 200,
+    },
+    # правила сцен: источник (level, band:<полоса>, beat), приоритет, группа исключения, cooldown
+    "scenes": {
+        "enabled": False,
+        "rules": [],
+    },
+    "zones": {
+        "enabled": False,
+        # зона: name, channels (номера входов с 1), midi — как у полос спектра;
+        # пороги logic.* (on_threshold, on_multiplier, ...) можно переопределить у зоны
+        "groups": [],
+    },
+    "spectral": {
+        "enabled": False,
+        "n_fft": 1024,
+        "hop": 256,
+        "bands": [
+            {"name": "sub", "lo": 20, "hi": 60},
+            {"name": "bass", "lo": 60, "hi": 250},
+            {"name": "mid", "lo": 250, "hi": 4000},
+            {"name": "high", "lo": 4000, "hi": 16000},
+        ],
+    },
+    "beat": {
+        "enabled": False,
+        "n_fft": 1024,
+        "hop": 256,
+        "min_bpm": 70.0,
+        "max_bpm": 180.0,
+        "quantize_scene": False,
+    },
+    "dmx": {
+        "enabled": False,
+        "protocol": "artnet",
+        "host": None,
+        "port": None,
+        "universes": [0],
+        "fps": 44.0,
+        "keepalive_seconds": 1.0,
+        "blackout_on_exit": True,
+    },
 }
 
+def _cache_path(path: str) -> str:
+    d, name = os.path.split(os.path.abspath(path))
+    return os.path.join(d, "__pycache__", name + ".marshal")
+
+def _read_yaml(path: str) -> dict:
+    """
+    Разобранный YAML кэшируется в __pycache__ (marshal, ключ — mtime и размер файла): импорт
+    PyYAML и разбор занимают десятки миллисекунд старта, чтение кэша — доли миллисекунды.
+    marshal, а не JSON: в конфиге бывают ключи True/False (on/off в YAML 1.1) и числа.
+    """
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cache = _cache_path(path)
+    try:
+        with open(cache, "rb") as f:
+            cached_key, data = marshal.load(f)
+        if cached_key == key:
+            return data
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    import yaml  # только без кэша
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        tmp = cache + ".tmp"
+        with open(tmp, "wb") as f:
+            marshal.dump((key, data), f)
+        os.replace(tmp, cache)
+    except (OSError, ValueError):
+        pass  # каталог только для чтения или тип, который marshal не пишет (даты) — просто без кэша
+    return data
+
 def load(path: str = "config.yaml") -> dict:
     cfg = {}
     if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            cfg = yaml.safe_load(f) or {}
+        cfg = _read_yaml(path)
     # глубокое объединение
     def merge(a, b):
         for k, v in b.items():
@@ -1,6 +1,6 @@
 import logging
 from dataclasses import dataclass
-from typing import Literal, Optional, Dict, Any
+from typing import Literal, Optional, Dict, Any, List, Tuple
 from smartctl.midi_io import MidiSender
 
 player_logger = logging.getLogger("player")
@@ -20,52 +20,156 @@ class SceneTriggerConfig:
     # cc_gate
     cc: Optional[int] = None
 
+def trigger_messages(cfg: SceneTriggerConfig) -> Tuple[Tuple[List[int], ...], Tuple[List[int], ...], str, str]:
+    """Байты MIDI для включения/выключения сцены и строки для лога — собираются один раз на конфиг."""
+    ch = (cfg.channel - 1) & 0x0F
+    vel = cfg.velocity & 0x7F
+    if cfg.mode == "same_note":
+        if cfg.note is None:
+            raise ValueError("Config note required for same_note mode")
+        n = cfg.note & 0x7F
+        return (([0x90 | ch, n, vel],), ([0x80 | ch, n, 0],),
+                f"same_note (note={cfg.note} ch={cfg.channel})", f"same_note (note={cfg.note} ch={cfg.channel})")
+    if cfg.mode == "separate_notes":
+        if cfg.note_on is None or cfg.note_off is None:
+            raise ValueError("Config note_on/note_off required for separate_notes mode")
+        # В FS повесьте note_on на “Запуск”, note_off — на “Остановка” (обе уходят как Note On)
+        return (([0x90 | ch, cfg.note_on & 0x7F, vel],), ([0x90 | ch, cfg.note_off & 0x7F, vel],),
+                f"separate_notes (note_on={cfg.note_on} ch={cfg.channel})",
+                f"separate_notes (note_off={cfg.note_off} ch={cfg.channel})")
+    if cfg.mode == "cc_gate":
+        if cfg.cc is None:
+            raise ValueError("Config cc required for cc_gate mode")
+        # CC 127 = включить, CC 0 = выключить
+        c = cfg.cc & 0x7F
+        return (([0xB0 | ch, c, 127],), ([0xB0 | ch, c, 0],),
+                f"cc_gate (cc={cfg.cc} val=127 ch={cfg.channel})", f"cc_gate (cc={cfg.cc} val=0 ch={cfg.channel})")
+    raise ValueError(f"Unknown trigger_mode: {cfg.mode}")
+
 class SceneController:
+    """Одна сцена: байты включения/выключения собираются при смене cfg, переключение — одна отправка."""
+
     def __init__(self, midi: MidiSender, cfg: SceneTriggerConfig):
         self.midi = midi
         self.cfg = cfg
         self._is_on = False
 
+    @property
+    def cfg(self) -> SceneTriggerConfig:
+        return self._cfg
+
+    @cfg.setter
+    def cfg(self, cfg: SceneTriggerConfig):
+        self._on_msgs, self._off_msgs, self._on_desc, self._off_desc = trigger_messages(cfg)
+        self._cfg = cfg
+
+    @property
+    def is_on(self) -> bool:
+        return self._is_on
+
     def turn_on(self):
         if self._is_on:
             return
-        if self.cfg.mode == "same_note":
-            assert self.cfg.note is not None, "Config note required for same_note mode"
-            self.midi.note_on(self.cfg.note, self.cfg.velocity, self.cfg.channel)
-            player_logger.info("[SCENE] ON same_note (note=%s ch=%s)", self.cfg.note, self.cfg.channel)
-
-        elif self.cfg.mode == "separate_notes":
-            assert self.cfg.note_on is not None, "Config note_on required for separate_notes mode"
-            # В FS повесьте эту ноту на “Запуск”
-            self.midi.note_on(self.cfg.note_on, self.cfg.velocity, self.cfg.channel)
-            player_logger.info("[SCENE] ON separate_notes (note_on=%s ch=%s)", self.cfg.note_on, self.cfg.channel)
-
-        elif self.cfg.mode == "cc_gate":
-            # CC 127 = включить
-            assert self.cfg.cc is not None, "Config cc required for cc_gate mode"
-            self.midi.cc(self.cfg.cc, 127, self.cfg.channel)
-            player_logger.info("[SCENE] ON cc_gate (cc=%s val=127 ch=%s)", self.cfg.cc, self.cfg.channel)
-
+        self.midi.send_batch(self._on_msgs)
+        player_logger.info("[SCENE] ON %s", self._on_desc)
         self._is_on = True
 
     def turn_off(self):
         if not self._is_on:
             return
-        if self.cfg.mode == "same_note":
-            assert self.cfg.note is not None, "Config note required for same_note mode"
+        self.midi.send_batch(self._off_msgs)
+        player_logger.info("[SCENE] OFF %s", self._off_desc)
+        self._is_on = False
+
+    def resend(self):
+        """Повторить текущее состояние (после переподключения порта приёмник мог его потерять)."""
+        self.midi.send_batch(self._on_msgs if self._is_on else self._off_msgs)
+
+@dataclass
+class BeatTriggerConfig:
+    channel: int
+    note: int
+    velocity: int = 127
+    # стрелять по битам только пока основная сцена включена
+    only_when_on: bool = True
+
+class BeatTrigger:
+    """
+    Нота на каждый бит BeatTracker'а; note_off предыдущей уходит перед следующей.
+
+    С планировщиком (MidiScheduler) нота следующего бита ставится заранее на предсказанный момент
+    beat_at + period — планировщик отправит её раньше на задержку порта, и до приёмника она дойдёт
+    ровно в бит. Сам бит тогда уже запланирован прошлым вызовом; сразу нота уходит, только если
+    предсказания не было (первый бит, сбой трекера).
+    """
+
+    def __init__(self, midi: MidiSender, cfg: BeatTriggerConfig, scene: Optional[SceneController] = None,
+                 scheduler=None):
+        self.midi = midi
+        self.cfg = cfg
+        self.scene = scene
+        self.scheduler = scheduler
+        self._held = False
+        self._next_at: Optional[float] = None   # запланированный бит (perf_counter)
+
+    def on_beat(self, beat_at: Optional[float] = None, period: Optional[float] = None):
+        if self.cfg.only_when_on and self.scene is not None and not self.scene.is_on:
+            self.release()
+            return
+        if self.scheduler is not None and beat_at is not None and period:
+            if self._next_at is None or abs(beat_at - self._next_at) > 0.25 * period:
+                self._schedule(beat_at, period)
+            self._next_at = beat_at + period
+            self._schedule(self._next_at, period)
+            return
+        if self._held:
+            self.midi.note_off(self.cfg.note, self.cfg.channel)
+        self.midi.note_on(self.cfg.note, self.cfg.velocity, self.cfg.channel)
+        self._held = True
+
+    def _schedule(self, t: float, period: float):
+        ch = (self.cfg.channel - 1) & 0x0F
+        note = self.cfg.note & 0x7F
+        self.scheduler.schedule(t, [0x90 | ch, note, self.cfg.velocity & 0x7F], tag="beat")
+        self.scheduler.schedule(t + min(0.1, 0.5 * period), [0x80 | ch, note, 0], tag="beat")
+
+    def release(self):
+        if self._next_at is not None:
+            # снять запланированные; нота, уже включённая по расписанию, гасится сразу
+            self.scheduler.cancel("beat")
             self.midi.note_off(self.cfg.note, self.cfg.channel)
-            player_logger.info("[SCENE] OFF same_note (note=%s ch=%s)", self.cfg.note, self.cfg.channel)
+            self._next_at = None
+        if self._held:
+            self.midi.note_off(self.cfg.note, self.cfg.channel)
+            self._held = False
+
+class BeatQuantizedScene:
+    """
+    Обёртка над SceneController: turn_on/turn_off от FSM откладываются до ближайшего бита.
+    Пока трекер не поймал темп (next_beat is None), переключение проходит сразу.
+    """
+
+    def __init__(self, scene: SceneController):
+        self.scene = scene
+        self._pending: Optional[bool] = None
+
+    @property
+    def is_on(self) -> bool:
+        return self.scene.is_on
 
-        elif self.cfg.mode == "separate_notes":
-            assert self.cfg.note_off is not None, "Config note_off required for separate_notes mode"
-            # В FS повесьте эту ноту на “Остановка”
-            self.midi.note_on(self.cfg.note_off, self.cfg.velocity, self.cfg.channel)
-            player_logger.info("[SCENE] OFF separate_notes (note_off=%s ch=%s)", self.cfg.note_off, self.cfg.channel)
+    def turn_on(self):
+        self._pending = True
+
+    def turn_off(self):
+        self._pending = False
 
-        elif self.cfg.mode == "cc_gate":
-            # CC 0 = выключить
-            assert self.cfg.cc is not None, "Config cc required for cc_gate mode"
-            self.midi.cc(self.cfg.cc, 0, self.cfg.channel)
-            player_logger.info("[SCENE] OFF cc_gate (cc=%s val=0 ch=%s)", self.cfg.cc, self.cfg.channel)
+    def on_hop(self, beat_info: Dict[str, Any]):
+        if self._pending is not None and (beat_info["beat"] or beat_info["next_beat"] is None):
+            self.flush()
 
-        self._is_on = False
\ No newline at end of file
+    def flush(self):
+        pending, self._pending = self._pending, None
+        if pending is True:
+            self.scene.turn_on()
+        elif pending is False:
+            self.scene.turn_off()
\ No newline at end of file
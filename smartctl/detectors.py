@@ -1,8 +1,14 @@
+import math
 import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Callable, Dict, Optional
 import numpy as np
 
+from smartctl.features import FeatureKernel
+
+# динамический диапазон весов d^-k внутри куска пакетной EMA (ln 1e100)
+_EMA_LOG_RANGE = 100.0 * math.log(10.0)
+
 @dataclass
 class LevelConfig:
     ema_alpha: float
@@ -30,18 +36,40 @@ class LevelState:
     started_at: float = 0.0
 
 class LevelDetector:
-    def __init__(self, cfg: LevelConfig):
+    def __init__(self, cfg: LevelConfig, clock: Callable[[], float] = time.time, noise_floor=None,
+                 features: Optional[FeatureKernel] = None):
         self.cfg = cfg
-        self.state = LevelState(started_at=time.time())
+        # часы можно подменить (оффлайн-реплей идёт по симулированному времени)
+        self.clock = clock
+        self.state = LevelState(started_at=clock())
+        # noise_floor.NoiseFloor: при dynamic_threshold baseline следит за фоном и после калибровки
+        self.noise_floor = noise_floor
+        # RMS блока без выделений памяти (FeatureKernel.block_rms); пик/crest/ZCR/DC детектору
+        # не нужны — их считает features.compute() тот, кто их читает
+        self.features = features
+
+    def _block_rms(self, samples: np.ndarray) -> float:
+        if self.features is None:
+            self.features = FeatureKernel(len(samples), use_numba=False)
+        return self.features.block_rms(samples)
 
     def calibrate_step(self, samples: np.ndarray):
         # усредняем RMS на этапе калибровки
-        rms = float(np.sqrt(np.mean(samples * samples)) + 1e-12)
+        self.calibrate_value(self._block_rms(samples))
+
+    def warm_start(self, baseline: float):
+        """Baseline из прошлой калибровки: фаза калибровки считается пройденной, FSM ждёт только startup_grace."""
+        self.state.baseline = baseline
+        self.state.started_at = self.clock() - self.cfg.calibration_seconds
+
+    def calibrate_value(self, rms: float):
         if self.state.baseline is None:
             self.state.baseline = rms
         else:
             # простая EMA для базовой линии
             self.state.baseline = 0.9 * self.state.baseline + 0.1 * rms
+        if self.noise_floor is not None:
+            self.noise_floor.push(rms)
 
     def thresholds(self):
         if self.cfg.dynamic_threshold and self.state.baseline is not None:
@@ -50,13 +78,25 @@ class LevelDetector:
             return on_th, off_th
         return self.cfg.on_threshold, self.cfg.off_threshold
 
-    def update(self, samples: np.ndarray):
+    def update(self, samples: np.ndarray, timing=None):
+        info = self.update_value(self._block_rms(samples))
+        if timing is not None:
+            # отметки времени блока (audio_input.BlockTiming) едут дальше вместе с info
+            info["timing"] = timing
+        return info
+
+    def update_value(self, rms: float, now: Optional[float] = None):
+        """Шаг детектора по готовому уровню (RMS блока, энергия полосы и т.п.)."""
         # обновляем EMA уровня
-        rms = float(np.sqrt(np.mean(samples * samples)) + 1e-12)
         self.state.smooth = self.cfg.ema_alpha * rms + (1.0 - self.cfg.ema_alpha) * self.state.smooth
 
+        if now is None:
+            now = self.clock()
+        if self.noise_floor is not None:
+            floor = self.noise_floor.update(rms, now, self.state.baseline)
+            if floor is not None and self.cfg.dynamic_threshold:
+                self.state.baseline = floor
         on_th, off_th = self.thresholds()
-        now = time.time()
 
         # учёт выше/ниже порогов с “hold”
         if self.state.smooth > on_th:
@@ -74,4 +114,115 @@ class LevelDetector:
             "on_th": on_th,
             "off_th": off_th,
             "now": now,
-        }
\ No newline at end of file
+        }
+
+    def _ema(self, x: np.ndarray, s0: float) -> np.ndarray:
+        """
+        EMA s[i] = a*x[i] + (1-a)*s[i-1] без цикла по блокам: внутри куска длины L это
+        cumsum с весами d^-k, куски склеиваются переносом последнего значения.
+        L выбран так, чтобы d^-L не выходил за 1e100 (нет переполнения и потери точности).
+        """
+        a = self.cfg.ema_alpha
+        d = 1.0 - a
+        n = len(x)
+        if d <= 0.0:
+            return x.copy()
+        if d >= 1.0:
+            return np.full(n, s0)
+        L = max(1, min(n, int(_EMA_LOG_RANGE / -math.log(d))))
+        C = -(-n // L)
+        X = np.zeros(C * L)
+        X[:n] = x
+        X = X.reshape(C, L)
+        k = np.arange(1, L + 1, dtype=np.float64)
+        decay = d ** k                       # d^(j+1)
+        local = np.cumsum(X * (a / decay), axis=1)
+        local *= decay                       # EMA каждого куска с нулевым стартом
+        carry = np.empty(C)
+        dL = decay[-1]
+        s = s0
+        for c in range(C):
+            carry[c] = s
+            s = local[c, -1] + dL * s
+        local += carry[:, None] * decay
+        return local.reshape(-1)[:n]
+
+    def update_batch(self, blocks: np.ndarray, times: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Пакетный аналог update() для массива блоков (n_blocks, blocksize): RMS, EMA и
+        пересечения порогов считаются векторно. Результат совпадает с поблочным update()
+        (EMA — с точностью до округления). times — момент каждого блока; по умолчанию
+        все блоки получают одно время clock(), как при быстром вычерпывании очереди.
+        """
+        blocks = np.asarray(blocks)
+        if blocks.shape[0] == 0:
+            return self.update_values(np.empty(0), times)
+        if self.features is None:
+            self.features = FeatureKernel(blocks.shape[1], use_numba=False)
+        # RMS — той же арифметикой, что и поблочный update() (FeatureKernel.block_rms)
+        return self.update_values(self.features.rms_many(blocks), times)
+
+    def update_values(self, rms: np.ndarray, times: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """
+        Пакетный аналог update_value(): готовые уровни (например, RMS скользящего окна по hop'ам).
+        on_th/off_th — числа; с noise_floor — массивы: фон и пороги сдвигаются на каждом блоке,
+        как в поблочном пути.
+        """
+        n = len(rms)
+        if times is None:
+            times = np.full(n, self.clock())
+        else:
+            times = np.asarray(times, dtype=np.float64)
+        if n == 0:
+            empty = np.empty(0)
+            on_th, off_th = self.thresholds()
+            return {"rms": empty, "smooth": empty, "on_th": on_th, "off_th": off_th, "now": times,
+                    "above_since": empty, "below_since": empty}
+
+        smooth = self._ema(rms, self.state.smooth)
+        if self.noise_floor is None:
+            on_th, off_th = self.thresholds()
+        else:
+            # фон — по блоку, тем же update(), что и поблочный путь: пороги блока бит в бит
+            nf, dynamic, st = self.noise_floor, self.cfg.dynamic_threshold, self.state
+            on_th, off_th = np.empty(n), np.empty(n)
+            for i, (r, t) in enumerate(zip(rms.tolist(), times.tolist())):
+                floor = nf.update(r, t, st.baseline)
+                if floor is not None and dynamic:
+                    st.baseline = floor
+                on_th[i], off_th[i] = self.thresholds()
+
+        # +1 — выше on_th, -1 — ниже off_th, 0 — в гистерезисе (состояние не меняется)
+        mark = (smooth > on_th).astype(np.int8)
+        mark[smooth < off_th] = -1
+        idx = np.arange(n)
+        last = np.maximum.accumulate(np.where(mark != 0, idx, -1))
+        st = self.state
+        prev = 1 if st.above_since is not None else (-1 if st.below_since is not None else 0)
+        regime = np.where(last >= 0, mark[np.maximum(last, 0)], prev)
+        before = np.empty(n, dtype=regime.dtype)
+        before[0] = prev
+        before[1:] = regime[:-1]
+        start = np.maximum.accumulate(np.where(regime != before, idx, -1))
+        run_since = np.where(start >= 0, times[np.maximum(start, 0)], np.nan)
+        # пока режим не сменился внутри пакета, держим отметку из состояния
+        above_since = np.where(regime == 1, run_since, np.nan)
+        below_since = np.where(regime == -1, run_since, np.nan)
+        if prev == 1:
+            above_since[start < 0] = st.above_since
+        elif prev == -1:
+            below_since[start < 0] = st.below_since
+
+        st.smooth = float(smooth[-1])
+        st.above_since = None if math.isnan(above_since[-1]) else float(above_since[-1])
+        st.below_since = None if math.isnan(below_since[-1]) else float(below_since[-1])
+
+        return {
+            "rms": rms,
+            "smooth": smooth,
+            "on_th": on_th,
+            "off_th": off_th,
+            "now": times,
+            "above_since": above_since,
+            "below_since": below_since,
+        }
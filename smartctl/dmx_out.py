@@ -0,0 +1,249 @@
+import logging
+import socket
+import struct
+import threading
+import time
+import uuid
+from typing import Dict, List, Literal, Optional, Tuple
+import numpy as np
+
+player_logger = logging.getLogger("player")
+
+Protocol = Literal["artnet", "sacn"]
+
+ARTNET_PORT = 6454
+SACN_PORT = 5568
+DMX_CHANNELS = 512
+
+# Art-Net ArtDmx: заголовок 18 байт, данные с 18
+_ARTNET_SEQ = 12
+_ARTNET_DATA = 18
+# sACN (E1.31) data packet: 638 байт, номер последовательности 111, данные с 126
+_SACN_LEN = 126 + DMX_CHANNELS
+_SACN_SEQ = 111
+_SACN_DATA = 126
+
+
+def _artnet_packet(universe: int) -> bytearray:
+    p = bytearray(_ARTNET_DATA + DMX_CHANNELS)
+    p[0:8] = b"Art-Net\x00"
+    p[8:10] = struct.pack("<H", 0x5000)          # OpDmx
+    p[10:12] = struct.pack(">H", 14)             # версия протокола
+    p[12] = 0                                    # sequence
+    p[13] = 0                                    # physical
+    p[14] = universe & 0xFF                      # SubUni
+    p[15] = (universe >> 8) & 0x7F               # Net
+    p[16:18] = struct.pack(">H", DMX_CHANNELS)
+    return p
+
+
+def _sacn_packet(universe: int, cid: bytes, source_name: str, priority: int) -> bytearray:
+    p = bytearray(_SACN_LEN)
+    # root layer
+    p[0:2] = struct.pack(">H", 0x0010)
+    p[2:4] = struct.pack(">H", 0x0000)
+    p[4:16] = b"ASC-E1.17\x00\x00\x00"
+    p[16:18] = struct.pack(">H", 0x7000 | (_SACN_LEN - 16))
+    p[18:22] = struct.pack(">I", 0x00000004)
+    p[22:38] = cid
+    # framing layer
+    p[38:40] = struct.pack(">H", 0x7000 | (_SACN_LEN - 38))
+    p[40:44] = struct.pack(">I", 0x00000002)
+    name = source_name.encode("utf-8")[:63]
+    p[44:44 + len(name)] = name
+    p[108] = priority & 0xFF
+    p[109:111] = struct.pack(">H", 0)            # sync address
+    p[111] = 0                                   # sequence
+    p[112] = 0                                   # options
+    p[113:115] = struct.pack(">H", universe)
+    # DMP layer
+    p[115:117] = struct.pack(">H", 0x7000 | (_SACN_LEN - 115))
+    p[117] = 0x02
+    p[118] = 0xA1
+    p[119:121] = struct.pack(">H", 0x0000)
+    p[121:123] = struct.pack(">H", 0x0001)
+    p[123:125] = struct.pack(">H", DMX_CHANNELS + 1)
+    p[125] = 0                                   # start code
+    return p
+
+
+class DmxOutput:
+    """
+    Прямой вывод DMX по Art-Net или sACN. Каждая вселенная — uint8-массив на 512 каналов,
+    который является view прямо в заранее собранный UDP-пакет: запись значения сразу меняет
+    пакет, при отправке ничего не копируется и не аллоцируется.
+
+    Свой поток шлёт кадры с частотой fps; изменённые вселенные уходят в ближайшем кадре,
+    неизменённые — только раз в keepalive_seconds (приёмники считают молчание потерей сигнала).
+    """
+
+    def __init__(self, universes: List[int], protocol: Protocol = "artnet", host: Optional[str] = None,
+                 port: Optional[int] = None, fps: float = 44.0, keepalive_seconds: float = 1.0,
+                 source_name: str = "dmx_light", priority: int = 100):
+        if not universes:
+            raise ValueError("DMX output needs at least one universe")
+        if protocol not in ("artnet", "sacn"):
+            raise ValueError(f"Unknown DMX protocol: {protocol}")
+        self.protocol = protocol
+        self.universe_ids = list(universes)
+        self.fps = fps
+        self.keepalive_seconds = keepalive_seconds
+
+        self._packets: List[bytearray] = []
+        self._addrs: List[Tuple[str, int]] = []
+        if protocol == "artnet":
+            port = port or ARTNET_PORT
+            host = host or "255.255.255.255"
+            for u in self.universe_ids:
+                self._packets.append(_artnet_packet(u))
+                self._addrs.append((host, port))
+            self._seq_off, data_off = _ARTNET_SEQ, _ARTNET_DATA
+        else:
+            port = port or SACN_PORT
+            cid = uuid.uuid4().bytes
+            for u in self.universe_ids:
+                self._packets.append(_sacn_packet(u, cid, source_name, priority))
+                # без host — стандартный multicast-адрес вселенной
+                self._addrs.append((host or f"239.255.{(u >> 8) & 0xFF}.{u & 0xFF}", port))
+            self._seq_off, data_off = _SACN_SEQ, _SACN_DATA
+
+        self.universes: List[np.ndarray] = [
+            np.frombuffer(p, dtype=np.uint8, count=DMX_CHANNELS, offset=data_off) for p in self._packets
+        ]
+        self._index: Dict[int, int] = {u: i for i, u in enumerate(self.universe_ids)}
+        self._dirty = [True] * len(self._packets)
+        self._last_sent = [0.0] * len(self._packets)
+        self._seq = 0
+
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        if protocol == "sacn":
+            self._sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+
+        self.frames = 0
+        self.packets_sent = 0
+        self.send_errors = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def index_of(self, universe: int) -> int:
+        return self._index[universe]
+
+    def universe(self, idx: int) -> np.ndarray:
+        """Массив каналов вселенной (по индексу в списке universes). После прямой записи — mark_dirty()."""
+        return self.universes[idx]
+
+    def mark_dirty(self, idx: int):
+        self._dirty[idx] = True
+
+    def set(self, idx: int, channel: int, value: int):
+        self.universes[idx][channel - 1] = value
+        self._dirty[idx] = True
+
+    def set_range(self, idx: int, start_channel: int, values: np.ndarray):
+        u = self.universes[idx]
+        u[start_channel - 1:start_channel - 1 + len(values)] = values
+        self._dirty[idx] = True
+
+    def blackout(self):
+        for i, u in enumerate(self.universes):
+            u.fill(0)
+            self._dirty[i] = True
+
+    def send_frame(self, now: Optional[float] = None):
+        """Один кадр: изменённые вселенные и те, кому пора keep-alive."""
+        if now is None:
+            now = time.monotonic()
+        self._seq = self._seq % 255 + 1      # 0 в Art-Net означает "без последовательности"
+        for i, pkt in enumerate(self._packets):
+            if not self._dirty[i] and now - self._last_sent[i] < self.keepalive_seconds:
+                continue
+            # флаг сбрасываем до отправки: запись, пришедшая во время sendto, уйдёт следующим кадром
+            self._dirty[i] = False
+            pkt[self._seq_off] = self._seq
+            try:
+                self._sock.sendto(pkt, self._addrs[i])
+                self.packets_sent += 1
+            except OSError as e:
+                self.send_errors += 1
+                if self.send_errors == 1 or self.send_errors % 1000 == 0:
+                    player_logger.warning("[DMX] send to %s failed (%d errors): %s", self._addrs[i],
+                                          self.send_errors, e)
+            self._last_sent[i] = now
+        self.frames += 1
+
+    def _run(self):
+        period = 1.0 / self.fps
+        next_t = time.monotonic()
+        while not self._stop.is_set():
+            self.send_frame(next_t)
+            next_t += period
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            elif delay < -period:
+                next_t = time.monotonic()   # отстали больше чем на кадр — не догоняем пачкой
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="dmx-out", daemon=True)
+        self._thread.start()
+        player_logger.info("[DMX] %s output: universes=%s -> %s @ %.0f fps", self.protocol,
+                           self.universe_ids, self._addrs[0], self.fps)
+
+    def stop(self, blackout: bool = False):
+        if blackout:
+            self.blackout()
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if blackout:
+            self.send_frame()
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class DmxSceneController:
+    """Сцена на DMX-каналах: тот же интерфейс turn_on/turn_off, что и у SceneController."""
+
+    def __init__(self, dmx: DmxOutput, universe_idx: int, on_values: Dict[int, int],
+                 off_values: Optional[Dict[int, int]] = None):
+        self.dmx = dmx
+        self.idx = universe_idx
+        off = {ch: 0 for ch in on_values}
+        off.update(off_values or {})
+        for ch in list(on_values) + list(off):
+            if not 1 <= int(ch) <= DMX_CHANNELS:
+                raise ValueError(f"DMX channel out of range 1..{DMX_CHANNELS}: {ch}")
+        # индексы и значения раскладываем заранее — переключение сцены это одно присваивание
+        self._on_ch = np.asarray([int(c) - 1 for c in on_values], dtype=np.intp)
+        self._on_val = np.asarray([int(v) for v in on_values.values()], dtype=np.uint8)
+        self._off_ch = np.asarray([int(c) - 1 for c in off], dtype=np.intp)
+        self._off_val = np.asarray([int(v) for v in off.values()], dtype=np.uint8)
+        self._is_on = False
+
+    @property
+    def is_on(self) -> bool:
+        return self._is_on
+
+    def turn_on(self):
+        if self._is_on:
+            return
+        self.dmx.universes[self.idx][self._on_ch] = self._on_val
+        self.dmx.mark_dirty(self.idx)
+        self._is_on = True
+        player_logger.info("[DMX] scene ON (universe=%s ch=%s)", self.dmx.universe_ids[self.idx],
+                           (self._on_ch + 1).tolist())
+
+    def turn_off(self):
+        if not self._is_on:
+            return
+        self.dmx.universes[self.idx][self._off_ch] = self._off_val
+        self.dmx.mark_dirty(self.idx)
+        self._is_on = False
+        player_logger.info("[DMX] scene OFF (universe=%s)", self.dmx.universe_ids[self.idx])
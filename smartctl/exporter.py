@@ -0,0 +1,100 @@
+import logging
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+player_logger = logging.getLogger("player")
+
+# (имя, тип "counter"/"gauge", описание, значение[, метки])
+Sample = Union[Tuple[str, str, str, float], Tuple[str, str, str, float, Dict[str, str]]]
+
+
+def _fmt_value(v: float) -> str:
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return "NaN"
+    if isinstance(v, float) and math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if isinstance(v, bool):
+        return "1" if v else "0"
+    return repr(v) if isinstance(v, float) else str(int(v))
+
+
+def render(samples: List[Sample]) -> str:
+    """Текстовый формат Prometheus (0.0.4); HELP/TYPE — один раз на метрику."""
+    lines: List[str] = []
+    seen = set()
+    for s in samples:
+        name, kind, help_text, value = s[0], s[1], s[2], s[3]
+        labels = s[4] if len(s) > 4 else None
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+        if labels:
+            lab = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{name}{{{lab}}} {_fmt_value(value)}")
+        else:
+            lines.append(f"{name} {_fmt_value(value)}")
+    lines.append("")
+    return "\n".join(lines)
+
+
+class MetricsServer:
+    """
+    HTTP-эндпоинт /metrics в фоновом потоке. collect() вызывается на каждый запрос из потока
+    сервера и только читает счётчики конвейера — горячий цикл ничего не знает о запросах.
+    """
+
+    def __init__(self, collect: Callable[[], List[Sample]], port: int = 9108, host: str = "127.0.0.1"):
+        self.collect = collect
+        self.host = host
+        self.port = port
+        self.scrapes = 0
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                try:
+                    body = render(server.collect()).encode("utf-8")
+                except Exception as e:
+                    player_logger.error("[Metrics] collect failed: %s", e, exc_info=True)
+                    self.send_error(500)
+                    return
+                server.scrapes += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # access-лог на каждый scrape не нужен
+
+        return Handler
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]   # при port=0 — фактически выбранный
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        player_logger.info("[Metrics] serving http://%s:%d/metrics", self.host, self.port)
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
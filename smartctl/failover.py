@@ -0,0 +1,248 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+from smartctl.metrics import LatencyHistogram
+
+player_logger = logging.getLogger("player")
+
+
+class _Recovery:
+    """Состояние восстановления одного устройства: начало сбоя, попытки, отсрочка с удвоением."""
+
+    def __init__(self, name: str, backoff_initial: float, backoff_max: float):
+        self.name = name
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.down_since: Optional[float] = None   # начало сбоя (последний живой блок / первая ошибка)
+        self.next_try = 0.0
+        self.delay = backoff_initial
+        self.attempts = 0
+        self.recoveries = 0
+        self.failed_attempts = 0
+        self.last_outage = 0.0
+        self.outage = LatencyHistogram(f"recovery_{name}", lo_s=1e-3, hi_s=600.0)
+
+    @property
+    def down(self) -> bool:
+        return self.down_since is not None
+
+    def fail(self, since: float, now: float):
+        if self.down_since is None:
+            self.down_since = since
+            self.next_try = now   # первая попытка — сразу
+            self.delay = self.backoff_initial
+            self.attempts = 0
+
+    def due(self, now: float) -> bool:
+        return self.down_since is not None and now >= self.next_try
+
+    def retry_later(self, now: float):
+        self.attempts += 1
+        self.next_try = now + self.delay
+        self.delay = min(self.delay * 2.0, self.backoff_max)
+
+    def done(self, now: float) -> float:
+        outage = now - self.down_since
+        self.last_outage = outage
+        self.down_since = None
+        self.recoveries += 1
+        self.outage.record(outage)
+        return outage
+
+
+class DeviceSupervisor:
+    """
+    Следит за входом и MIDI-портом из своего потока и переоткрывает их при сбое.
+
+    Вход считается зависшим, если счётчик callback'ов (audio.callbacks) не растёт дольше
+    stall_seconds (до первого блока — startup_stall_seconds). Голова кольца для этого не годится:
+    если основной цикл отстал и кольцо заполнено, блоки отбрасываются и голова стоит, хотя
+    устройство живо. Тогда audio.restart() переоткрывает устройство на том же кольце;
+    удачей считается первый новый блок, а не возврат из restart(). MIDI — по healthy=False после
+    ошибки отправки или по исчезновению порта из списка (проверка раз в port_check_seconds);
+    midi.reopen() ищет порт заново. Неудачные попытки повторяются с отсрочкой
+    backoff_initial, x2, ... до backoff_max.
+
+    Объекты не пересоздаются: детектор, FSM, сцены и очередь MIDI остаются как были. После
+    восстановления MIDI имя устройства попадает в take_recovered() — основной цикл пересылает
+    текущее состояние сцен. Время сбоя (от последнего живого блока / первой ошибки до
+    восстановления) пишется в гистограммы outage.
+
+    get_audio/get_midi — текущие объекты (горячая перезагрузка может их заменить); на время
+    замены поток приостанавливается через paused().
+    """
+
+    def __init__(self, get_audio: Callable[[], Any], get_midi: Callable[[], Any], stall_seconds: float = 0.25,
+                 poll_seconds: float = 0.02, backoff_initial: float = 0.05, backoff_max: float = 0.5,
+                 port_check_seconds: float = 0.1, startup_stall_seconds: float = 2.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if stall_seconds <= 0 or poll_seconds <= 0:
+            raise ValueError("failover: stall_seconds and poll_seconds must be > 0")
+        if backoff_initial <= 0 or backoff_max < backoff_initial:
+            raise ValueError("failover: need 0 < backoff_initial_seconds <= backoff_max_seconds")
+        self.get_audio = get_audio
+        self.get_midi = get_midi
+        self.stall_seconds = stall_seconds
+        self.startup_stall_seconds = max(startup_stall_seconds, stall_seconds)
+        self.poll_seconds = poll_seconds
+        self.port_check_seconds = port_check_seconds
+        self._clock = clock
+        self.audio = _Recovery("audio", backoff_initial, backoff_max)
+        self.midi = _Recovery("midi", backoff_initial, backoff_max)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._recovered: Deque[Tuple[str, float, float]] = deque()
+        self._audio_obj = None
+        self._last_callbacks = -1
+        self._last_progress = 0.0
+        self._seen_block = False
+        self._next_port_check = 0.0
+        self._midi_obj = None
+
+    def start(self):
+        self._track(self.get_audio(), self._clock())
+        self._track_midi(self.get_midi())
+        self._thread = threading.Thread(target=self._run, name="failover", daemon=True)
+        self._thread.start()
+        player_logger.info("[Failover] watching audio (stall %.0f ms) and MIDI", self.stall_seconds * 1e3)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    @contextmanager
+    def paused(self):
+        """Замена устройств снаружи (горячая перезагрузка) — без параллельного переоткрытия."""
+        with self._lock:
+            yield
+
+    def take_recovered(self) -> List[Tuple[str, float, float]]:
+        """Восстановленные с прошлого вызова устройства: (имя, длительность сбоя в с, момент восстановления)."""
+        out = []
+        while self._recovered:
+            out.append(self._recovered.popleft())
+        return out
+
+    def track(self, audio=None, midi=None):
+        """
+        Объекты, заменённые снаружи (горячая перезагрузка), — сразу под надзор: supervised,
+        счётчики и отметки сбоя с нуля. Вызывать под paused().
+        """
+        if audio is not None:
+            self._track(audio, self._clock())
+        if midi is not None:
+            self._track_midi(midi)
+
+    def _track(self, audio, now: float):
+        self._audio_obj = audio
+        if hasattr(audio, "supervised"):
+            audio.supervised = True
+        self._last_callbacks = audio.callbacks if audio.ring is not None else -1
+        self._last_progress = now
+        self._seen_block = False
+        self.audio.down_since = None
+
+    def _track_midi(self, midi):
+        self._midi_obj = midi
+        # ошибки отправки теперь разбирает супервизор: MidiSender их не пробрасывает и сам не переоткрывает
+        midi.supervised = True
+        self.midi.down_since = None
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            with self._lock:
+                now = self._clock()
+                try:
+                    self._check_audio(now)
+                    self._check_midi(now)
+                except Exception:
+                    player_logger.exception("[Failover] supervisor check failed")
+
+    def _check_audio(self, now: float):
+        audio = self.get_audio()
+        if audio is not self._audio_obj:
+            self._track(audio, now)
+            return
+        ring = audio.ring
+        if ring is None:
+            return   # поток уже остановлен
+        callbacks = audio.callbacks
+        rec = self.audio
+        if callbacks != self._last_callbacks:
+            self._last_callbacks = callbacks
+            self._last_progress = now
+            self._seen_block = True
+            if rec.down:
+                attempts = rec.attempts
+                outage = rec.done(now)
+                self._recovered.append(("audio", outage, now))
+                player_logger.info("[Failover] audio recovered in %.0f ms (%d attempt(s))", outage * 1e3, attempts)
+            return
+        limit = self.stall_seconds if self._seen_block else self.startup_stall_seconds
+        if not rec.down:
+            if now - self._last_progress < limit:
+                return
+            rec.fail(self._last_progress, now)
+            player_logger.warning("[Failover] audio stalled: no blocks for %.0f ms, reopening",
+                                  (now - self._last_progress) * 1e3)
+        if rec.due(now):
+            try:
+                audio.restart()
+            except Exception as e:
+                rec.failed_attempts += 1
+                rec.retry_later(now)
+                player_logger.warning("[Failover] audio reopen failed (attempt %d, next in %.0f ms): %s",
+                                      rec.attempts, (rec.next_try - now) * 1e3, e)
+                return
+            # открылось — ждём первый блок; если его нет дольше limit, пробуем снова.
+            # Процесс захвата (supervised) поднимается сотни миллисекунд — ему startup_stall_seconds
+            t = self._clock()
+            wait = self.startup_stall_seconds if hasattr(audio, "supervised") else limit
+            rec.retry_later(t)
+            rec.next_try = max(rec.next_try, t + wait)
+
+    def _check_midi(self, now: float):
+        midi = self.get_midi()
+        rec = self.midi
+        if midi is not self._midi_obj:
+            # порт пересоздан горячей перезагрузкой — сбой старого к нему не относится
+            self._track_midi(midi)
+        if not rec.down:
+            if midi.healthy and now >= self._next_port_check:
+                self._next_port_check = now + self.port_check_seconds
+                if not midi.port_present():
+                    midi.mark_failed("port is gone")
+            if midi.healthy:
+                return
+            since = midi.unhealthy_since
+            rec.fail(since if since is not None else now, now)
+        if rec.due(now):
+            try:
+                midi.reopen()
+            except Exception as e:
+                rec.failed_attempts += 1
+                rec.retry_later(now)
+                player_logger.warning("[Failover] MIDI reopen failed (attempt %d, next in %.0f ms): %s",
+                                      rec.attempts, (rec.next_try - now) * 1e3, e)
+                return
+            attempts = rec.attempts + 1
+            t = self._clock()
+            outage = rec.done(t)
+            self._next_port_check = t + self.port_check_seconds
+            self._recovered.append(("midi", outage, t))
+            player_logger.info("[Failover] MIDI recovered in %.0f ms (%d attempt(s))", outage * 1e3, attempts)
+
+    def format(self) -> List[str]:
+        lines = []
+        for rec in (self.audio, self.midi):
+            if rec.recoveries or rec.failed_attempts or rec.down:
+                lines.append(f"{rec.name}: recoveries={rec.recoveries} failed_attempts={rec.failed_attempts}"
+                             f"{' (down)' if rec.down else ''}; {rec.outage.format()}")
+        return lines
@@ -0,0 +1,624 @@
+import logging
+import signal
+import time
+from typing import Callable
+import numpy as np
+
+from smartctl import builders, startup
+from smartctl.controller import SceneController
+from smartctl.detectors import LevelDetector
+from smartctl.metrics import StageLatency
+from smartctl.reload import ConfigWatcher, apply_reload, build_reloadable
+from smartctl.state_machine import OnOffFSM
+from smartctl.telemetry import TelemetryRing
+
+audio_logger = logging.getLogger("audio_diag")
+player_logger = logging.getLogger("player")
+
+# с какой глубины очереди основной цикл переходит на пакетную обработку
+CATCHUP_MIN_BLOCKS = 4
+
+
+class LiveRunner:
+    """
+    Живой цикл: вход -> LevelDetector -> OnOffFSM -> сцены, плюс включённые в конфиге блоки
+    (полосы, зоны, бит, расписание MIDI, правила сцен, DMX, чёрный ящик, телеметрия, метрики,
+    перезагрузка конфига, переподключение устройств).
+
+    Объекты собираются в конструкторе (builders), run() запускает потоки, калибрует (или
+    стартует с кэша) и крутит основной цикл до Ctrl+C; на выходе всё гасится и закрывается.
+    audio/midi/sliding/cfg подменяет reload.apply_reload — методы читают их через self.
+    """
+
+    def __init__(self, cfg: dict, config_path: str, use_asyncio: bool = False, timer=None,
+                 dropped_records: Callable[[], int] = lambda: 0):
+        self.cfg = cfg
+        self.timer = timer or startup.StartupTimer(time.perf_counter())
+        self.dropped_records = dropped_records
+
+        # Кэш прошлого запуска: найденные устройство/порт (проверяются одним запросом) и калибровка
+        st = cfg["startup"]
+        self.cache_path = st.get("cache_path")
+        self.cache = startup.load_cache(self.cache_path) if self.cache_path else {}
+        self.use_hints = bool(self.cache_path) and st.get("cache_devices", True)
+
+        # Audio (в hop-режиме — маленький блок устройства и скользящее окно RMS)
+        a = cfg["audio"]
+        self.audio = builders.make_audio(cfg, self._hint("audio", a.get("device_name_contains")))
+        self.sliding = builders.make_sliding(cfg)
+        if self.sliding is not None:
+            audio_logger.info("[Audio] hop mode: device block %d, RMS window %d (%.1f ms per decision)",
+                              self.sliding.hop, self.sliding.window, 1e3 * self.sliding.hop / a["samplerate"])
+
+        # MIDI
+        m = cfg["midi"]
+        self.midi = midi = builders.make_midi(cfg, self._hint("midi", m["output_port_name_contains"]))
+        self.timer.mark("midi")
+        self.scene = SceneController(midi, builders.build_trigger_cfg(m))
+
+        # Detector + FSM
+        level_cfg = builders.build_level_cfg(cfg)
+        self.det = LevelDetector(builders.loop_level_cfg(cfg, level_cfg), noise_floor=builders.build_noise_floor(cfg),
+                                 features=builders.build_features(cfg))
+        self.fsm = OnOffFSM(builders.build_fsm_cfg(cfg))
+
+        # Полосы спектра (опционально)
+        self.spectral, self.band_outputs = None, []
+        if cfg["spectral"].get("enabled"):
+            self.spectral, self.band_outputs = builders.build_spectral(cfg, level_cfg, midi)
+
+        # Зоны по входным каналам (опционально): свой детектор, FSM и сцена у каждой
+        self.zones, self.zone_scenes = None, []
+        if cfg["zones"].get("enabled"):
+            self.zones, self.zone_scenes = builders.build_zones(cfg, level_cfg, midi)
+
+        # Бит (опционально)
+        self.beat, self.beat_trigger, self.quantized = None, None, None
+        if cfg["beat"].get("enabled"):
+            self.beat, self.beat_trigger, self.quantized = builders.build_beat(cfg, midi, self.scene)
+        self.main_scene = self.quantized if self.quantized is not None else self.scene
+
+        # MIDI по расписанию (опционально): нота бита — заранее на предсказанный бит, MIDI clock
+        self.scheduler, self.clock_cfg = None, cfg["midi_scheduler"].get("clock") or {}
+        if cfg["midi_scheduler"].get("enabled"):
+            self.scheduler = builders.build_scheduler(cfg, midi)
+            if self.beat_trigger is not None:
+                self.beat_trigger.scheduler = self.scheduler
+        self.clock_follow = (self.scheduler is not None and self.clock_cfg.get("enabled")
+                             and self.clock_cfg.get("bpm") is None)
+
+        # Правила сцен (опционально): входы — уровень, полосы спектра, бит
+        self.scenes, self.level_input, self.beat_input = None, None, None
+        if cfg["scenes"].get("enabled"):
+            self.scenes = builders.build_scenes(cfg, midi, self.det.clock)
+            self.level_input = self.scenes.inputs.get("level")
+            self.beat_input = self.scenes.inputs.get("beat")
+            for src, inp in self.scenes.inputs.items():
+                if src.startswith("band:"):
+                    # у полосы-источника свой FSM; вместо сцены — вход контроллера
+                    self.band_outputs.append((src[5:], OnOffFSM(builders.build_fsm_cfg(cfg)), inp))
+
+        # DMX (опционально) — параллельно MIDI-сцене
+        self.dmx, self.dmx_scene = None, None
+        if cfg["dmx"].get("enabled"):
+            self.dmx, self.dmx_scene = builders.build_dmx(cfg)
+
+        # asyncio: MIDI-сцена остаётся в стадии детектора, DMX и телеметрия — выходы со своими очередями
+        self.fanout = None
+        if use_asyncio or cfg["async_runner"].get("enabled"):
+            from smartctl.async_runner import FanOut, build_sinks, level_event
+            self._level_event = level_event
+            self.fanout = FanOut(build_sinks(cfg["async_runner"], self.dmx_scene))
+            player_logger.info("[CFG] asyncio runner, sinks: %s",
+                               ", ".join(s.name for s in self.fanout.sinks) or "none")
+
+        # Чёрный ящик (опционально): звук до/после переключений и по запросу
+        self.recorder = None
+        if cfg["blackbox"].get("enabled"):
+            self.recorder = builders.build_blackbox(cfg, self.audio, level_cfg)
+        self.batch_clock = None   # время самого нового блока идущего пакета (None — поблочная обработка)
+
+        # Задержки по стадиям: ADC -> callback -> кольцо -> детектор -> FSM -> MIDI-порт
+        self.lat = None
+        if cfg["latency"].get("enabled", True):
+            # MIDI-гистограммы — последними: при смене порта apply_reload подменяет lat.hists[-2:]
+            self.lat = StageLatency(report_seconds=cfg["latency"].get("report_seconds", 30.0),
+                                    extra=([self.scheduler.lateness, self.scheduler.clock_jitter]
+                                           if self.scheduler is not None else []) + [midi.latency, midi.e2e])
+
+        # Покадровая телеметрия: в лог — каждая N-я запись, полностью — в кольцо в памяти
+        tcfg = cfg["telemetry"]
+        self.log_every = int(tcfg.get("log_every_blocks", 0) or 0)
+        self.telemetry = TelemetryRing(int(tcfg["ring_blocks"])) if tcfg.get("ring_blocks") else None
+        self.dump_on_exit = tcfg.get("dump_on_exit", True)
+        self.dump_path = tcfg.get("dump_path", "logs/telemetry.npy")
+        self.dump_requested = False
+        dump_sig = getattr(signal, "SIGUSR1", None) or getattr(signal, "SIGBREAK", None)
+        if (self.telemetry is not None or self.recorder is not None) and dump_sig is not None:
+            # сигнал только ставит флаг; снимок снимает основной цикл, пишут на диск фоновые потоки
+            signal.signal(dump_sig, lambda signum, frame: setattr(self, "dump_requested", True))
+            if self.telemetry is not None:
+                audio_logger.info("[Telemetry] send %s to dump the last %d blocks to %s",
+                                  signal.Signals(dump_sig).name, self.telemetry.capacity, self.dump_path)
+            if self.recorder is not None:
+                audio_logger.info("[BlackBox] send %s to record the last %.0fs of audio",
+                                  signal.Signals(dump_sig).name, self.recorder.pre_seconds)
+        self.processed = 0
+
+        # Горячая перезагрузка конфига: проверка в потоке watcher'а, подмена — между блоками
+        self.watcher = None
+        if cfg["reload"].get("enabled"):
+            self.watcher = ConfigWatcher(config_path, build_reloadable,
+                                         poll_seconds=float(cfg["reload"].get("poll_seconds", 0.5)))
+
+        # Переподключение входа и MIDI-порта при сбое (объекты те же — детектор и FSM не теряют состояние)
+        self.supervisor = None
+        if cfg["failover"].get("enabled"):
+            self.supervisor = builders.build_failover(cfg, lambda: self.audio, lambda: self.midi)
+
+        # Метрики для Prometheus (опционально) — только чтение счётчиков из потока HTTP-сервера
+        self.metrics_server = None
+        if cfg["metrics"].get("enabled"):
+            from smartctl.exporter import MetricsServer   # http.server — только если эндпоинт включён
+
+            self.metrics_server = MetricsServer(self.collect_metrics, port=int(cfg["metrics"].get("port", 9108)),
+                                                host=cfg["metrics"].get("host", "127.0.0.1"))
+
+    def _hint(self, kind: str, substr):
+        return startup.hint(self.cache, kind, substr) if self.use_hints else None
+
+    # --- события сцены ---
+
+    def blackbox_state(self) -> dict:
+        from dataclasses import asdict
+        det = self.det
+        on_th, off_th = det.thresholds()
+        return dict(asdict(det.state), on_th=on_th, off_th=off_th, fsm=self.fsm.state, now=det.clock(),
+                    noise_floor=det.noise_floor.value if det.noise_floor is not None else None)
+
+    def trigger_block(self) -> int:
+        # номер блока кольца, на котором FSM приняла решение: в пакете — по fsm.since
+        ring = self.audio.ring
+        newest = ring.consumed() - 1
+        if self.batch_clock is None:
+            return newest
+        return newest - int(round((self.batch_clock - self.fsm.since) * self.audio.sr / ring.blocksize))
+
+    def scene_on(self):
+        self.main_scene.turn_on()
+        if self.recorder is not None and self.cfg["blackbox"].get("on_transitions", True):
+            self.recorder.trigger("on", self.blackbox_state(), self.trigger_block())
+        if self.level_input is not None:
+            self.level_input.turn_on()
+        if self.fanout is not None:
+            self.fanout.publish({"kind": "on", "t": self.det.clock()})
+        elif self.dmx_scene is not None:
+            self.dmx_scene.turn_on()
+
+    def scene_off(self):
+        self.main_scene.turn_off()
+        if self.recorder is not None and self.cfg["blackbox"].get("on_transitions", True):
+            self.recorder.trigger("off", self.blackbox_state(), self.trigger_block())
+        if self.level_input is not None:
+            self.level_input.turn_off()
+        if self.fanout is not None:
+            self.fanout.publish({"kind": "off", "t": self.det.clock()})
+        elif self.dmx_scene is not None:
+            self.dmx_scene.turn_off()
+
+    def zone_on(self, j: int):
+        self.zone_scenes[j].turn_on()
+
+    def zone_off(self, j: int):
+        self.zone_scenes[j].turn_off()
+
+    def resend_scene_state(self, outage: float, t_recovered: float):
+        # приёмник мог потерять переключения за время сбоя — отправляем текущее состояние целиком
+        self.scene.resend()
+        for _, _, band_scene in self.band_outputs:
+            if isinstance(band_scene, SceneController):
+                band_scene.resend()
+        for zone_scene in self.zone_scenes:
+            zone_scene.resend()
+        if self.scenes is not None:
+            self.scenes.resend()
+        player_logger.info("[Failover] scene state re-sent (%s), %.0f ms after the MIDI failure",
+                           "ON" if self.scene.is_on else "OFF", (outage + time.monotonic() - t_recovered) * 1e3)
+
+    def report_latency(self, final: bool = False):
+        lines = self.lat.format()
+        if lines:
+            audio_logger.info("[Latency]%s %s", " total:" if final else "", "; ".join(lines))
+
+    # --- обработка блоков ---
+
+    def process_block(self, blk):
+        self.processed += 1
+        audio, det, fsm, midi = self.audio, self.det, self.fsm, self.midi
+        timing = audio.last_timing
+        if self.sliding is None:
+            t0 = time.perf_counter()
+            info = det.update(blk, timing)
+            t1 = time.perf_counter()
+            if self.lat is not None and timing is not None:
+                midi.set_origin(timing.origin_perf)
+            fsm.step(det.state, info, on_event=self.scene_on, off_event=self.scene_off)
+        else:
+            # hop-режим: стадия detect — окно RMS, fsm — EMA/пороги и FSM на каждый завершённый hop
+            t0 = time.perf_counter()
+            levels = self.sliding.push(blk)
+            t1 = time.perf_counter()
+            if self.lat is not None and timing is not None:
+                midi.set_origin(timing.origin_perf)
+            info = None
+            for rms in levels:
+                info = det.update_value(rms)
+                fsm.step(det.state, info, on_event=self.scene_on, off_event=self.scene_off)
+        now = info["now"] if info is not None else det.clock()
+        self.finish_blocks(blk[None], np.array([now]), info, timing, t0, t1)
+        return info
+
+    def process_batch(self, blks):
+        """Догоняющая обработка накопленных блоков одним пакетом; у каждого блока своё время."""
+        n = len(blks)
+        self.processed += n
+        audio, det, sliding = self.audio, self.det, self.sliding
+        timing = audio.last_timing   # самый новый блок пакета
+        newest = det.clock()
+        # блоки шли подряд: время назад от самого нового шагом blocksize/samplerate
+        times = newest - (n - 1 - np.arange(n)) * (blks.shape[1] / audio.sr)
+        t0 = time.perf_counter()
+        if sliding is None:
+            binfo = det.update_batch(blks, times)
+        else:
+            levels = sliding.push_many(blks)
+            k = len(levels)
+            binfo = det.update_values(levels, newest - (k - 1 - np.arange(k)) * (sliding.hop / audio.sr))
+        t1 = time.perf_counter()
+        if self.lat is not None and timing is not None:
+            self.midi.set_origin(timing.origin_perf)
+        self.batch_clock = newest
+        self.fsm.step_batch(det.state, binfo, on_event=self.scene_on, off_event=self.scene_off)
+        self.batch_clock = None
+        self.finish_blocks(blks, times, binfo if len(binfo["rms"]) else None, timing, t0, t1, batch=True)
+        return binfo
+
+    def finish_blocks(self, blks, times, info, timing, t0, t1, batch=False):
+        # общее для поблочного и пакетного пути: задержки, зоны, полосы/бит/сцены, телеметрия
+        t2 = time.perf_counter()
+        if self.lat is not None:
+            self.lat.record_block(timing, t0, t1, t2)
+        if self.zones is not None:
+            self.zones.update_many(self.audio.channel_ms(), self.zone_on, self.zone_off, times)
+        for row, now in zip(blks, times.tolist()):
+            self.post_block(row, now)
+        self.midi.set_origin(None)
+        if info is not None:
+            on = self.fsm.state == "ON"
+            if self.telemetry is not None:
+                if batch:
+                    self.telemetry.record_batch(info, on)
+                else:
+                    self.telemetry.record(info["now"], info["rms"], info["smooth"], info["on_th"], info["off_th"], on)
+            if self.fanout is not None:
+                self.fanout.publish(self._level_event(info, on))
+
+    def post_block(self, blk, now):
+        if self.scenes is not None:
+            self.scenes.tick(now)
+        if self.spectral is not None:
+            for hop_info in self.spectral.feed(blk, now):
+                for name, band_fsm, band_scene in self.band_outputs:
+                    band_fsm.step(self.spectral.detectors[name].state, hop_info[name],
+                                  on_event=band_scene.turn_on, off_event=band_scene.turn_off)
+        if self.beat is not None:
+            self._post_beat(blk, now)
+
+    def _post_beat(self, blk, now):
+        beat, scheduler, beat_trigger = self.beat, self.scheduler, self.beat_trigger
+        for hop_info in beat.feed(blk, now):
+            if self.quantized is not None:
+                self.quantized.on_hop(hop_info)
+            if self.beat_input is not None:
+                self.beat_input.set(hop_info["next_beat"] is not None)
+            if self.clock_follow and hop_info["next_beat"] is not None:
+                if scheduler.bpm is None:
+                    scheduler.start_clock(hop_info["bpm"], send_start=self.clock_cfg.get("start_stop", True))
+                else:
+                    scheduler.set_tempo(hop_info["bpm"], float(self.clock_cfg.get("follow_tolerance_bpm", 0.5)))
+            if hop_info["beat"]:
+                if beat_trigger is not None:
+                    if scheduler is not None:
+                        # время трекера (часы детектора) -> perf_counter планировщика
+                        beat_trigger.on_beat(hop_info["beat_time"] + time.perf_counter() - self.det.clock(),
+                                             beat.period)
+                    else:
+                        beat_trigger.on_beat()
+                audio_logger.debug("[Beat] bpm=%.1f conf=%.1f", hop_info["bpm"], hop_info["confidence"])
+
+    # --- основной цикл ---
+
+    def check_reload(self):
+        if self.watcher is not None:
+            upd = self.watcher.take()
+            if upd is not None:
+                if self.supervisor is not None:
+                    with self.supervisor.paused():
+                        apply_reload(self, upd)
+                else:
+                    apply_reload(self, upd)
+                self._overruns = self.audio.overruns
+        if self.supervisor is not None:
+            # устройства переоткрывает поток супервизора; здесь — только досылка состояния сцен
+            for name, outage, t_rec in self.supervisor.take_recovered():
+                if name == "midi":
+                    self.resend_scene_state(outage, t_rec)
+
+    def step(self, blk):
+        audio = self.audio
+        if audio.overruns != self._overruns:
+            audio_logger.warning("[Audio] ring overrun: %d block(s) dropped (total %d)",
+                                 audio.overruns - self._overruns, audio.overruns)
+            self._overruns = audio.overruns
+        if blk is None:
+            return
+        catch_up = audio.pending() >= CATCHUP_MIN_BLOCKS
+        self.process_block(blk)
+        if catch_up:
+            # отстали (GC, сброс логов): весь накопленный хвост — пакетами
+            while audio.pending() > 0:
+                blks = audio.read_blocks(audio.pending())
+                if len(blks) == 0:
+                    break
+                self.process_batch(blks)
+            audio_logger.debug("[Audio] caught up, lvl=%.5f", self.det.state.smooth)
+        if self.log_every and self.processed % self.log_every == 0 and audio_logger.isEnabledFor(logging.DEBUG):
+            on_th, off_th = self.det.thresholds()
+            audio_logger.debug("lvl=%.5f on=%.5f off=%.5f", self.det.state.smooth, on_th, off_th)
+        if self.dump_requested:
+            self.dump_requested = False
+            if self.telemetry is not None:
+                self.telemetry.dump_async(self.dump_path)
+            if self.recorder is not None:
+                self.recorder.trigger("manual", self.blackbox_state(), self.trigger_block())
+        if self.lat is not None and self.lat.due(self.det.clock()):
+            self.report_latency()
+
+    async def run_async(self):
+        import asyncio
+        from smartctl.async_runner import AsyncBlockSource
+        source = AsyncBlockSource(lambda: self.audio, asyncio.get_running_loop())
+        await self.fanout.start()
+        try:
+            while True:
+                self.check_reload()
+                self.step(await source.next_block(0.5))
+        finally:
+            await self.fanout.stop()
+            audio_logger.info("[Async] %d wakeup(s) for %d block(s)", source.wakeups, self.processed)
+
+    def calibrate(self):
+        """Тёплый старт с кэша или калибровка тишины на первых audio.calibration_seconds."""
+        cfg, det, spectral, zones, timer = self.cfg, self.det, self.spectral, self.zones, self.timer
+        st = cfg["startup"]
+        warm = None
+        if self.cache_path and st.get("warm_start"):
+            warm = startup.cached_calibration(self.cache, cfg,
+                                              float(st.get("warm_start_max_age_hours", 12.0)) * 3600.0)
+        if warm is not None:
+            # тёплый старт: baseline прошлой калибровки, без calibration_seconds тишины
+            det.warm_start(float(warm["baseline"]))
+            if spectral is not None:
+                for name, d in spectral.detectors.items():
+                    if name in warm["bands"]:
+                        d.warm_start(float(warm["bands"][name]))
+            if zones is not None:
+                zones.warm_start(warm.get("zones") or {})
+            audio_logger.info("[Calib] warm start: baseline=%.6f from %.0f min ago", det.state.baseline,
+                              warm["age"] / 60.0)
+            timer.mark("warm_start")
+            return
+        t0 = time.time()
+        while (time.time() - t0) < cfg["audio"]["calibration_seconds"]:
+            blk = self.audio.read_block(timeout=0.2)
+            if blk is not None:
+                if self.sliding is None:
+                    det.calibrate_step(blk)
+                else:
+                    for rms in self.sliding.push(blk):
+                        det.calibrate_value(rms)
+                if spectral is not None:
+                    spectral.calibrate(blk)
+                if zones is not None:
+                    zones.calibrate_step(self.audio.channel_ms()[0])
+        audio_logger.info("[Calib] baseline=%.6f", det.state.baseline or -1.0)
+        timer.mark("calibration")
+
+    def save_startup_cache(self):
+        if not self.cache_path:
+            return
+        cfg, cache, det = self.cfg, self.cache, self.det
+        if self.use_hints:
+            m = cfg["midi"]
+            startup.remember_device(cache, "midi", m["output_port_name_contains"], self.midi.port_index,
+                                    self.midi.port_name)
+            if self.audio.resolved_device is not None:
+                startup.remember_device(cache, "audio", cfg["audio"].get("device_name_contains"),
+                                        *self.audio.resolved_device)
+        if det.state.baseline is not None:
+            bands = {name: d.state.baseline for name, d in self.spectral.detectors.items()
+                     if d.state.baseline is not None} if self.spectral is not None else {}
+            startup.remember_calibration(cache, cfg, det.state.baseline, bands,
+                                         self.zones.baselines() if self.zones is not None else None)
+        startup.save_cache(self.cache_path, cache)
+
+    def start(self):
+        """Фоновые потоки, MIDI clock и входной поток."""
+        if self.dmx is not None:
+            self.dmx.start()
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        if self.watcher is not None:
+            self.watcher.start()
+        if self.recorder is not None:
+            self.recorder.start()
+        if self.scheduler is not None:
+            self.scheduler.start()
+            if self.clock_cfg.get("enabled") and self.clock_cfg.get("bpm") is not None:
+                self.scheduler.start_clock(float(self.clock_cfg["bpm"]),
+                                           send_start=self.clock_cfg.get("start_stop", True))
+        self.timer.mark("setup")
+        audio_logger.info("[Audio] starting input stream")
+        self.audio.start()
+        if self.supervisor is not None:
+            self.supervisor.start()
+        self.timer.mark("audio")
+
+    def run(self):
+        """Старт, калибровка и основной цикл до Ctrl+C; в конце — stop()."""
+        self.start()
+        try:
+            self.calibrate()
+            self.save_startup_cache()
+            player_logger.info("[Startup] %s", self.timer.format())
+
+            # Основной цикл: один шаг на прочитанный блок (общий для потокового и asyncio-режима)
+            self._overruns = self.audio.overruns
+            if self.fanout is not None:
+                import asyncio   # только для asyncio-режима: сам импорт — десятки миллисекунд старта
+
+                asyncio.run(self.run_async())
+            else:
+                while True:
+                    self.check_reload()
+                    self.step(self.audio.read_block(timeout=0.5))
+        except KeyboardInterrupt:
+            audio_logger.info("[Audio] stopped by user")
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.supervisor is not None:
+            # до остановки устройств — чтобы их не начали переоткрывать
+            self.supervisor.stop()
+        if self.beat_trigger is not None:
+            self.beat_trigger.release()
+        self.scene.turn_off()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.dmx is not None:
+            self.dmx.stop(blackout=self.cfg["dmx"].get("blackout_on_exit", True))
+        for _, _, band_scene in self.band_outputs:
+            band_scene.turn_off()
+        for zone_scene in self.zone_scenes:
+            zone_scene.turn_off()
+        if self.scenes is not None:
+            self.scenes.all_off()
+        if self.recorder is not None:
+            # дописывает идущую запись тем, что уже есть в кольце — до закрытия кольца
+            self.recorder.stop()
+            self.recorder.detach()
+        audio, midi, scheduler = self.audio, self.midi, self.scheduler
+        audio.stop()
+        if audio.overruns:
+            audio_logger.info("[Audio] total dropped blocks: %d", audio.overruns)
+        if scheduler is not None:
+            scheduler.stop_clock(send_stop=self.clock_cfg.get("start_stop", True))
+            scheduler.stop(drain_seconds=0.2)   # note_off запланированных нот и MIDI Stop
+            for line in scheduler.format():
+                player_logger.info("[Scheduler] %s", line)
+        midi.close()
+        if self.fanout is not None:
+            for sink in self.fanout.sinks:
+                player_logger.info("[Sink] %s", sink.format())
+        player_logger.info("[MIDI] closed: sent=%d failed=%d dropped=%d coalesced=%d",
+                           midi.sent, midi.failed, midi.dropped, midi.coalesced)
+        if self.supervisor is not None:
+            for line in self.supervisor.format():
+                player_logger.info("[Failover] %s", line)
+        if self.lat is not None:
+            self.report_latency(final=True)
+        elif midi.latency.count:
+            player_logger.info("[MIDI] %s", midi.latency.format())
+        if self.telemetry is not None and self.dump_on_exit and self.telemetry.written:
+            self.telemetry.join()
+            n = self.telemetry.dump(self.dump_path)
+            audio_logger.info("[Telemetry] dumped %d block(s) to %s", n, self.dump_path)
+        if self.cache_path and self.det.state.baseline is not None:
+            # baseline к концу работы (с учётом noise_floor) — для следующего тёплого старта
+            self.save_startup_cache()
+        if self.dropped_records():
+            audio_logger.warning("[Log] %d record(s) dropped (log queue full)", self.dropped_records())
+
+    # --- метрики ---
+
+    def collect_metrics(self):
+        audio, det, fsm, midi = self.audio, self.det, self.fsm, self.midi
+        on_th, off_th = det.thresholds()
+        baseline = det.state.baseline
+        extra = []
+        if self.watcher is not None:
+            extra = [
+                ("dmx_light_config_reloads_total", "counter", "Config file reloads by outcome.",
+                 self.watcher.accepted, {"result": "accepted"}),
+                ("dmx_light_config_reloads_total", "counter", "Config file reloads by outcome.",
+                 self.watcher.rejected, {"result": "rejected"}),
+            ]
+        if self.supervisor is not None:
+            for rec in (self.supervisor.audio, self.supervisor.midi):
+                extra += [
+                    ("dmx_light_device_recoveries_total", "counter", "Devices reopened after a failure.",
+                     rec.recoveries, {"device": rec.name}),
+                    ("dmx_light_device_down", "gauge", "1 while the device is failed and being reopened.",
+                     rec.down, {"device": rec.name}),
+                ]
+        zones = self.zones
+        if zones is not None:
+            for j, name in enumerate(zones.names):
+                extra += [
+                    ("dmx_light_zone_level_smooth", "gauge", "Smoothed RMS level of an input zone.",
+                     float(zones.smooth[j]), {"zone": name}),
+                    ("dmx_light_zone_on", "gauge", "1 if the zone state machine is ON.", bool(zones.on[j]),
+                     {"zone": name}),
+                    ("dmx_light_zone_transitions_total", "counter", "Zone state machine transitions.",
+                     int(zones.transitions_on[j]), {"zone": name, "to": "on"}),
+                    ("dmx_light_zone_transitions_total", "counter", "Zone state machine transitions.",
+                     int(zones.transitions_off[j]), {"zone": name, "to": "off"}),
+                ]
+        return extra + [
+            ("dmx_light_blocks_processed_total", "counter", "Audio blocks processed by the level detector.",
+             self.processed),
+            ("dmx_light_blocks_dropped_total", "counter", "Blocks dropped because the capture ring was full.",
+             audio.overruns),
+            ("dmx_light_audio_callbacks_total", "counter", "sounddevice input callbacks.", audio.callbacks),
+            ("dmx_light_audio_status_total", "counter", "Callbacks that reported a non-empty status.",
+             audio.status_count),
+            ("dmx_light_audio_xruns_total", "counter", "Input overflows/underflows reported by PortAudio.",
+             audio.input_overflows, {"kind": "overflow"}),
+            ("dmx_light_audio_xruns_total", "counter", "Input overflows/underflows reported by PortAudio.",
+             audio.input_underflows, {"kind": "underflow"}),
+            ("dmx_light_ring_pending_blocks", "gauge", "Captured blocks waiting for the processing loop.",
+             audio.pending()),
+            ("dmx_light_level_smooth", "gauge", "Smoothed RMS level.", det.state.smooth),
+            ("dmx_light_level_baseline", "gauge", "Calibrated noise baseline (NaN before calibration).",
+             float("nan") if baseline is None else baseline),
+            ("dmx_light_level_on_threshold", "gauge", "Current ON threshold.", on_th),
+            ("dmx_light_level_off_threshold", "gauge", "Current OFF threshold.", off_th),
+            ("dmx_light_fsm_on", "gauge", "1 if the scene state machine is ON.", fsm.state == "ON"),
+            ("dmx_light_fsm_transitions_total", "counter", "Scene state machine transitions.",
+             fsm.transitions_on, {"to": "on"}),
+            ("dmx_light_fsm_transitions_total", "counter", "Scene state machine transitions.",
+             fsm.transitions_off, {"to": "off"}),
+            ("dmx_light_midi_messages_total", "counter", "MIDI messages by outcome.", midi.sent, {"result": "sent"}),
+            ("dmx_light_midi_messages_total", "counter", "MIDI messages by outcome.", midi.failed,
+             {"result": "failed"}),
+            ("dmx_light_midi_messages_total", "counter", "MIDI messages by outcome.", midi.dropped,
+             {"result": "dropped"}),
+            ("dmx_light_midi_messages_total", "counter", "MIDI messages by outcome.", midi.coalesced,
+             {"result": "coalesced"}),
+            ("dmx_light_midi_queue_depth", "gauge", "Messages waiting in the MIDI send queue.", midi.queue_depth()),
+            ("dmx_light_log_records_dropped_total", "counter", "Log records dropped because the log queue was full.",
+             self.dropped_records()),
+        ]
@@ -0,0 +1,100 @@
+from bisect import bisect_right
+from typing import Dict, List, Optional
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с фиксированными логарифмическими бакетами (по умолчанию 10 мкс .. 10 с).
+    record() — один bisect и инкремент, без аллокаций; писать должен один поток.
+    Перцентили — верхняя граница бакета (точность ~25% при 10 бакетах на декаду).
+    """
+
+    def __init__(self, name: str, lo_s: float = 1e-5, hi_s: float = 10.0, per_decade: int = 10):
+        self.name = name
+        edges: List[float] = []
+        e = lo_s
+        step = 10.0 ** (1.0 / per_decade)
+        while e < hi_s * (1.0 + 1e-9):
+            edges.append(e)
+            e *= step
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect_right(self.edges, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank and c:
+                return min(self.edges[i], self.max) if i < len(self.edges) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50.0),
+            "p99": self.percentile(99.0),
+            "max": self.max,
+        }
+
+    def format(self) -> str:
+        s = self.summary()
+        return (f"{self.name}: n={s['count']} p50={s['p50'] * 1e3:.3f}ms p99={s['p99'] * 1e3:.3f}ms "
+                f"max={s['max'] * 1e3:.3f}ms")
+
+    def reset(self):
+        self.counts = [0] * (len(self.edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+class StageLatency:
+    """
+    Задержки по стадиям конвейера блока: ADC→callback, callback→выдача из кольца, детектор, FSM.
+    Вместе с гистограммами MidiSender (очередь→порт и ADC→порт) даёт полную картину.
+    Все record_* — из основного цикла; report() раз в report_seconds пишет p50/p99/max в лог.
+    """
+
+    def __init__(self, report_seconds: float = 30.0, extra: Optional[List[LatencyHistogram]] = None):
+        self.adc_to_callback = LatencyHistogram("adc_to_callback")
+        self.callback_to_dequeue = LatencyHistogram("callback_to_dequeue")
+        self.detect = LatencyHistogram("detect")
+        self.fsm = LatencyHistogram("fsm")
+        self.hists = [self.adc_to_callback, self.callback_to_dequeue, self.detect, self.fsm] + list(extra or [])
+        self.report_seconds = report_seconds
+        self._next_report: Optional[float] = None
+
+    def record_block(self, timing, t_detect: float, t_fsm: float, t_done: float):
+        """timing — audio_input.BlockTiming (или None); t_* — perf_counter до детектора, до FSM и после."""
+        if timing is not None:
+            if timing.adc_time > 0.0 and timing.callback_time >= timing.adc_time:
+                self.adc_to_callback.record(timing.callback_time - timing.adc_time)
+            self.callback_to_dequeue.record(timing.dequeue_perf - timing.callback_perf)
+        self.detect.record(t_fsm - t_detect)
+        self.fsm.record(t_done - t_fsm)
+
+    def format(self) -> List[str]:
+        return [h.format() for h in self.hists if h.count]
+
+    def due(self, now: float) -> bool:
+        if self._next_report is None:
+            self._next_report = now + self.report_seconds
+            return False
+        if now < self._next_report:
+            return False
+        self._next_report = now + self.report_seconds
+        return True
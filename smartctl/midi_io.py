@@ -1,41 +1,116 @@
 import logging
-from typing import List, Optional
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from smartctl.metrics import LatencyHistogram
 
 player_logger = logging.getLogger("player")
 
+_STOP = object()
+# без супервизора порт переоткрывается при ошибке отправки не чаще, чем раз в столько секунд
+INLINE_REOPEN_SECONDS = 1.0
+
 class MidiSender:
-    def __init__(self, port_substr: Optional[str] = None):
-        try:
-            import rtmidi  # type: ignore
-        except Exception as e:
-            raise RuntimeError("python-rtmidi is required. Install: pip install python-rtmidi") from e
+    """
+    Отправка MIDI в порт rtmidi. Способ отправки (send_message / sendMessage с list,
+    MidiMessage или bytes) определяется один раз; при ошибке rtmidi порт mido открывается
+    один раз и дальше переиспользуется.
+
+    threaded=True (по умолчанию): note_on/note_off/cc только кладут сообщение в ограниченную
+    очередь, отправляет отдельный поток. Он забирает всё накопившееся пачкой, схлопывает
+    повторные CC (в пачке остаётся последнее значение, совпадающее с уже отправленным не шлётся)
+    и пишет задержку очередь→порт в гистограмму latency.
+
+    send_batch(msgs) отправляет готовые байтовые сообщения (например, заранее собранные
+    таблицей сцен) одним элементом очереди — поток отправки разворачивает их подряд.
+
+    port_hint=(индекс, имя) — порт из кэша прошлого запуска: проверяется одним запросом имени
+    по индексу, полный перебор портов — только если имя не совпало.
+
+    set_origin(t) помечает следующие сообщения моментом оцифровки блока, который их вызвал
+    (perf_counter); тогда полная задержка ADC→порт пишется в гистограмму e2e.
+
+    Ошибка отправки под супервизором (supervised=True, его выставляет DeviceSupervisor) не
+    пробрасывается: порт помечается неисправным (healthy=False), следующие сообщения только
+    считаются в failed, пока супервизор не вызовет reopen(). Без супервизора порт переоткрывается
+    прямо при ошибке (не чаще раза в INLINE_REOPEN_SECONDS) и сообщение отправляется повторно;
+    если и это не удалось — в режиме без потока отправки ошибка пробрасывается вызывающему,
+    в потоковом каждое потерянное сообщение пишется в лог как error.
+    backend — модуль с MidiOut вместо rtmidi (подмена в бенчмарках).
+    """
+
+    def __init__(self, port_substr: Optional[str] = None, threaded: bool = True, queue_size: int = 256,
+                 batch_max: int = 64, port_hint: Optional[Tuple[int, str]] = None, backend=None):
+        if backend is None:
+            try:
+                import rtmidi  # type: ignore
+            except Exception as e:
+                raise RuntimeError("python-rtmidi is required. Install: pip install python-rtmidi") from e
+            backend = rtmidi
+
+        self._rtmidi = backend
+        self.port_substr = port_substr
+        # порт меняет reopen() из потока супервизора — отправка и перебор портов под одним замком
+        self._port_lock = threading.Lock()
+        self._open_port(port_hint)
+        player_logger.info("[MIDI] opened port: %s%s", self.port_name,
+                           " (cached)" if port_hint is not None and tuple(port_hint) == (self.port_index,
+                                                                                         self.port_name) else "")
+        # False после неудачной отправки под супервизором: дальше сообщения только считаются
+        # в failed, пока порт не переоткрыт
+        self.healthy = True
+        self.supervised = False
+        self._next_inline_reopen = 0.0
+        self.unhealthy_since: Optional[float] = None
+
+        self._mido_out = None
+        self._debug = player_logger.isEnabledFor(logging.DEBUG)
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.latency = LatencyHistogram("midi_send")
+        self.e2e = LatencyHistogram("adc_to_send")
+        self._origin: Optional[float] = None
+        self._cc_sent: Dict[Tuple[int, int], int] = {}
+
+        self._batch_max = batch_max
+        self._q: Optional["queue.Queue"] = None
+        self._thread: Optional[threading.Thread] = None
+        if threaded:
+            self._q = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._worker, name="midi-out", daemon=True)
+            self._thread.start()
 
-        self._rtmidi = rtmidi
+    def _open_port(self, port_hint: Optional[Tuple[int, str]] = None, strict: bool = False):
+        port_substr = self.port_substr
         try:
-            self._out = rtmidi.MidiOut()
+            self._out = self._rtmidi.MidiOut()
         except Exception:
-            self._out = rtmidi.RtMidiOut()
+            self._out = self._rtmidi.RtMidiOut()
 
-        ports: List[str] = []
-        if hasattr(self._out, "get_ports"):
-            try:
-                ports = self._out.get_ports() or []
-            except Exception:
-                ports = []
-        elif hasattr(self._out, "getPortCount") and hasattr(self._out, "getPortName"):
-            try:
-                ports = [self._out.getPortName(i) for i in range(self._out.getPortCount())]
-            except Exception:
-                ports = []
-        if not ports:
-            raise RuntimeError("No MIDI outputs. Create a virtual port (loopMIDI).")
-
-        idx = 0
-        if port_substr:
-            for i, p in enumerate(ports):
-                if p and port_substr.lower() in p.lower():
-                    idx = i
-                    break
+        idx, name = -1, None
+        if port_hint is not None:
+            hint_name = self._port_name_at(port_hint[0])
+            if hint_name and hint_name == port_hint[1] and (not port_substr or port_substr.lower() in hint_name.lower()):
+                idx, name = port_hint[0], hint_name
+        if name is None:
+            ports = self._port_names()
+            if not ports:
+                raise RuntimeError("No MIDI outputs. Create a virtual port (loopMIDI).")
+
+            idx = -1 if strict and port_substr else 0
+            if port_substr:
+                for i, p in enumerate(ports):
+                    if p and port_substr.lower() in p.lower():
+                        idx = i
+                        break
+            if idx < 0:
+                raise RuntimeError(f"No MIDI output matching '{port_substr}'")
+            name = ports[idx]
 
         if hasattr(self._out, "open_port"):
             self._out.open_port(idx)
@@ -44,10 +119,24 @@ class MidiSender:
         else:
             raise RuntimeError("MidiOut object has no open_port/openPort")
 
-        self.port_name = ports[idx]
-        player_logger.info(f"[MIDI] opened port: {self.port_name}")
+        self.port_index = idx
+        self.port_name = name
+        self._send: Callable[[List[int]], None] = self._resolve_send()
 
-    def close(self):
+    def _port_names(self) -> List[str]:
+        if hasattr(self._out, "get_ports"):
+            try:
+                return self._out.get_ports() or []
+            except Exception:
+                return []
+        if hasattr(self._out, "getPortCount") and hasattr(self._out, "getPortName"):
+            try:
+                return [self._out.getPortName(i) for i in range(self._out.getPortCount())]
+            except Exception:
+                return []
+        return []
+
+    def _close_port(self):
         try:
             if hasattr(self._out, "close_port"):
                 self._out.close_port()
@@ -57,52 +146,238 @@ class MidiSender:
                 self._out.close()
         except Exception as e:
             player_logger.debug("MIDI close error: %s", e)
+        if self._mido_out is not None:
+            try:
+                self._mido_out[0].close()
+            except Exception:
+                pass
+            self._mido_out = None
+
+    def port_present(self) -> bool:
+        """Открытый порт всё ещё в системе (loopMIDI не перезапускали) — одним запросом имени по индексу."""
+        with self._port_lock:
+            return self._port_name_at(self.port_index) == self.port_name
+
+    def mark_failed(self, reason: str):
+        if self.healthy:
+            self.healthy = False
+            self.unhealthy_since = time.monotonic()
+            player_logger.error("[MIDI] port %s failed: %s", self.port_name, reason)
+
+    def reopen(self):
+        """
+        Закрыть порт и открыть заново с поиском по port_substr (после перезапуска loopMIDI индекс
+        мог смениться). Очередь и счётчики сохраняются. Ошибка открытия пробрасывается —
+        повторяет вызывающий (супервизор).
+        """
+        with self._port_lock:
+            self._close_port()
+            # только порт с тем же именем: без него "первый попавшийся" был бы не тем приёмником
+            self._open_port(strict=True)
+            self._cc_sent.clear()   # состояние CC в приёмнике после переподключения неизвестно
+            self.healthy = True
+            self.unhealthy_since = None
+        player_logger.info("[MIDI] reopened port: %s", self.port_name)
 
-    def _send_bytes(self, msg_bytes):
+    def _port_name_at(self, i: int) -> Optional[str]:
         try:
-            if hasattr(self._out, "send_message"):
-                self._out.send_message(msg_bytes)
-                player_logger.debug(f"[MIDI OUT] Sent (send_message) {msg_bytes}")
-                return
-            if hasattr(self._out, "sendMessage"):
+            if hasattr(self._out, "get_port_name"):
+                return self._out.get_port_name(i) or None
+            if hasattr(self._out, "getPortName"):
+                return self._out.getPortName(i) or None
+        except Exception:
+            pass
+        return None
+
+    def _resolve_send(self) -> Callable[[List[int]], None]:
+        if hasattr(self._out, "send_message"):
+            return self._out.send_message
+        if hasattr(self._out, "sendMessage"):
+            return self._probe_send_message
+        raise RuntimeError("MidiOut object has no send_message/sendMessage")
+
+    def _probe_send_message(self, msg_bytes: List[int]):
+        # старый API rtmidi: формат аргумента выясняем на первом сообщении и запоминаем
+        out = self._out
+        variants: List[Callable[[List[int]], None]] = [out.sendMessage]
+        MidiMessageCls = getattr(self._rtmidi, "MidiMessage", None)
+        if MidiMessageCls is not None:
+            variants.append(lambda m: out.sendMessage(MidiMessageCls(m)))
+        variants.append(lambda m: out.sendMessage(bytes(m)))
+        err: Optional[Exception] = None
+        for send in variants:
+            try:
+                send(msg_bytes)
+            except Exception as e:
+                err = e
+                continue
+            self._send = send
+            return
+        raise err  # type: ignore[misc]
+
+    def _try_send(self, msg_bytes: List[int]) -> Optional[str]:
+        """Отправка через rtmidi, при ошибке — через mido; None — отправлено, иначе текст ошибки."""
+        with self._port_lock:
+            try:
+                self._send(msg_bytes)
+                return None
+            except Exception as e:
                 try:
-                    self._out.sendMessage(msg_bytes)
-                    player_logger.debug(f"[MIDI OUT] Sent (sendMessage:list) {msg_bytes}")
-                    return
-                except Exception:
-                    try:
-                        MidiMessageCls = getattr(self._rtmidi, "MidiMessage", None)
-                        if MidiMessageCls is not None:
-                            obj = MidiMessageCls(msg_bytes)
-                            self._out.sendMessage(obj)
-                            player_logger.debug(f"[MIDI OUT] Sent (sendMessage:MidiMessage) {msg_bytes}")
-                            return
-                    except Exception:
-                        pass
-                    self._out.sendMessage(bytes(msg_bytes))
-                    player_logger.debug(f"[MIDI OUT] Sent (sendMessage:bytes) {msg_bytes}")
-                    return
+                    if self._mido_out is None:
+                        import mido  # type: ignore
+                        self._mido_out = (mido.open_output(self.port_name), mido.Message.from_bytes)
+                    out, from_bytes = self._mido_out
+                    out.send(from_bytes(bytes(msg_bytes)))
+                    return None
+                except Exception as e2:
+                    player_logger.error("Unable to send MIDI msg %s; rtmidi err: %s; mido err: %s",
+                                        msg_bytes, e, e2, exc_info=True)
+                    return str(e)
+
+    def _reopen_inline(self) -> bool:
+        """Без супервизора: переоткрыть порт сразу, но не чаще раза в INLINE_REOPEN_SECONDS."""
+        now = time.monotonic()
+        if now < self._next_inline_reopen:
+            return False
+        self._next_inline_reopen = now + INLINE_REOPEN_SECONDS
+        try:
+            self.reopen()
+            return True
         except Exception as e:
+            player_logger.error("[MIDI] reopen of port %s failed: %s", self.port_name, e)
+            return False
+
+    def _send_bytes(self, msg_bytes: List[int]) -> bool:
+        """True — отправлено; False — не отправлено и учтено в failed (см. docstring класса)."""
+        if not self.healthy:
+            self.failed += 1
+            return False
+        err = self._try_send(msg_bytes)
+        if err is not None:
+            if self.supervised:
+                self.failed += 1
+                self.mark_failed(err)
+                return False
+            if not (self._reopen_inline() and self._try_send(msg_bytes) is None):
+                self.failed += 1
+                return False
+        self.sent += 1
+        if self._debug and msg_bytes[0] < 0xF8:   # realtime (clock 24 раза на четверть) — не в лог
+            player_logger.debug("[MIDI OUT] Sent %s", msg_bytes)
+        return True
+
+    def send_now(self, msg_bytes: List[int]) -> bool:
+        """Синхронно из вызывающего потока, мимо очереди (момент отправки задаёт планировщик)."""
+        return self._send_bytes(msg_bytes)
+
+    def set_origin(self, t: Optional[float]):
+        """Момент оцифровки (perf_counter) для последующих сообщений; None — не мерить e2e."""
+        self._origin = t
+
+    def _submit(self, msg_bytes: List[int]):
+        if self._q is None:
+            if not self._send_bytes(msg_bytes):
+                if not self.supervised:
+                    # порт никто не переоткроет — ошибка наверх, а не тихий счётчик failed
+                    raise RuntimeError(f"MIDI send to port {self.port_name} failed: {msg_bytes}")
+                return
+            if self._origin is not None:
+                self.e2e.record(time.perf_counter() - self._origin)
+            return
+        try:
+            self._q.put_nowait((msg_bytes, time.perf_counter(), self._origin))
+        except queue.Full:
+            self.dropped += 1
+
+    def send_batch(self, msgs: Tuple[List[int], ...]):
+        """Готовые сообщения одним вызовом: в потоковом режиме — один элемент очереди на всю пачку."""
+        if not msgs:
+            return
+        if self._q is None:
+            for msg in msgs:
+                self._submit(msg)
+            return
+        try:
+            self._q.put_nowait((msgs, time.perf_counter(), self._origin))
+        except queue.Full:
+            self.dropped += len(msgs)
+
+    def _worker(self):
+        q = self._q
+        while True:
+            batch = [q.get()]
+            while len(batch) < self._batch_max:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            if any(item is _STOP for item in batch):
+                stop = True
+                batch = [item for item in batch if item is not _STOP]
+            self._send_batch(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                q.task_done()
+            if stop:
+                return
+
+    def _send_batch(self, batch):
+        if any(type(item[0]) is tuple for item in batch):
+            # пачки из send_batch разворачиваем в отдельные сообщения с общим временем постановки
+            batch = [(m, t, o) for msg, t, o in batch for m in (msg if type(msg) is tuple else (msg,))]
+        # для каждого CC в пачке важна только последняя запись
+        last_cc: Dict[Tuple[int, int], int] = {}
+        for i, (msg, _, _) in enumerate(batch):
+            if msg[0] & 0xF0 == 0xB0:
+                last_cc[(msg[0], msg[1])] = i
+        for i, (msg, t_enq, origin) in enumerate(batch):
+            if msg[0] & 0xF0 == 0xB0:
+                key = (msg[0], msg[1])
+                if last_cc[key] != i or self._cc_sent.get(key) == msg[2]:
+                    self.coalesced += 1
+                    continue
+            if not self._send_bytes(msg):
+                continue  # уже залогировано и учтено в failed; поток отправки не падает
+            if msg[0] & 0xF0 == 0xB0:
+                self._cc_sent[(msg[0], msg[1])] = msg[2]
+            t = time.perf_counter()
+            self.latency.record(t - t_enq)
+            if origin is not None:
+                self.e2e.record(t - origin)
+
+    def queue_depth(self) -> int:
+        return self._q.qsize() if self._q is not None else 0
+
+    def flush(self, timeout: float = 1.0) -> bool:
+        """Дождаться отправки всего, что уже в очереди."""
+        if self._q is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while self._q.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def close(self):
+        if self._thread is not None:
             try:
-                import mido  # type: ignore
-                with mido.open_output(self.port_name) as out:
-                    msg = mido.Message.from_bytes(bytes(msg_bytes))
-                    out.send(msg)
-                    player_logger.debug(f"[MIDI OUT] Sent via mido fallback: {msg_bytes}")
-                    return
-            except Exception as e2:
-                player_logger.error("Unable to send MIDI msg %s; rtmidi err: %s; mido err: %s",
-                                    msg_bytes, e, e2, exc_info=True)
-                raise
+                self._q.put(_STOP, timeout=1.0)
+            except queue.Full:
+                pass
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        with self._port_lock:
+            self._close_port()
 
     def note_on(self, note: int, velocity: int = 127, channel: int = 1):
         status = 0x90 | ((channel - 1) & 0x0F)
-        self._send_bytes([status, note & 0x7F, velocity & 0x7F])
+        self._submit([status, note & 0x7F, velocity & 0x7F])
 
     def note_off(self, note: int, channel: int = 1):
         status = 0x80 | ((channel - 1) & 0x0F)
-        self._send_bytes([status, note & 0x7F, 0])
+        self._submit([status, note & 0x7F, 0])
 
     def cc(self, cc_num: int, value: int, channel: int = 1):
         status = 0xB0 | ((channel - 1) & 0x0F)
-        self._send_bytes([status, cc_num & 0x7F, value & 0x7F])
\ No newline at end of file
+        self._submit([status, cc_num & 0x7F, value & 0x7F])
@@ -0,0 +1,268 @@
+import heapq
+import logging
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from smartctl.metrics import LatencyHistogram
+
+player_logger = logging.getLogger("player")
+
+# последний отрезок ожидания — активный; на Windows таймауты ожидания идут с шагом ~15.6 мс
+DEFAULT_SPIN_SECONDS = 0.016 if sys.platform == "win32" else 0.002
+# конец активного ожидания — без отдачи GIL
+BUSY_SECONDS = 0.0005
+
+PPQN = 24
+_CLOCK_TAG = "_clock"
+_MIDI_CLOCK, _MIDI_START, _MIDI_STOP = [0xF8], [0xFA], [0xFC]
+
+
+class MidiScheduler:
+    """
+    Отправка MIDI к заданному моменту (perf_counter) из своего потока.
+
+    События лежат в куче (heapq) по моменту отправки: постановка и выемка — O(log n), тысячи
+    ожидающих событий не замедляют поток. Поток спит на Condition до момента отправки минус
+    spin_seconds, остаток добегает активно (time.sleep(0) отдаёт GIL callback'у PortAudio,
+    последние BUSY_SECONDS — без отдачи) и отправляет всё, чему пришло время, синхронно через
+    MidiSender.send_now — мимо очереди отправителя, чтобы момент задавал планировщик.
+
+    Точность ограничена GIL: поток, проснувшийся на Condition или отдавший GIL, получает его
+    обратно, только когда держащий поток его отпустит — не позже switch interval интерпретатора
+    (sys.getswitchinterval(), 5 мс). Замер benchmarks/bench_midi_scheduler (1 CPU, 2 потока
+    нагрузки на GIL): опоздание p50 ~2 мс, p99 9-15 мс; без нагрузки p50 ~0.03 мс. Нужна точность
+    выше — отправку держать в процессе без нагрузки на GIL.
+
+    У каждого порта своя известная задержка за ним (loopMIDI + световой софт): событие к
+    моменту t уходит в t - latency, чтобы дойти до приёмника вовремя.
+
+    MIDI clock: 24 тика на четверть по сетке origin + k * период (без накопления ошибки);
+    смена темпа перестраивает сетку со следующего тика, без разрыва. Сетку (bpm, origin,
+    период, следующий тик) меняют только под _cv: set_tempo из цикла обработки и _fire из
+    потока планировщика.
+
+    Опоздание каждой отправки относительно расписания — в гистограмму lateness, отклонение
+    интервала между тиками clock от периода — в clock_jitter.
+    cancel(tag) снимает все ещё не отправленные события с этим тегом за O(1) (ленивое удаление).
+    """
+
+    def __init__(self, spin_seconds: Optional[float] = None, max_pending: int = 10000,
+                 clock: Callable[[], float] = time.perf_counter):
+        self.spin_seconds = DEFAULT_SPIN_SECONDS if spin_seconds is None else float(spin_seconds)
+        if self.spin_seconds < 0:
+            raise ValueError(f"MidiScheduler spin_seconds must be >= 0, got {spin_seconds}")
+        if max_pending < 1:
+            raise ValueError(f"MidiScheduler max_pending must be >= 1, got {max_pending}")
+        self.max_pending = max_pending
+        self._clock = clock
+        # (момент отправки, порядковый номер, порт, сообщение или номер тика, тег, поколение тега)
+        self._heap: List[Tuple[float, int, str, Any, Optional[str], int]] = []
+        self._seq = 0
+        self._ports: Dict[str, Tuple[Any, float]] = {}
+        self._tags: Dict[str, int] = {}
+        self._cv = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # сетка clock
+        self.bpm: Optional[float] = None
+        self._clock_port = "main"
+        self._tick_period = 0.0
+        self._origin = 0.0
+        self._last_tick: Optional[float] = None
+        self._next_tick: Optional[float] = None
+        self.sent = 0
+        self.dropped = 0
+        self.cancelled = 0
+        self.ticks = 0
+        self.lateness = LatencyHistogram("midi_sched_late")
+        self.clock_jitter = LatencyHistogram("midi_clock_jitter")
+
+    # --- порты ---
+
+    def add_port(self, name: str, sender, latency_seconds: float = 0.0):
+        if latency_seconds < 0:
+            raise ValueError(f"Port '{name}' latency must be >= 0, got {latency_seconds}")
+        self._ports[name] = (sender, float(latency_seconds))
+
+    def set_port(self, name: str, sender):
+        """Другой отправитель для порта (после переоткрытия при перезагрузке) с той же задержкой."""
+        self._ports[name] = (sender, self._ports[name][1])
+
+    def latency(self, port: str = "main") -> float:
+        return self._ports[port][1]
+
+    # --- события ---
+
+    def schedule(self, t: float, msg: List[int], port: str = "main", tag: Optional[str] = None) -> bool:
+        """Сообщение должно дойти до приёмника в момент t (perf_counter); False — очередь полна."""
+        if port not in self._ports:
+            raise ValueError(f"Unknown MIDI scheduler port '{port}'")
+        return self._push(t - self._ports[port][1], port, msg, tag)
+
+    def schedule_in(self, delay: float, msg: List[int], port: str = "main", tag: Optional[str] = None) -> bool:
+        return self.schedule(self._clock() + delay, msg, port, tag)
+
+    def _push(self, send_at: float, port: str, msg, tag: Optional[str], gen: Optional[int] = None) -> bool:
+        with self._cv:
+            if len(self._heap) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._seq += 1
+            if gen is None:
+                gen = self._tags.get(tag, 0) if tag is not None else 0
+            item = (send_at, self._seq, port, msg, tag, gen)
+            heapq.heappush(self._heap, item)
+            if self._heap[0] is item:
+                self._cv.notify()   # новое событие раньше всех — поток должен проснуться раньше
+        return True
+
+    def cancel(self, tag: str):
+        with self._cv:
+            self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def pending(self) -> int:
+        return len(self._heap)
+
+    # --- MIDI clock ---
+
+    def start_clock(self, bpm: float, port: str = "main", send_start: bool = True):
+        """24-ppqn clock с ближайшего момента (после spin); send_start — перед первым тиком MIDI Start."""
+        if bpm <= 0:
+            raise ValueError(f"MIDI clock bpm must be > 0, got {bpm}")
+        if port not in self._ports:
+            raise ValueError(f"Unknown MIDI scheduler port '{port}'")
+        with self._cv:
+            self._tags[_CLOCK_TAG] = self._tags.get(_CLOCK_TAG, 0) + 1
+            self._clock_port = port
+            t0 = self._clock() + 2 * self.spin_seconds + 0.005
+            if send_start:
+                self.schedule(t0, _MIDI_START, port)
+            self._rebase(t0, bpm)
+        player_logger.info("[Clock] MIDI clock %.1f BPM (%d ppqn) on port '%s'", bpm, PPQN, port)
+
+    def set_tempo(self, bpm: float, tolerance_bpm: float = 0.0):
+        """Новый темп со следующего тика; изменение меньше tolerance_bpm игнорируется."""
+        if bpm <= 0:
+            return
+        # весь перенос сетки под _cv: иначе _fire успевает сдвинуть _next_tick между чтением и
+        # перестройкой, и новая сетка начинается с уже отправленного тика
+        with self._cv:
+            if self.bpm is None or abs(bpm - self.bpm) <= tolerance_bpm:
+                return
+            nxt = self._next_tick
+            self._tags[_CLOCK_TAG] = self._tags.get(_CLOCK_TAG, 0) + 1
+            self._rebase(nxt if nxt is not None else self._clock(), bpm)
+
+    def stop_clock(self, send_stop: bool = True):
+        with self._cv:
+            if self.bpm is None:
+                return
+            self._tags[_CLOCK_TAG] = self._tags.get(_CLOCK_TAG, 0) + 1
+            self.bpm = None
+            self._next_tick = None
+            self._last_tick = None
+        if send_stop:
+            self.schedule(self._clock(), _MIDI_STOP, self._clock_port)
+
+    def _rebase(self, origin: float, bpm: float):
+        # под _cv (Condition на RLock — schedule() внутри берёт его повторно)
+        self.bpm = float(bpm)
+        self._tick_period = 60.0 / (self.bpm * PPQN)
+        self._origin = origin
+        self._next_tick = origin
+        self.schedule(origin, 0, self._clock_port, _CLOCK_TAG)   # сообщение-int — номер тика в сетке
+
+    # --- поток ---
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="midi-scheduler", daemon=True)
+        self._thread.start()
+        player_logger.info("[Scheduler] timed MIDI: spin %.1f ms, ports %s", self.spin_seconds * 1e3,
+                           ", ".join(f"{n} (-{lat * 1e3:.1f} ms)" for n, (_, lat) in self._ports.items()))
+
+    def stop(self, drain_seconds: float = 0.0):
+        """Остановить поток; drain_seconds — сначала дослать то, что должно уйти в этот срок."""
+        if self._thread is None:
+            return
+        deadline = self._clock() + drain_seconds
+        while drain_seconds > 0 and self._heap and self._heap[0][0] <= deadline and self._clock() < deadline:
+            time.sleep(0.001)
+        with self._cv:
+            self._stopping = True
+            self._cv.notify()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def _run(self):
+        heap = self._heap
+        clock = self._clock
+        spin = self.spin_seconds
+        while True:
+            with self._cv:
+                while True:
+                    if self._stopping:
+                        return
+                    if not heap:
+                        self._cv.wait()
+                        continue
+                    due = heap[0][0]
+                    wait = due - clock()
+                    if wait <= spin:
+                        break
+                    self._cv.wait(wait - spin)
+            # добегаем остаток; более раннее событие, поставленное за это время, тоже учитываем.
+            # sleep(0) отдаёт GIL, но вернуть его можно только через switch interval (5 мс) —
+            # последние BUSY_SECONDS крутимся, не отдавая
+            while True:
+                now = clock()
+                if heap and heap[0][0] < due:
+                    due = heap[0][0]
+                if now >= due:
+                    break
+                if due - now > BUSY_SECONDS:
+                    time.sleep(0)
+            with self._cv:
+                batch = []
+                while heap and heap[0][0] <= now:
+                    batch.append(heapq.heappop(heap))
+            for item in batch:
+                self._fire(item)
+
+    def _fire(self, item):
+        send_at, _, port, msg, tag, gen = item
+        if type(msg) is int:
+            # тик clock: следующий — по сетке от origin, а не от фактического момента отправки.
+            # Проверка поколения и продление сетки — под _cv, атомарно со сменой темпа: тик старой
+            # сетки, вынутый до set_tempo, снимается, а не продолжает её
+            with self._cv:
+                if self._tags.get(tag, 0) != gen:
+                    self.cancelled += 1
+                    return
+                k = msg
+                nxt = self._origin + (k + 1) * self._tick_period
+                self._push(nxt - self._ports[port][1], port, k + 1, tag, gen)
+                self._next_tick = nxt
+            msg = _MIDI_CLOCK
+        elif tag is not None and self._tags.get(tag, 0) != gen:
+            self.cancelled += 1
+            return
+        sender = self._ports[port][0]
+        t = self._clock()
+        self.lateness.record(t - send_at)
+        if sender.send_now(msg):
+            self.sent += 1
+        if msg is _MIDI_CLOCK:
+            self.ticks += 1
+            if self._last_tick is not None:
+                self.clock_jitter.record(abs((t - self._last_tick) - self._tick_period))
+            self._last_tick = t
+
+    def format(self) -> List[str]:
+        lines = [f"sent={self.sent} dropped={self.dropped} cancelled={self.cancelled} pending={self.pending()}",
+                 self.lateness.format()]
+        if self.ticks:
+            lines.append(f"clock ticks={self.ticks}; {self.clock_jitter.format()}")
+        return lines
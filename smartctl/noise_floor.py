@@ -0,0 +1,111 @@
+import math
+from typing import Optional
+
+
+class NoiseFloor:
+    """
+    Скользящий низкий перцентиль RMS за последние horizon блоков — оценка шумового фона.
+
+    Уровни раскладываются по логарифмическим бинам (bins_per_decade на декаду, lo..hi);
+    счётчики бинов — в дереве Фенвика, поэтому добавление, удаление выпавшего из горизонта
+    блока и поиск перцентиля — O(log числа бинов), историю не сортируем. Кольцо хранит
+    только номер бина каждого блока.
+
+    Выход меняется не быстрее max_rate_db_per_s (и вверх, и вниз): разговор у пульта или
+    короткая пауза в музыке не дёргают пороги, а медленное изменение зала отслеживается.
+    """
+
+    def __init__(self, horizon: int, percentile: float = 10.0, lo: float = 1e-7, hi: float = 1.0,
+                 bins_per_decade: int = 24, max_rate_db_per_s: float = 6.0, min_fill: float = 0.25):
+        if horizon <= 0:
+            raise ValueError(f"Noise floor horizon must be positive, got {horizon}")
+        if not 0.0 < percentile < 100.0:
+            raise ValueError(f"Noise floor percentile must be in (0, 100), got {percentile}")
+        self.horizon = horizon
+        self.percentile = percentile
+        self.max_rate_db_per_s = max_rate_db_per_s
+        self.min_count = max(1, int(min_fill * horizon))
+        self._log_lo = math.log10(lo)
+        self._bpd = float(bins_per_decade)
+        self.n_bins = int(math.ceil(math.log10(hi / lo) * bins_per_decade)) + 1
+        self._tree = [0] * (self.n_bins + 1)
+        self._top = 1 << (self.n_bins.bit_length() - 1)
+        self._ring = [-1] * horizon
+        self._i = 0
+        self.count = 0
+        self.value: Optional[float] = None
+        self._last_now: Optional[float] = None
+
+    def _bin(self, rms: float) -> int:
+        if rms <= 0.0:
+            return 0
+        b = int((math.log10(rms) - self._log_lo) * self._bpd)
+        return 0 if b < 0 else (self.n_bins - 1 if b >= self.n_bins else b)
+
+    def _add(self, b: int, delta: int):
+        tree = self._tree
+        i = b + 1
+        n = self.n_bins
+        while i <= n:
+            tree[i] += delta
+            i += i & -i
+
+    def _kth(self, k: int) -> int:
+        """Номер бина, в котором лежит k-й по величине снизу уровень (k от 1)."""
+        tree = self._tree
+        pos = 0
+        step = self._top
+        n = self.n_bins
+        while step:
+            nxt = pos + step
+            if nxt <= n and tree[nxt] < k:
+                pos = nxt
+                k -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def push(self, rms: float):
+        b = self._bin(rms)
+        old = self._ring[self._i]
+        if old >= 0:
+            self._add(old, -1)
+        else:
+            self.count += 1
+        self._ring[self._i] = b
+        self._add(b, 1)
+        self._i = (self._i + 1) % self.horizon
+
+    def quantile(self) -> Optional[float]:
+        """Текущий перцентиль (центр бина) без ограничения скорости; None, пока история пуста."""
+        if self.count == 0:
+            return None
+        k = max(1, int(math.ceil(self.percentile / 100.0 * self.count)))
+        return 10.0 ** (self._log_lo + (self._kth(k) + 0.5) / self._bpd)
+
+    def _follow(self, now: float, start: Optional[float]) -> Optional[float]:
+        if self.count < self.min_count:
+            self._last_now = now
+            return None
+        target = self.quantile()
+        if self.value is None:
+            self.value = start if start is not None else target
+        dt = 0.0 if self._last_now is None else max(0.0, now - self._last_now)
+        self._last_now = now
+        # после долгой паузы (dt большой) шаг не ограничен, но и не переполняется
+        step = 10.0 ** min(12.0, self.max_rate_db_per_s * dt / 20.0)
+        ratio = target / self.value
+        if ratio > step:
+            ratio = step
+        elif ratio < 1.0 / step:
+            ratio = 1.0 / step
+        self.value *= ratio
+        return self.value
+
+    def update(self, rms: float, now: float, start: Optional[float] = None) -> Optional[float]:
+        """
+        Добавить уровень блока и сдвинуть оценку к перцентилю. None — пока история короче
+        min_fill * horizon. start — откуда начинать (например, baseline калибровки).
+        """
+        self.push(rms)
+        return self._follow(now, start)
+
@@ -0,0 +1,232 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Tuple
+
+from smartctl import builders
+from smartctl import config as cfgmod
+from smartctl.controller import SceneController
+
+player_logger = logging.getLogger("player")
+
+
+@dataclass
+class ConfigUpdate:
+    cfg: dict
+    built: Any                # результат build(cfg): готовые к подмене объекты конфигурации
+    detected_perf: float      # perf_counter, когда watcher увидел изменение файла
+    validated_perf: float     # perf_counter, когда новый конфиг прошёл проверку
+
+
+class ConfigWatcher:
+    """
+    Следит за файлом конфига из фонового потока (опрос mtime/размера — без зависимостей и
+    одинаково на Windows/Linux). Изменённый файл читается и проверяется функцией build(cfg)
+    там же; прошедший проверку результат ждёт, пока основной цикл заберёт его через take()
+    между блоками. Ошибочный конфиг отклоняется и считается в rejected — текущий остаётся.
+    """
+
+    def __init__(self, path: str, build: Callable[[dict], Any], poll_seconds: float = 0.5,
+                 settle_seconds: float = 0.1, loader: Callable[[str], dict] = cfgmod.load):
+        self.path = path
+        self.build = build
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.loader = loader
+        self.accepted = 0
+        self.rejected = 0
+        self._key = self._stat()
+        self._pending: Optional[ConfigUpdate] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def poll(self) -> bool:
+        """Одна проверка файла; True, если появился новый проверенный конфиг."""
+        key = self._stat()
+        if key is None or key == self._key:
+            return False
+        detected = time.perf_counter()
+        # редакторы пишут файл в несколько приёмов — ждём, пока он перестанет меняться
+        while True:
+            if self._stop.wait(self.settle_seconds):
+                return False
+            again = self._stat()
+            if again == key:
+                break
+            key = again
+            if key is None:
+                return False
+        self._key = key
+        try:
+            cfg = self.loader(self.path)
+            built = self.build(cfg)
+        except Exception as e:
+            self.rejected += 1
+            player_logger.warning("[Config] reload of %s rejected (%d so far), keeping current config: %s",
+                                  self.path, self.rejected, e)
+            return False
+        with self._lock:
+            self._pending = ConfigUpdate(cfg, built, detected, time.perf_counter())
+        self.accepted += 1
+        return True
+
+    def take(self) -> Optional[ConfigUpdate]:
+        """Забрать проверенный конфиг (из основного цикла); None — изменений нет."""
+        if self._pending is None:
+            return None
+        with self._lock:
+            upd, self._pending = self._pending, None
+        return upd
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.poll()
+            except Exception as e:
+                player_logger.error("[Config] watcher error: %s", e, exc_info=True)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watch", daemon=True)
+        self._thread.start()
+        player_logger.info("[Config] watching %s for changes (every %.1fs)", self.path, self.poll_seconds)
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+
+def build_reloadable(cfg: dict):
+    """Проверка конфига для горячей перезагрузки: (LevelConfig, FSMConfig, SceneTriggerConfig) или ValueError."""
+    level_cfg = builders.build_level_cfg(cfg)
+    fsm_cfg = builders.build_fsm_cfg(cfg)
+    trig_cfg = builders.build_trigger_cfg(cfg["midi"])
+    if not 0.0 < level_cfg.ema_alpha <= 1.0:
+        raise ValueError(f"Config error: audio.ema_alpha must be in (0, 1], got {level_cfg.ema_alpha}")
+    if level_cfg.off_threshold > level_cfg.on_threshold:
+        raise ValueError(f"Config error: logic.off_threshold ({level_cfg.off_threshold}) "
+                         f"is above logic.on_threshold ({level_cfg.on_threshold})")
+    if level_cfg.off_multiplier > level_cfg.on_multiplier:
+        raise ValueError(f"Config error: logic.off_multiplier ({level_cfg.off_multiplier}) "
+                         f"is above logic.on_multiplier ({level_cfg.on_multiplier})")
+    for k in ("startup_grace_seconds", "min_on_seconds", "min_off_seconds", "silence_hold_seconds"):
+        if getattr(fsm_cfg, k) < 0:
+            raise ValueError(f"Config error: logic.{k} must be >= 0, got {getattr(fsm_cfg, k)}")
+    return level_cfg, fsm_cfg, trig_cfg
+
+
+def apply_reload(live, upd: ConfigUpdate):
+    """
+    Подмена конфига в живом цикле (LiveRunner) между блоками. Калибровка (baseline) и текущее
+    состояние детектора/FSM сохраняются — меняются только параметры; MIDI-порт и аудиопоток
+    пересоздаются теми же сборщиками, что и на старте, только если изменились их настройки.
+    Секции RESTART_SECTIONS ждут перезапуска — они возвращаются к текущим до любой пересборки.
+    """
+    t0 = time.perf_counter()
+    cfg, new = live.cfg, upd.cfg
+    level_cfg, fsm_cfg, trig_cfg = upd.built
+    for sec in builders.RESTART_SECTIONS:
+        if new.get(sec) != cfg.get(sec):
+            player_logger.warning("[Config] section '%s' changed; it takes effect after restart", sec)
+            new[sec] = cfg[sec]
+    if bool(new["audio"].get("numba")) != bool(cfg["audio"].get("numba")):
+        player_logger.warning("[Config] audio.numba change takes effect after restart")
+        new["audio"]["numba"] = cfg["audio"].get("numba")
+    scene, supervisor = live.scene, live.supervisor
+    live.fsm.cfg = fsm_cfg
+    for _, band_fsm, _ in live.band_outputs:
+        band_fsm.cfg = fsm_cfg
+    if trig_cfg != scene.cfg:
+        # сцена включена — гасим её старой нотой и включаем новой, чтобы в FS ничего не "зависло"
+        was_on = scene.is_on
+        if was_on:
+            scene.turn_off()
+        scene.cfg = trig_cfg
+        if was_on:
+            scene.turn_on()
+    rebuilt = []
+    if builders.midi_params(new) != builders.midi_params(cfg):
+        try:
+            midi = builders.make_midi(new)
+        except Exception as e:
+            player_logger.error("[Config] MIDI port not reopened, keeping %s: %s", live.midi.port_name, e)
+            new["midi"] = dict(new["midi"], **{k: cfg["midi"].get(k) for k in
+                                               ("output_port_name_contains", "threaded", "queue_size", "batch_max")})
+        else:
+            old_midi, live.midi = live.midi, midi
+            scene.midi = midi
+            if live.beat_trigger is not None:
+                live.beat_trigger.midi = midi
+            if live.scheduler is not None:
+                live.scheduler.set_port("main", midi)
+            for _, _, band_scene in live.band_outputs:
+                if isinstance(band_scene, SceneController):
+                    band_scene.midi = midi
+            for zone_scene in live.zone_scenes:
+                zone_scene.midi = midi
+            if live.scenes is not None:
+                live.scenes.midi = midi
+            if live.lat is not None:
+                live.lat.hists[-2:] = [midi.latency, midi.e2e]
+            if supervisor is not None:
+                supervisor.track(midi=midi)
+            old_midi.close()
+            rebuilt.append("midi")
+    if builders.audio_params(new) != builders.audio_params(cfg):
+        if new["audio"]["samplerate"] != cfg["audio"]["samplerate"] and (live.spectral is not None
+                                                                         or live.beat is not None):
+            player_logger.warning("[Config] audio.samplerate change needs a restart with spectral/beat enabled")
+            new["audio"] = cfg["audio"]
+        elif new["audio"]["channels"] != cfg["audio"]["channels"] and live.zones is not None:
+            player_logger.warning("[Config] audio.channels change needs a restart with zones enabled")
+            new["audio"] = cfg["audio"]
+        else:
+            on_block = getattr(live.audio, "on_block", None)
+            if live.recorder is not None:
+                live.recorder.detach()
+            live.audio.stop()
+            live.audio = audio = builders.make_audio(new)
+            if on_block is not None and hasattr(audio, "on_block"):
+                audio.on_block = on_block
+            if live.recorder is not None:
+                live.recorder.attach(audio.ring, new["audio"]["samplerate"])
+            if live.sliding is not None and new["audio"]["blocksize"] != live.sliding.window:
+                live.sliding = builders.make_sliding(new)
+            audio.start()
+            if supervisor is not None:
+                supervisor.track(audio=audio)
+            if (live.det.noise_floor is not None and live.sliding is None
+                    and new["audio"]["blocksize"] != cfg["audio"]["blocksize"]):
+                # горизонт фона считается в блоках (в hop-режиме — в hop'ах, они не меняются) —
+                # собираем заново; baseline держится, пока новый фон не наполнится
+                live.det.noise_floor = builders.build_noise_floor(new)
+            rebuilt.append("audio")
+    # ema_alpha пересчитывается под hop уже по окончательному audio.blocksize
+    live.det.cfg = builders.loop_level_cfg(new, level_cfg)
+    if live.spectral is not None:
+        for name, band_cfg in builders.band_level_cfgs(new, level_cfg).items():
+            live.spectral.detectors[name].cfg = band_cfg
+    if live.zones is not None:
+        live.zones.fsm_cfg = fsm_cfg
+        live.zones.set_level_cfgs(builders.zone_level_cfgs(new, level_cfg))
+    if live.recorder is not None:
+        live.recorder.context = builders.blackbox_context(new, level_cfg)
+    live.cfg = new
+    t1 = time.perf_counter()
+    player_logger.info("[Config] reloaded%s: swap=%.3fms, file change -> applied %.1fms (validated in %.1fms)",
+                       " (rebuilt %s)" % ", ".join(rebuilt) if rebuilt else "", (t1 - t0) * 1e3,
+                       (t1 - upd.detected_perf) * 1e3, (upd.validated_perf - upd.detected_perf) * 1e3)
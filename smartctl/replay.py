@@ -0,0 +1,334 @@
+import json
+import os
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+
+from smartctl.detectors import LevelConfig, LevelDetector
+from smartctl.sliding import SlidingRms
+from smartctl.state_machine import FSMConfig, OnOffFSM
+
+_WAVE_FORMAT_PCM = 1
+_WAVE_FORMAT_FLOAT = 3
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+RAW_FORMATS = {
+    "float32": ("<f4", 1.0),
+    "int16": ("<i2", 1.0 / 32768.0),
+    "int32": ("<i4", 1.0 / 2147483648.0),
+}
+
+
+class SimClock:
+    """Симулированные часы: время двигает только реплей."""
+
+    def __init__(self, start: float = 0.0):
+        self.t = start
+
+    def __call__(self) -> float:
+        return self.t
+
+    def advance(self, dt: float):
+        self.t += dt
+
+
+@dataclass
+class PcmSource:
+    samplerate: int
+    channels: int
+    frames: np.ndarray          # memmap (frames, channels) или (frames, channels, 3) для 24 бит
+    scale: float
+    bias: float = 0.0
+    int24: bool = False
+
+    @property
+    def n_frames(self) -> int:
+        return int(self.frames.shape[0])
+
+    def to_float(self, start: int, stop: int) -> np.ndarray:
+        # конвертируем кусок файла в моно float32 так же, как AudioStream._callback
+        raw = self.frames[start:stop]
+        if self.int24:
+            b = raw.astype(np.int32)
+            v = b[..., 0] | (b[..., 1] << 8) | (b[..., 2] << 16)
+            raw = np.where(v >= 1 << 23, v - (1 << 24), v)
+        data = raw.astype(np.float32)
+        if self.bias:
+            data -= np.float32(self.bias)
+        if self.scale != 1.0:
+            data *= np.float32(self.scale)
+        if self.channels > 1:
+            return np.mean(data, axis=1).astype(np.float32)
+        return data[:, 0]
+
+
+def _open_wav(path: str) -> PcmSource:
+    with open(path, "rb") as f:
+        head = f.read(12)
+        if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+            raise ValueError(f"Not a RIFF/WAVE file: {path}")
+        fmt = None
+        data_off = data_len = None
+        while True:
+            ch = f.read(8)
+            if len(ch) < 8:
+                break
+            cid, clen = ch[:4], struct.unpack("<I", ch[4:])[0]
+            if cid == b"fmt ":
+                fmt = f.read(clen)
+            elif cid == b"data":
+                data_off = f.tell()
+                data_len = clen
+                break
+            else:
+                f.seek(clen, os.SEEK_CUR)
+            if clen & 1:
+                f.seek(1, os.SEEK_CUR)
+    if fmt is None or data_off is None:
+        raise ValueError(f"WAV without fmt/data chunk: {path}")
+
+    tag, channels, sr, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if tag == _WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack("<H", fmt[24:26])[0]
+
+    # data_len бывает некорректным у оборванных записей — доверяем размеру файла
+    data_len = min(data_len, os.path.getsize(path) - data_off)
+    n_frames = data_len // block_align
+    if tag == _WAVE_FORMAT_FLOAT and bits in (32, 64):
+        dtype, scale = ("<f4" if bits == 32 else "<f8"), 1.0
+    elif tag == _WAVE_FORMAT_PCM and bits == 8:
+        frames = np.memmap(path, dtype=np.uint8, mode="r", offset=data_off, shape=(n_frames, channels))
+        return PcmSource(sr, channels, frames, 1.0 / 128.0, bias=128.0)
+    elif tag == _WAVE_FORMAT_PCM and bits == 16:
+        dtype, scale = "<i2", 1.0 / 32768.0
+    elif tag == _WAVE_FORMAT_PCM and bits == 32:
+        dtype, scale = "<i4", 1.0 / 2147483648.0
+    elif tag == _WAVE_FORMAT_PCM and bits == 24:
+        frames = np.memmap(path, dtype=np.uint8, mode="r", offset=data_off, shape=(n_frames, channels, 3))
+        return PcmSource(sr, channels, frames, 1.0 / 8388608.0, int24=True)
+    else:
+        raise ValueError(f"Unsupported WAV format tag={tag} bits={bits}: {path}")
+
+    frames = np.memmap(path, dtype=dtype, mode="r", offset=data_off, shape=(n_frames, channels))
+    return PcmSource(sr, channels, frames, scale)
+
+
+def open_pcm(path: str, raw_format: str = "float32", raw_samplerate: int = 44100,
+             raw_channels: int = 1) -> PcmSource:
+    """WAV открывается по заголовку, остальное читается как сырой PCM (без копирования, через memmap)."""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic == b"RIFF":
+        return _open_wav(path)
+    if raw_format not in RAW_FORMATS:
+        raise ValueError(f"Unknown raw format: {raw_format}. Use one of {sorted(RAW_FORMATS)}")
+    dtype, scale = RAW_FORMATS[raw_format]
+    itemsize = np.dtype(dtype).itemsize
+    n_frames = os.path.getsize(path) // (itemsize * raw_channels)
+    frames = np.memmap(path, dtype=dtype, mode="r", shape=(n_frames, raw_channels))
+    return PcmSource(raw_samplerate, raw_channels, frames, scale)
+
+
+def iter_chunks(src: PcmSource, blocksize: int, chunk_blocks: int = 256) -> Iterator[np.ndarray]:
+    # конвертация идёт пачками (n, blocksize), хвост короче блока отбрасывается (как и в живом потоке)
+    n_blocks = src.n_frames // blocksize
+    for b0 in range(0, n_blocks, chunk_blocks):
+        b1 = min(n_blocks, b0 + chunk_blocks)
+        yield src.to_float(b0 * blocksize, b1 * blocksize).reshape(b1 - b0, blocksize)
+
+
+def iter_blocks(src: PcmSource, blocksize: int, chunk_blocks: int = 256) -> Iterator[np.ndarray]:
+    for chunk in iter_chunks(src, blocksize, chunk_blocks):
+        for row in chunk:
+            yield row
+
+
+@dataclass
+class ReplayEvent:
+    t: float
+    kind: str
+    block: int
+    smooth: float
+
+
+@dataclass
+class ReplayReport:
+    blocks: int
+    audio_seconds: float
+    wall_seconds: float
+    baseline: Optional[float]
+    events: List[ReplayEvent] = field(default_factory=list)
+
+    @property
+    def blocks_per_sec(self) -> float:
+        return self.blocks / self.wall_seconds if self.wall_seconds > 0 else float("inf")
+
+    @property
+    def us_per_block(self) -> float:
+        return 1e6 * self.wall_seconds / self.blocks if self.blocks else 0.0
+
+    @property
+    def realtime_factor(self) -> float:
+        return self.audio_seconds / self.wall_seconds if self.wall_seconds > 0 else float("inf")
+
+    def format(self) -> str:
+        lines = [
+            f"blocks={self.blocks} audio={self.audio_seconds:.2f}s wall={self.wall_seconds:.3f}s",
+            f"throughput={self.blocks_per_sec:.0f} blocks/s  cost={self.us_per_block:.2f} us/block  "
+            f"realtime x{self.realtime_factor:.0f}",
+            f"baseline={self.baseline if self.baseline is not None else -1.0:.6f}  events={len(self.events)}",
+        ]
+        for e in self.events:
+            lines.append(f"{e.t:12.6f}s  {e.kind:<3}  block={e.block}  lvl={e.smooth:.5f}")
+        return "\n".join(lines)
+
+
+def load_sidecar(path: str) -> Optional[dict]:
+    """JSON чёрного ящика рядом с bb_*.wav (состояние детектора и настройки живой цепочки) или None."""
+    side = os.path.splitext(path)[0] + ".json"
+    if not os.path.isfile(side):
+        return None
+    with open(side, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or "state" not in data or "trigger_offset_frames" not in data:
+        return None
+    return data
+
+
+def warm_state(sidecar: dict) -> Optional[dict]:
+    """
+    Стартовое состояние реплея записи чёрного ящика: baseline и шумовой фон живого детектора
+    и состояние FSM до триггера. None — baseline не записан (калибровка ещё шла).
+    """
+    state = sidecar.get("state") or {}
+    if state.get("baseline") is None:
+        return None
+    fsm = {"on": "OFF", "off": "ON"}.get(sidecar.get("reason"), state.get("fsm", "OFF"))
+    return {"baseline": float(state["baseline"]), "noise_floor": state.get("noise_floor"), "fsm": fsm}
+
+
+def _warm_start(det: LevelDetector, fsm: OnOffFSM, warm: dict):
+    # пороги — как у живого детектора; EMA уровня догоняет звук за первые блоки окна до триггера
+    det.warm_start(warm["baseline"])
+    if det.noise_floor is not None and warm.get("noise_floor") is not None:
+        det.noise_floor.value = float(warm["noise_floor"])
+    fsm.state = warm["fsm"]
+
+
+def replay(blocks: Iterator[np.ndarray], samplerate: int, blocksize: int,
+           level_cfg: LevelConfig, fsm_cfg: FSMConfig, noise_floor=None, features=None,
+           sliding: Optional[SlidingRms] = None, warm: Optional[dict] = None) -> ReplayReport:
+    """
+    Прогоняет блоки через LevelDetector/OnOffFSM так быстро, как позволяет CPU.
+    Время каждого блока — момент его прихода в живом потоке (конец блока).
+
+    Цепочка — как в живом цикле: noise_floor/features передаются в детектор, с sliding
+    блоки — hop'ы устройства (blocksize = hop), уровень — скользящее окно. warm (см. warm_state) —
+    старт с записанного baseline вместо калибровки на первых calibration_seconds звука.
+    """
+    clock = SimClock()
+    det = LevelDetector(level_cfg, clock=clock, noise_floor=noise_floor, features=features)
+    fsm = OnOffFSM(fsm_cfg, clock=clock)
+    if warm is not None:
+        _warm_start(det, fsm, warm)
+    dt = blocksize / float(samplerate)
+    events: List[ReplayEvent] = []
+    n = 0
+    info = None
+
+    def on_event():
+        events.append(ReplayEvent(clock(), "ON", n, info["smooth"]))
+
+    def off_event():
+        events.append(ReplayEvent(clock(), "OFF", n, info["smooth"]))
+
+    t0 = time.perf_counter()
+    for blk in blocks:
+        calibrating = warm is None and clock() < level_cfg.calibration_seconds
+        clock.advance(dt)
+        if sliding is None:
+            if calibrating:
+                det.calibrate_step(blk)
+            else:
+                info = det.update(blk)
+                fsm.step(det.state, info, on_event=on_event, off_event=off_event)
+        else:
+            for rms in sliding.push(blk):
+                if calibrating:
+                    det.calibrate_value(rms)
+                else:
+                    info = det.update_value(rms)
+                    fsm.step(det.state, info, on_event=on_event, off_event=off_event)
+        n += 1
+    wall = time.perf_counter() - t0
+
+    return ReplayReport(blocks=n, audio_seconds=n * dt, wall_seconds=wall,
+                        baseline=det.state.baseline, events=events)
+
+
+def replay_batch(chunks: Iterator[np.ndarray], samplerate: int, blocksize: int,
+                 level_cfg: LevelConfig, fsm_cfg: FSMConfig, noise_floor=None, features=None,
+                 sliding: Optional[SlidingRms] = None, warm: Optional[dict] = None) -> ReplayReport:
+    """То же, что replay(), но через LevelDetector.update_batch/update_values и OnOffFSM.step_batch."""
+    clock = SimClock()
+    det = LevelDetector(level_cfg, clock=clock, noise_floor=noise_floor, features=features)
+    fsm = OnOffFSM(fsm_cfg, clock=clock)
+    if warm is not None:
+        _warm_start(det, fsm, warm)
+    calib_seconds = 0.0 if warm is not None else level_cfg.calibration_seconds
+    dt = blocksize / float(samplerate)
+    events: List[ReplayEvent] = []
+    n = 0
+    binfo = None
+    pos = {"i": 0}
+
+    def _event(kind: str):
+        # step_batch не сообщает индекс блока — восстанавливаем его по времени
+        t = fsm.since
+        k = int(round(t / dt)) - 1
+        events.append(ReplayEvent(t, kind, k, float(binfo["smooth"][k - pos["i"]])))
+
+    t0 = time.perf_counter()
+    for chunk in chunks:
+        m = len(chunk)
+        # калибровочные блоки идут по одному, как в живом цикле
+        calib = 0
+        while calib < m and (n + calib) * dt < calib_seconds:
+            if sliding is None:
+                det.calibrate_step(chunk[calib])
+            else:
+                for rms in sliding.push(chunk[calib]):
+                    det.calibrate_value(rms)
+            calib += 1
+        if calib < m:
+            times = (np.arange(n + calib, n + m, dtype=np.float64) + 1.0) * dt
+            if sliding is None:
+                binfo = det.update_batch(chunk[calib:], times=times)
+            else:
+                # блок устройства = hop: уровень на каждый блок, пока окно не заполнено — тоже
+                levels = sliding.push_many(chunk[calib:])
+                times = times[len(times) - len(levels):]
+                binfo = det.update_values(levels, times)
+            pos["i"] = n + m - len(times)
+            fsm.step_batch(det.state, binfo, on_event=lambda: _event("ON"), off_event=lambda: _event("OFF"))
+        n += m
+        clock.t = n * dt
+    wall = time.perf_counter() - t0
+
+    return ReplayReport(blocks=n, audio_seconds=n * dt, wall_seconds=wall,
+                        baseline=det.state.baseline, events=events)
+
+
+def replay_file(path: str, blocksize: int, level_cfg: LevelConfig, fsm_cfg: FSMConfig,
+                raw_format: str = "float32", raw_samplerate: int = 44100,
+                raw_channels: int = 1, batch: bool = False, noise_floor=None, features=None,
+                sliding: Optional[SlidingRms] = None, warm: Optional[dict] = None) -> Tuple[PcmSource, ReplayReport]:
+    src = open_pcm(path, raw_format=raw_format, raw_samplerate=raw_samplerate, raw_channels=raw_channels)
+    chain = dict(noise_floor=noise_floor, features=features, sliding=sliding, warm=warm)
+    if batch:
+        report = replay_batch(iter_chunks(src, blocksize), src.samplerate, blocksize, level_cfg, fsm_cfg, **chain)
+    else:
+        report = replay(iter_blocks(src, blocksize), src.samplerate, blocksize, level_cfg, fsm_cfg, **chain)
+    return src, report
@@ -0,0 +1,143 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+import numpy as np
+
+
+@dataclass
+class BlockTiming:
+    adc_time: float        # inputBufferAdcTime, часы потока (0 — драйвер не сообщает)
+    callback_time: float   # currentTime в callback, часы потока
+    callback_perf: float   # time.perf_counter() в callback
+    dequeue_perf: float    # time.perf_counter() при выдаче блока основному циклу
+
+    @property
+    def origin_perf(self) -> float:
+        """Момент оцифровки блока в шкале perf_counter (или момент callback, если ADC неизвестен)."""
+        if self.adc_time > 0.0 and self.callback_time >= self.adc_time:
+            return self.callback_perf - (self.callback_time - self.adc_time)
+        return self.callback_perf
+
+
+class BlockRing:
+    """
+    Кольцо блоков для одного писателя (callback PortAudio) и одного читателя (основной цикл).
+    Все данные лежат в одном заранее выделенном float32-буфере; писатель пишет в слот на месте,
+    читатель получает view на слот без копирования. Индексы — монотонные счётчики, каждый
+    меняет только своя сторона, поэтому замки не нужны (присваивание int атомарно под GIL).
+
+    channels > 0 — у слота есть ещё строка chan_ms: средний квадрат каждого входного канала
+    блока (до даунмикса), для детекторов по зонам.
+    """
+
+    def __init__(self, capacity: int, blocksize: int, channels: int = 0):
+        if capacity < 2:
+            raise ValueError("BlockRing capacity must be >= 2")
+        self.capacity = capacity
+        self.blocksize = blocksize
+        self.buf = np.zeros((capacity, blocksize), dtype=np.float32)
+        self.lengths = np.full(capacity, blocksize, dtype=np.int64)
+        # view на каждый слот создаём один раз, чтобы callback не аллоцировал даже объекты-обёртки
+        self._rows: List[np.ndarray] = [self.buf[i] for i in range(capacity)]
+        # отметки времени блока: ADC и callback в часах потока PortAudio, callback в perf_counter
+        self.adc_time: List[float] = [0.0] * capacity
+        self.cb_time: List[float] = [0.0] * capacity
+        self.cb_perf: List[float] = [0.0] * capacity
+        self.chan_ms: Optional[np.ndarray] = np.zeros((capacity, channels), dtype=np.float32) if channels else None
+        self._ms_rows: List[np.ndarray] = [self.chan_ms[i] for i in range(capacity)] if channels else []
+        self._write = 0        # пишет только производитель
+        self._read = 0         # пишет только потребитель
+        self._held = 0         # сколько слотов от _read потребитель держит в виде view
+        self.overruns = 0      # блоки, отброшенные из-за переполнения
+        self._ready = threading.Event()
+
+    # --- производитель ---
+
+    def acquire(self) -> Optional[np.ndarray]:
+        """Слот для записи или None, если кольцо заполнено (блок теряется и учитывается)."""
+        if self._write - self._read >= self.capacity:
+            self.overruns += 1
+            return None
+        return self._rows[self._write % self.capacity]
+
+    def chan_ms_slot(self) -> np.ndarray:
+        """Строка chan_ms слота, отданного последним acquire()."""
+        return self._ms_rows[self._write % self.capacity]
+
+    def commit(self, frames: int, adc_time: float = 0.0, cb_time: float = 0.0, cb_perf: float = 0.0):
+        i = self._write % self.capacity
+        if self.lengths[i] != frames:
+            self.lengths[i] = frames
+        self.adc_time[i] = adc_time
+        self.cb_time[i] = cb_time
+        self.cb_perf[i] = cb_perf
+        self._write += 1
+        # Event.set берёт замок — дёргаем его, только если потребитель действительно ждёт
+        if not self._ready.is_set():
+            self._ready.set()
+
+    def head(self) -> int:
+        """Сколько блоков записано всего (номер следующего блока)."""
+        return self._write
+
+    # --- потребитель ---
+
+    def pending(self) -> int:
+        return self._write - self._read - self._held
+
+    def consumed(self) -> int:
+        """Сколько блоков отдано потребителю всего (номер последнего отданного + 1)."""
+        return self._read + self._held
+
+    def release(self):
+        """Отдать слоты, полученные прошлым read()/read_many(), обратно производителю."""
+        if self._held:
+            self._read += self._held
+            self._held = 0
+
+    def read(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        """
+        View на следующий блок. Он валиден до следующего вызова read()/release():
+        до этого момента производитель в слот не пишет.
+        """
+        self.release()
+        if self._write == self._read:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._write == self._read:
+                self._ready.clear()
+                if self._write != self._read:
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._ready.wait(remaining)
+        i = self._read % self.capacity
+        self._held = 1
+        n = int(self.lengths[i])
+        row = self._rows[i]
+        return row if n == self.blocksize else row[:n]
+
+    def current_slot(self) -> int:
+        """Индекс слота, отданного последним read() (для чтения отметок времени)."""
+        return self._read % self.capacity
+
+    def held_chan_ms(self) -> np.ndarray:
+        """chan_ms блоков, отданных последним read()/read_many(): view (n, channels)."""
+        i0 = self.current_slot()
+        return self.chan_ms[i0:i0 + self._held]
+
+    def read_many(self, max_blocks: int) -> np.ndarray:
+        """
+        Уже накопленные полные блоки одним 2-D view (n, blocksize), не ждёт. За один вызов
+        отдаётся только непрерывный участок до конца буфера — остаток придёт следующим.
+        """
+        self.release()
+        i0 = self._read % self.capacity
+        n = min(self._write - self._read, self.capacity - i0, max_blocks)
+        if n > 0:
+            short = np.flatnonzero(self.lengths[i0:i0 + n] != self.blocksize)
+            if len(short):
+                n = int(short[0])  # неполный блок отдаст обычный read()
+        self._held = n
+        return self.buf[i0:i0 + n]
@@ -0,0 +1,193 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from smartctl.controller import SceneTriggerConfig, trigger_messages
+from smartctl.midi_io import MidiSender
+
+player_logger = logging.getLogger("player")
+
+# таблица переходов заполняется по мере встречи; при десятках сцен пар (старое, новое) может быть много
+_MAX_TRANSITIONS = 4096
+
+
+@dataclass
+class SceneRule:
+    name: str
+    # источник: "level" (основной FSM), "band:<имя полосы>", "beat" (трекер держит темп)
+    source: str
+    trigger: SceneTriggerConfig
+    priority: int = 0
+    # в группе одновременно включена одна сцена — с наибольшим priority среди желающих
+    group: Optional[str] = None
+    # после выключения сцена не включается снова раньше, чем через cooldown_seconds
+    cooldown_seconds: float = 0.0
+
+
+def _bits(mask: int):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class SourceInput:
+    """Вход контроллера с интерфейсом сцены (turn_on/turn_off/is_on) — к нему подключается обычный OnOffFSM."""
+
+    def __init__(self, ctrl: "MultiSceneController", index: int, name: str):
+        self.ctrl = ctrl
+        self.index = index
+        self.name = name
+
+    @property
+    def is_on(self) -> bool:
+        return bool(self.ctrl.sources_mask >> self.index & 1)
+
+    def turn_on(self):
+        self.ctrl.set_source(self.index, True)
+
+    def turn_off(self):
+        self.ctrl.set_source(self.index, False)
+
+    def set(self, on: bool):
+        self.ctrl.set_source(self.index, on)
+
+
+class MultiSceneController:
+    """
+    Много сцен от нескольких источников с приоритетами, группами взаимного исключения и cooldown.
+
+    Правила компилируются при создании: у каждого правила — бит, биты упорядочены по
+    (группа, -priority), поэтому победитель группы — младший установленный бит в
+    (желающие & маска группы). Источник -> маска его правил, так что смена источника — одна
+    битовая операция. Байты MIDI каждой сцены собраны заранее; пачка сообщений для перехода
+    (старый набор включённых -> новый) строится один раз и дальше берётся из таблицы,
+    переключение — один поиск в словаре и один midi.send_batch.
+
+    Работа на блок — только tick(now): сравнение с ближайшим окончанием cooldown. Всё
+    остальное происходит на смене источника (редко), поэтому стоимость не растёт с числом сцен.
+    """
+
+    def __init__(self, midi: MidiSender, rules: List[SceneRule], clock=None):
+        if not rules:
+            raise ValueError("MultiSceneController needs at least one scene rule")
+        names = [r.name for r in rules]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate scene names: {sorted(n for n in set(names) if names.count(n) > 1)}")
+        self.midi = midi
+        # без группы сцена — сама себе группа
+        order = sorted(rules, key=lambda r: (r.group or f"\0{r.name}", -r.priority))
+        self.rules = order
+        self.source_names: List[str] = []
+        self._source_rules: List[int] = []
+        self._group_masks: List[int] = []
+        self._on_msgs: List[Tuple[List[int], ...]] = []
+        self._off_msgs: List[Tuple[List[int], ...]] = []
+        self._cooldown = [float(r.cooldown_seconds) for r in order]
+        groups: Dict[str, int] = {}
+        for i, r in enumerate(order):
+            if r.source not in self.source_names:
+                self.source_names.append(r.source)
+                self._source_rules.append(0)
+            self._source_rules[self.source_names.index(r.source)] |= 1 << i
+            key = r.group or f"\0{r.name}"
+            if key not in groups:
+                groups[key] = len(self._group_masks)
+                self._group_masks.append(0)
+            self._group_masks[groups[key]] |= 1 << i
+            on_msgs, off_msgs, _, _ = trigger_messages(r.trigger)
+            self._on_msgs.append(on_msgs)
+            self._off_msgs.append(off_msgs)
+        self.n_groups = len(self._group_masks)
+        self.inputs = {name: SourceInput(self, i, name) for i, name in enumerate(self.source_names)}
+        self.sources_mask = 0
+        self.wanted = 0      # правила, чей источник включён
+        self.blocked = 0     # правила в cooldown
+        self.active = 0      # включённые сцены
+        self._blocked_until = [0.0] * len(order)
+        self._next_expiry = math.inf
+        self._transitions: Dict[Tuple[int, int], Tuple[List[int], ...]] = {}
+        self._now = 0.0
+        self._clock = clock
+        self.switches = 0
+
+    def input(self, source: str) -> SourceInput:
+        return self.inputs[source]
+
+    def set_source(self, index: int, on: bool):
+        bit = 1 << index
+        if bool(self.sources_mask & bit) == on:
+            return
+        rules = self._source_rules[index]
+        if on:
+            self.sources_mask |= bit
+            self.wanted |= rules
+        else:
+            self.sources_mask &= ~bit
+            self.wanted &= ~rules
+        self._evaluate(self._clock() if self._clock is not None else self._now)
+
+    def tick(self, now: float):
+        """Раз в блок: время для cooldown; пересчёт — только когда истёк чей-то cooldown."""
+        self._now = now
+        if now >= self._next_expiry:
+            self._evaluate(now)
+
+    def _evaluate(self, now: float):
+        if self.blocked and now >= self._next_expiry:
+            nxt = math.inf
+            for i in _bits(self.blocked):
+                t = self._blocked_until[i]
+                if now >= t:
+                    self.blocked &= ~(1 << i)
+                elif t < nxt:
+                    nxt = t
+            self._next_expiry = nxt
+        eligible = self.wanted & ~self.blocked
+        new = 0
+        for gm in self._group_masks:
+            cand = eligible & gm
+            if cand:
+                new |= cand & -cand
+        if new != self.active:
+            self._switch(new, now)
+
+    def _switch(self, new: int, now: float):
+        old = self.active
+        key = (old, new)
+        msgs = self._transitions.get(key)
+        if msgs is None:
+            # выключения раньше включений — в группе старая сцена гаснет до старта новой
+            msgs = tuple(m for i in _bits(old & ~new) for m in self._off_msgs[i]) + \
+                   tuple(m for i in _bits(new & ~old) for m in self._on_msgs[i])
+            if len(self._transitions) >= _MAX_TRANSITIONS:
+                self._transitions.clear()
+            self._transitions[key] = msgs
+        self.midi.send_batch(msgs)
+        self.active = new
+        self.switches += 1
+        turned_off = old & ~new
+        for i in _bits(turned_off):
+            if self._cooldown[i] > 0.0:
+                t = now + self._cooldown[i]
+                self._blocked_until[i] = t
+                self.blocked |= 1 << i
+                if t < self._next_expiry:
+                    self._next_expiry = t
+        player_logger.info("[SCENES] on=%s off=%s", [self.rules[i].name for i in _bits(new & ~old)],
+                           [self.rules[i].name for i in _bits(turned_off)])
+
+    def active_names(self) -> List[str]:
+        return [self.rules[i].name for i in _bits(self.active)]
+
+    def resend(self):
+        """Состояние всех сцен одной пачкой (после переподключения порта): выключенные — off, включённые — on."""
+        off = ((1 << len(self.rules)) - 1) & ~self.active
+        self.midi.send_batch(tuple(m for i in _bits(off) for m in self._off_msgs[i]) +
+                             tuple(m for i in _bits(self.active) for m in self._on_msgs[i]))
+
+    def all_off(self):
+        if self.active:
+            self.wanted = 0
+            self._switch(0, self._now)
@@ -0,0 +1,230 @@
+import time
+from multiprocessing import shared_memory
+from typing import List, Optional
+import numpy as np
+
+# заголовок: int64-ячейки; каждую пишет только одна сторона
+H_WRITE = 0        # производитель: номер следующего блока
+H_READ = 1         # потребитель: номер первого не отданного блока
+                   # ячейка 2 — резерв
+H_OVERRUNS = 3     # производитель: блоки, отброшенные из-за переполнения
+H_CALLBACKS = 4    # процесс захвата: счётчики callback'а (публикуются периодически)
+H_STATUS = 5
+H_OVERFLOWS = 6
+H_UNDERFLOWS = 7
+H_CAPACITY = 8
+H_BLOCKSIZE = 9
+H_CHANNELS = 10    # ширина chan_ms (0 — нет)
+_HDR_SLOTS = 16
+
+
+def _layout(capacity: int, blocksize: int, channels: int = 0):
+    off = _HDR_SLOTS * 8
+    parts = {}
+    for name, dtype in (("seq", np.int64), ("lengths", np.int64), ("adc_time", np.float64),
+                        ("cb_time", np.float64), ("cb_perf", np.float64)):
+        parts[name] = (off, dtype, (capacity,))
+        off += capacity * 8
+    parts["buf"] = (off, np.float32, (capacity, blocksize))
+    off += capacity * blocksize * 4
+    if channels:
+        parts["chan_ms"] = (off, np.float32, (capacity, channels))
+        off += capacity * channels * 4
+    return parts, off
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)   # Python 3.13+
+    except TypeError:
+        # до 3.13: процесс, запущенный через spawn, делит resource_tracker с создателем —
+        # повторная регистрация того же имени безвредна, удаляет сегмент создатель
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedBlockRing:
+    """
+    BlockRing в multiprocessing.shared_memory: производитель — процесс захвата, потребитель —
+    процесс управления. Интерфейс тот же (acquire/commit, read/read_many/release, отметки времени
+    по слотам), так что AudioStream пишет в него из callback без изменений, а основной цикл
+    читает view на слоты без копирования.
+
+    Индексы — монотонные номера блоков в заголовке, каждый пишет только своя сторона; у слота
+    есть номер блока (seq), который производитель ставит последним — читатель отдаёт слот,
+    только когда seq совпал. Производитель не перезаписывает непрочитанное: при полном кольце
+    блок отбрасывается и учитывается в overruns, как в BlockRing. Читателя будит межпроцессный
+    BoundedSemaphore(1): производитель отпускает его на каждый блок, читатель сбрасывает лишнее.
+    Флаг "читатель ждёт" в общей памяти без барьера мог потерять пробуждение — семафор нет.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, capacity: int, blocksize: int, wakeup=None,
+                 owner: bool = False, channels: int = 0):
+        self.shm = shm
+        self.capacity = capacity
+        self.blocksize = blocksize
+        self.wakeup = wakeup
+        self._owner = owner
+        self.hdr = np.ndarray((_HDR_SLOTS,), dtype=np.int64, buffer=shm.buf)
+        self.chan_ms: Optional[np.ndarray] = None
+        parts, _ = _layout(capacity, blocksize, channels)
+        for name, (off, dtype, shape) in parts.items():
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=off))
+        self._rows: List[np.ndarray] = [self.buf[i] for i in range(capacity)]
+        self._ms_rows: List[np.ndarray] = [self.chan_ms[i] for i in range(capacity)] if channels else []
+        self._write = int(self.hdr[H_WRITE])   # копия номера у производителя
+        self._held = 0
+
+    @classmethod
+    def create(cls, capacity: int, blocksize: int, wakeup=None, channels: int = 0) -> "SharedBlockRing":
+        if capacity < 2:
+            raise ValueError("SharedBlockRing capacity must be >= 2")
+        _, size = _layout(capacity, blocksize, channels)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        ring = cls(shm, capacity, blocksize, wakeup, owner=True, channels=channels)
+        ring.hdr[:] = 0
+        ring.seq[:] = -1
+        ring.lengths[:] = blocksize
+        ring.hdr[H_CAPACITY] = capacity
+        ring.hdr[H_BLOCKSIZE] = blocksize
+        ring.hdr[H_CHANNELS] = channels
+        return ring
+
+    @classmethod
+    def attach(cls, name: str, capacity: int, blocksize: int, wakeup=None, channels: int = 0) -> "SharedBlockRing":
+        ring = cls(_attach_shm(name), capacity, blocksize, wakeup, channels=channels)
+        if (int(ring.hdr[H_CAPACITY]) != capacity or int(ring.hdr[H_BLOCKSIZE]) != blocksize
+                or int(ring.hdr[H_CHANNELS]) != channels):
+            ring.close()
+            raise RuntimeError(f"Shared ring {name} layout mismatch")
+        return ring
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def overruns(self) -> int:
+        return int(self.hdr[H_OVERRUNS])
+
+    def publish_stats(self, callbacks: int, status: int, overflows: int, underflows: int):
+        h = self.hdr
+        h[H_CALLBACKS] = callbacks
+        h[H_STATUS] = status
+        h[H_OVERFLOWS] = overflows
+        h[H_UNDERFLOWS] = underflows
+
+    # --- производитель ---
+
+    def acquire(self) -> Optional[np.ndarray]:
+        if self._write - int(self.hdr[H_READ]) >= self.capacity:
+            self.hdr[H_OVERRUNS] += 1
+            return None
+        return self._rows[self._write % self.capacity]
+
+    def chan_ms_slot(self) -> np.ndarray:
+        return self._ms_rows[self._write % self.capacity]
+
+    def commit(self, frames: int, adc_time: float = 0.0, cb_time: float = 0.0, cb_perf: float = 0.0):
+        w = self._write
+        i = w % self.capacity
+        self.lengths[i] = frames
+        self.adc_time[i] = adc_time
+        self.cb_time[i] = cb_time
+        self.cb_perf[i] = cb_perf
+        self.seq[i] = w
+        self._write = w + 1
+        self.hdr[H_WRITE] = w + 1
+        if self.wakeup is not None:
+            try:
+                self.wakeup.release()
+            except ValueError:
+                pass  # разрешение уже лежит (BoundedSemaphore) — читатель проснётся по нему
+
+    def head(self) -> int:
+        """Сколько блоков записано всего (номер следующего блока)."""
+        return int(self.hdr[H_WRITE])
+
+    # --- потребитель ---
+
+    def pending(self) -> int:
+        return int(self.hdr[H_WRITE]) - int(self.hdr[H_READ]) - self._held
+
+    def consumed(self) -> int:
+        return int(self.hdr[H_READ]) + self._held
+
+    def release(self):
+        if self._held:
+            self.hdr[H_READ] += self._held
+            self._held = 0
+
+    def _wait(self, deadline: Optional[float]) -> bool:
+        """Ждать, пока появится блок; False — истёк таймаут."""
+        h = self.hdr
+        while int(h[H_WRITE]) == int(h[H_READ]):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            if self.wakeup is not None:
+                self.wakeup.acquire(timeout=remaining)
+            else:
+                time.sleep(0.0005 if remaining is None else min(0.0005, remaining))
+        if self.wakeup is not None:
+            # разрешения за блоки, которые уже видны, — сбросить, иначе следующий _wait
+            # проснётся впустую; разрешение от более позднего commit придёт заново
+            while self.wakeup.acquire(False):
+                pass
+        return True
+
+    def read(self, timeout: Optional[float] = None) -> Optional[np.ndarray]:
+        self.release()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._wait(deadline):
+            return None
+        r = int(self.hdr[H_READ])
+        i = r % self.capacity
+        while int(self.seq[i]) != r:
+            # номер блока виден раньше данных слота (слабый порядок записи) — ждём производителя
+            time.sleep(0)
+        self._held = 1
+        n = int(self.lengths[i])
+        row = self._rows[i]
+        return row if n == self.blocksize else row[:n]
+
+    def current_slot(self) -> int:
+        return int(self.hdr[H_READ]) % self.capacity
+
+    def held_chan_ms(self) -> np.ndarray:
+        i0 = self.current_slot()
+        return self.chan_ms[i0:i0 + self._held]
+
+    def read_many(self, max_blocks: int) -> np.ndarray:
+        self.release()
+        r = int(self.hdr[H_READ])
+        i0 = r % self.capacity
+        n = min(int(self.hdr[H_WRITE]) - r, self.capacity - i0, max_blocks)
+        if n > 0:
+            # отдаём только слоты, у которых номер блока уже проставлен
+            ready = self.seq[i0:i0 + n] == np.arange(r, r + n)
+            if not ready.all():
+                n = int(np.argmin(ready))
+            short = np.flatnonzero(self.lengths[i0:i0 + n] != self.blocksize)
+            if len(short):
+                n = int(short[0])
+        self._held = n
+        return self.buf[i0:i0 + n]
+
+    def close(self):
+        # view на общую память держат буфер — без них shm.close() бросит BufferError
+        self._rows = []
+        self._ms_rows = []
+        for name in ("hdr", "seq", "lengths", "adc_time", "cb_time", "cb_perf", "buf", "chan_ms"):
+            setattr(self, name, None)
+        if self._owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # у кого-то ещё остался view (например, блок из read()) — отображение снимется со сборкой мусора
@@ -0,0 +1,81 @@
+import math
+from typing import List
+import numpy as np
+
+
+def rescale_alpha(alpha: float, ref_samples: int, step_samples: int) -> float:
+    """
+    Коэффициент EMA, подобранный под блок ref_samples, для шага step_samples:
+    та же постоянная времени в секундах при более частых обновлениях.
+    """
+    if alpha >= 1.0:
+        return 1.0
+    return 1.0 - (1.0 - alpha) ** (step_samples / float(ref_samples))
+
+
+class SlidingRms:
+    """
+    RMS по последним window отсчётам, выдаётся каждые hop отсчётов (window кратно hop).
+
+    Для каждого hop'а хранится сумма квадратов в кольце из window/hop значений; энергия окна —
+    бегущая сумма: на новом hop'е прибавляется его сумма и вычитается выпавшая. Окно не
+    пересчитывается, на hop — одно скалярное произведение по hop отсчётам. Раз за оборот кольца
+    сумма пересобирается заново, чтобы не копилась ошибка округления.
+    """
+
+    def __init__(self, window: int, hop: int):
+        if hop <= 0 or window <= 0 or window % hop:
+            raise ValueError(f"Sliding RMS needs window to be a positive multiple of hop, got {window}/{hop}")
+        self.window = window
+        self.hop = hop
+        self.n_hops = window // hop
+        self._sums: List[float] = [0.0] * self.n_hops
+        self._i = 0
+        self._total = 0.0
+        self._filled = 0          # сколько hop'ов уже в окне (до заполнения делим на фактическую длину)
+        self._partial = 0.0       # сумма квадратов недобранного hop'а
+        self._partial_n = 0
+
+    def _commit(self, s: float) -> float:
+        i = self._i
+        self._total += s - self._sums[i]
+        self._sums[i] = s
+        i += 1
+        if i == self.n_hops:
+            i = 0
+            self._total = math.fsum(self._sums)
+        self._i = i
+        if self._filled < self.n_hops:
+            self._filled += 1
+        return math.sqrt(max(self._total, 0.0) / (self._filled * self.hop)) + 1e-12
+
+    def push(self, samples: np.ndarray) -> List[float]:
+        """Блок любой длины; RMS окна на каждый завершённый в нём hop."""
+        n = len(samples)
+        hop = self.hop
+        if n == hop and self._partial_n == 0:
+            # основной случай: блок устройства равен hop'у
+            return [self._commit(float(np.dot(samples, samples)))]
+        out: List[float] = []
+        pos = 0
+        while pos < n:
+            take = min(hop - self._partial_n, n - pos)
+            seg = samples[pos:pos + take]
+            self._partial += float(np.dot(seg, seg))
+            self._partial_n += take
+            pos += take
+            if self._partial_n == hop:
+                out.append(self._commit(self._partial))
+                self._partial = 0.0
+                self._partial_n = 0
+        return out
+
+    def push_many(self, blocks: np.ndarray) -> np.ndarray:
+        """
+        Пакет блоков (n_blocks, blocksize) — RMS окна на каждый завершённый hop. Суммы квадратов —
+        тем же np.dot в типе блока, что и push(): результат совпадает с поблочным бит в бит.
+        """
+        out: List[float] = []
+        for row in blocks:
+            out.extend(self.push(row))
+        return np.asarray(out, dtype=np.float64)
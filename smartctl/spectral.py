@@ -0,0 +1,165 @@
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+from smartctl.detectors import LevelConfig, LevelDetector
+
+try:
+    np.fft.rfft(np.zeros(8, dtype=np.float32), out=np.empty(5, dtype=np.complex64))
+    _RFFT_HAS_OUT = True
+except TypeError:
+    # NumPy < 2.0: rfft без out= и всегда в complex128
+    _RFFT_HAS_OUT = False
+
+
+class HopFramer:
+    """
+    Скользящее окно длины n с шагом hop поверх блоков произвольной длины. Данные лежат в
+    линейном буфере: пишем вперёд, кадр — view на последние n отсчётов, а хвост переносится
+    в начало только раз в несколько десятков hop'ов.
+    """
+
+    def __init__(self, n: int, hop: int):
+        if hop <= 0 or hop > n:
+            raise ValueError(f"hop must be in 1..n, got hop={hop} n={n}")
+        self.n = n
+        self.hop = hop
+        self._buf = np.zeros(n + 32 * hop, dtype=np.float32)
+        self._pos = n
+        self._fill = 0
+
+    def frame(self) -> np.ndarray:
+        return self._buf[self._pos - self.n:self._pos]
+
+    def push(self, samples: np.ndarray):
+        """Генератор: дописывает samples и отдаёт позицию в samples после каждого полного hop."""
+        hop = self.hop
+        n = len(samples)
+        i = 0
+        while i < n:
+            if self._pos + hop > len(self._buf):
+                self._buf[:self.n + self._fill] = self._buf[self._pos - self.n:self._pos + self._fill]
+                self._pos = self.n
+            take = min(hop - self._fill, n - i)
+            w = self._pos + self._fill
+            self._buf[w:w + take] = samples[i:i + take]
+            self._fill += take
+            i += take
+            if self._fill == hop:
+                self._pos += hop
+                self._fill = 0
+                yield i
+
+
+@dataclass
+class BandSpec:
+    name: str
+    lo_hz: float
+    hi_hz: float
+
+
+@dataclass
+class SpectralConfig:
+    n_fft: int = 1024
+    hop: int = 256
+    bands: List[BandSpec] = field(default_factory=list)
+
+
+class SpectralDetector:
+    """
+    Энергии полос (sub/bass/mid/high, ...) по скользящему окну n_fft с шагом hop.
+    Окно, границы полос и буферы rfft считаются один раз, на каждый hop — один rfft
+    и одна сумма по полосам (np.add.reduceat). Уровень каждой полосы идёт в свой
+    LevelDetector, поэтому к полосе подключаются обычные OnOffFSM и SceneController.
+    """
+
+    def __init__(self, cfg: SpectralConfig, samplerate: int, band_level_cfgs: Dict[str, LevelConfig],
+                 clock: Callable[[], float] = time.time):
+        if not cfg.bands:
+            raise ValueError("Spectral detector needs at least one band")
+        self.cfg = cfg
+        self.sr = samplerate
+        self.clock = clock
+        n = cfg.n_fft
+        n_bins = n // 2 + 1
+
+        self.window = np.hanning(n).astype(np.float32)
+        # Парсеваль: RMS полосы в тех же единицах, что и RMS блока у LevelDetector
+        self._norm = np.float32(2.0 / (n * float(np.sum(self.window.astype(np.float64) ** 2))))
+
+        # границы полос в бинах; пары [start, stop) подряд для reduceat, берём каждую вторую сумму
+        freqs = np.fft.rfftfreq(n, 1.0 / samplerate)
+        idx: List[int] = []
+        self.band_names: List[str] = []
+        for b in cfg.bands:
+            lo = int(np.searchsorted(freqs, b.lo_hz, side="left"))
+            hi = int(np.searchsorted(freqs, b.hi_hz, side="left"))
+            if hi <= lo:
+                raise ValueError(f"Band '{b.name}' ({b.lo_hz}-{b.hi_hz} Hz) has no FFT bins at n_fft={n}")
+            idx.extend((lo, hi))
+            self.band_names.append(b.name)
+        self._idx = np.asarray(idx, dtype=np.intp)
+
+        self._windowed = np.empty(n, dtype=np.float32)
+        self._spec = np.empty(n_bins, dtype=np.complex64)
+        self._re = self._spec.real
+        self._im = self._spec.imag
+        # +1 нулевой бин в конце: stop последней полосы может указывать за край спектра
+        self._power_buf = np.zeros(n_bins + 1, dtype=np.float32)
+        self.power = self._power_buf[:n_bins]
+        self._tmp = np.empty(n_bins, dtype=np.float32)
+        self._sums = np.empty(len(idx), dtype=np.float32)
+        self._band_sums = self._sums[0::2]
+        self.levels = np.zeros(len(cfg.bands), dtype=np.float32)
+
+        self.framer = HopFramer(n, cfg.hop)
+
+        self.detectors: Dict[str, LevelDetector] = {
+            name: LevelDetector(band_level_cfgs[name], clock=clock) for name in self.band_names
+        }
+        self._dets = [self.detectors[name] for name in self.band_names]
+
+    def analyze(self, frame: np.ndarray) -> np.ndarray:
+        """RMS каждой полосы для кадра длины n_fft (результат — в self.levels)."""
+        np.multiply(frame, self.window, out=self._windowed)
+        if _RFFT_HAS_OUT:
+            np.fft.rfft(self._windowed, out=self._spec)
+            np.multiply(self._re, self._re, out=self.power)
+            np.multiply(self._im, self._im, out=self._tmp)
+            np.add(self.power, self._tmp, out=self.power)
+        else:
+            spec = np.fft.rfft(self._windowed)
+            np.abs(spec, out=self._tmp, casting="unsafe")
+            np.multiply(self._tmp, self._tmp, out=self.power)
+        np.add.reduceat(self._power_buf, self._idx, out=self._sums)
+        np.multiply(self._band_sums, self._norm, out=self.levels)
+        np.sqrt(self.levels, out=self.levels)
+        return self.levels
+
+    def calibrate(self, samples: np.ndarray):
+        # калибровка базовых линий полос: каждый полный кадр — один шаг calibrate_value
+        for _ in self.framer.push(samples):
+            levels = self.analyze(self.framer.frame())
+            for det, v in zip(self._dets, levels.tolist()):
+                det.calibrate_value(v + 1e-12)
+
+    def update(self, frame: np.ndarray, now: Optional[float] = None) -> Dict[str, dict]:
+        levels = self.analyze(frame)
+        if now is None:
+            now = self.clock()
+        return {det_name: det.update_value(v + 1e-12, now)
+                for det_name, det, v in zip(self.band_names, self._dets, levels.tolist())}
+
+    def feed(self, samples: np.ndarray, now: Optional[float] = None) -> List[Dict[str, dict]]:
+        """
+        Принимает блок любой длины, на каждый накопленный hop возвращает результат update().
+        now — время конца блока; времена отдельных hop'ов отсчитываются от него назад.
+        """
+        if now is None:
+            now = self.clock()
+        n = len(samples)
+        out = []
+        for end in self.framer.push(samples):
+            out.append(self.update(self.framer.frame(), now - (n - end) / self.sr))
+        return out
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+player_logger = logging.getLogger("player")
+
+
+def load_cache(path: str) -> Dict[str, Any]:
+    """Кэш прошлого запуска (устройства, калибровка); битый или отсутствующий файл — пустой кэш."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path: str, cache: Dict[str, Any]):
+    try:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=1)
+        os.replace(tmp, path)
+    except OSError as e:
+        player_logger.warning("[Startup] cache not saved to %s: %s", path, e)
+
+
+def hint(cache: Dict[str, Any], section: str, wanted: Optional[str]) -> Optional[Tuple[int, str]]:
+    """(индекс, имя) из кэша, если он записан для той же подстроки имени."""
+    c = cache.get(section) or {}
+    if c.get("name_contains") != wanted or c.get("index") is None or not c.get("name"):
+        return None
+    return int(c["index"]), c["name"]
+
+
+def remember_device(cache: Dict[str, Any], section: str, wanted: Optional[str], index: Optional[int],
+                    name: Optional[str]):
+    if index is not None and name:
+        cache[section] = {"name_contains": wanted, "index": index, "name": name}
+
+
+def calibration_key(cfg: dict) -> Dict[str, Any]:
+    """От чего зависит baseline: устройство и то, как нарезаны блоки."""
+    a = cfg["audio"]
+    h = cfg["hop_mode"]
+    return {
+        "device_index": a.get("device_index"),
+        "device_name_contains": a.get("device_name_contains"),
+        "samplerate": a["samplerate"],
+        "channels": a["channels"],
+        "blocksize": a["blocksize"],
+        "hop": int(h["hop"]) if h.get("enabled") else None,
+        "bands": [b["name"] for b in cfg["spectral"]["bands"]] if cfg["spectral"].get("enabled") else [],
+        "zones": [[z.get("name"), z.get("channels")] for z in cfg["zones"]["groups"]]
+        if cfg["zones"].get("enabled") else [],
+    }
+
+
+def cached_calibration(cache: Dict[str, Any], cfg: dict, max_age_seconds: float,
+                       now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Сохранённая калибровка, если она для того же устройства/нарезки и не старше max_age_seconds."""
+    c = cache.get("calibration") or {}
+    if c.get("key") != calibration_key(cfg) or c.get("baseline") is None:
+        return None
+    age = (time.time() if now is None else now) - float(c.get("time", 0.0))
+    if age < 0 or age > max_age_seconds:
+        return None
+    return dict(c, age=age)
+
+
+def remember_calibration(cache: Dict[str, Any], cfg: dict, baseline: float, bands: Dict[str, float],
+                         zones: Optional[Dict[str, float]] = None, now: Optional[float] = None):
+    cache["calibration"] = {
+        "key": calibration_key(cfg),
+        "time": time.time() if now is None else now,
+        "baseline": baseline,
+        "bands": bands,
+        "zones": zones or {},
+    }
+
+
+class StartupTimer:
+    """Отметки этапов старта от t0 (perf_counter) — для строки [Startup] в логе."""
+
+    def __init__(self, t0: float):
+        self.t0 = t0
+        self._last = t0
+        self.phases: List[Tuple[str, float]] = []
+
+    def mark(self, name: str):
+        t = time.perf_counter()
+        self.phases.append((name, t - self._last))
+        self._last = t
+
+    @property
+    def total(self) -> float:
+        return self._last - self.t0
+
+    def format(self) -> str:
+        parts = " ".join(f"{n}={dt * 1e3:.1f}ms" for n, dt in self.phases)
+        return f"live in {self.total * 1e3:.1f}ms: {parts}"
@@ -13,36 +13,55 @@ class FSMConfig:
     calibration_seconds: float
 
 class OnOffFSM:
-    def __init__(self, cfg: FSMConfig):
+    def __init__(self, cfg: FSMConfig, clock: Callable[[], float] = time.time):
         self.cfg = cfg
+        self.clock = clock
         self.state: StateName = "OFF"
-        self.since: float = time.time()
+        self.since: float = clock()
+        self.transitions_on = 0
+        self.transitions_off = 0
 
-    def _can_switch(self, min_hold_s: float) -> bool:
-        return (time.time() - self.since) >= min_hold_s
+    def _can_switch(self, min_hold_s: float, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = self.clock()
+        return (now - self.since) >= min_hold_s
 
     def step(self, level_state, level_info, on_event: Callable[[], None], off_event: Callable[[], None]):
-        now = level_info["now"]
+        self._decide(level_info["now"], level_state.started_at, level_state.above_since, level_state.below_since,
+                     on_event, off_event)
+
+    def step_batch(self, level_state, batch_info, on_event: Callable[[], None], off_event: Callable[[], None]):
+        """Прогон FSM по результату LevelDetector.update_batch — блок за блоком, как step()."""
         started_at = level_state.started_at
+        nows = batch_info["now"].tolist()
+        above = batch_info["above_since"].tolist()
+        below = batch_info["below_since"].tolist()
+        for now, a, b in zip(nows, above, below):
+            # NaN != NaN: так отметка "не задана" превращается в None
+            self._decide(now, started_at, a if a == a else None, b if b == b else None, on_event, off_event)
 
+    def _decide(self, now: float, started_at: float, above_since: Optional[float], below_since: Optional[float],
+                on_event: Callable[[], None], off_event: Callable[[], None]):
         # фаза калибровки и стартовая задержка
         if (now - started_at) < (self.cfg.calibration_seconds + self.cfg.startup_grace_seconds):
             return  # ничего не делаем
 
         # активная зона (выше on_th) — включаем, если выдержали min_off и есть активность
-        if level_state.above_since is not None:
-            if (now - level_state.above_since) >= 0.05:  # короткий антидребезг
-                if self.state == "OFF" and self._can_switch(self.cfg.min_off_seconds):
+        if above_since is not None:
+            if (now - above_since) >= 0.05:  # короткий антидребезг
+                if self.state == "OFF" and self._can_switch(self.cfg.min_off_seconds, now):
                     self.state = "ON"
                     self.since = now
+                    self.transitions_on += 1
                     on_event()
             return
 
         # “тишина” (ниже off_th) — выключаем, если держится достаточно
-        if level_state.below_since is not None:
-            if (now - level_state.below_since) >= self.cfg.silence_hold_seconds:
-                if self.state == "ON" and self._can_switch(self.cfg.min_on_seconds):
+        if below_since is not None:
+            if (now - below_since) >= self.cfg.silence_hold_seconds:
+                if self.state == "ON" and self._can_switch(self.cfg.min_on_seconds, now):
                     self.state = "OFF"
                     self.since = now
+                    self.transitions_off += 1
                     off_event()
             return
\ No newline at end of file
@@ -0,0 +1,97 @@
+import logging
+import os
+import threading
+from typing import Optional
+import numpy as np
+
+audio_logger = logging.getLogger("audio_diag")
+
+# Одна запись на блок: 25 байт против ~60 байт текстовой строки лога
+TELEMETRY_DTYPE = np.dtype([
+    ("t", "<f8"),
+    ("rms", "<f4"),
+    ("smooth", "<f4"),
+    ("on_th", "<f4"),
+    ("off_th", "<f4"),
+    ("on", "u1"),
+])
+
+
+class TelemetryRing:
+    """
+    Покадровая телеметрия детектора в памяти: кольцо структурированных записей фиксированного
+    размера, запись — одно присваивание строки. На диск попадает только по запросу (dump)
+    в виде .npy — читается np.load(path) и сразу даёт массив с полями t/rms/smooth/on_th/off_th/on.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError(f"Telemetry ring capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self.buf = np.zeros(capacity, dtype=TELEMETRY_DTYPE)
+        self.written = 0
+        self._dump_thread: Optional[threading.Thread] = None
+
+    def record(self, now: float, rms: float, smooth: float, on_th: float, off_th: float, on: bool):
+        self.buf[self.written % self.capacity] = (now, rms, smooth, on_th, off_th, on)
+        self.written += 1
+
+    def record_batch(self, batch_info: dict, on: bool):
+        """
+        Результат LevelDetector.update_batch; состояние FSM известно только на конец пакета.
+        Пороги — числа на весь пакет или массивы по блокам (с noise_floor).
+        """
+        k = len(batch_info["now"])
+        if k == 0:
+            return
+        start = self.written
+        if k > self.capacity:
+            start += k - self.capacity
+            sl = slice(k - self.capacity, k)
+        else:
+            sl = slice(0, k)
+        idx = np.arange(start, self.written + k) % self.capacity
+        for name in ("rms", "smooth"):
+            self.buf[name][idx] = batch_info[name][sl]
+        for name in ("on_th", "off_th"):
+            th = batch_info[name]
+            self.buf[name][idx] = th[sl] if isinstance(th, np.ndarray) else th
+        self.buf["t"][idx] = batch_info["now"][sl]
+        self.buf["on"][idx] = on
+        self.written += k
+
+    def snapshot(self) -> np.ndarray:
+        """Копия содержимого в хронологическом порядке."""
+        if self.written <= self.capacity:
+            return self.buf[:self.written].copy()
+        i = self.written % self.capacity
+        return np.concatenate((self.buf[i:], self.buf[:i]))
+
+    def dump(self, path: str) -> int:
+        snap = self.snapshot()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.save(path, snap)
+        return len(snap)
+
+    def dump_async(self, path: str):
+        """Снимок берётся сразу (копия), запись на диск — в фоновом потоке."""
+        if self._dump_thread is not None and self._dump_thread.is_alive():
+            audio_logger.warning("[Telemetry] dump already in progress, request ignored")
+            return
+        snap = self.snapshot()
+
+        def _write():
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                np.save(path, snap)
+                audio_logger.info("[Telemetry] dumped %d block(s) to %s", len(snap), path)
+            except OSError as e:
+                audio_logger.error("[Telemetry] dump to %s failed: %s", path, e)
+
+        self._dump_thread = threading.Thread(target=_write, name="telemetry-dump", daemon=True)
+        self._dump_thread.start()
+
+    def join(self, timeout: float = 2.0):
+        if self._dump_thread is not None:
+            self._dump_thread.join(timeout=timeout)
+            self._dump_thread = None
@@ -0,0 +1,189 @@
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+from smartctl.detectors import LevelConfig
+from smartctl.state_machine import FSMConfig
+
+# антидребезг включения — как в OnOffFSM
+_ON_DEBOUNCE_S = 0.05
+
+
+@dataclass
+class ZoneSpec:
+    name: str
+    channels: List[int]    # индексы входных каналов с 0; уровень зоны — RMS по всем её каналам
+
+
+class ZoneDetector:
+    """
+    LevelDetector + OnOffFSM сразу для всех зон многоканального входа. Вход — средний квадрат
+    каждого канала за блок (AudioStream.channel_ms); средний квадрат зоны — одно умножение на
+    матрицу (каналы x зоны).
+
+    RMS, EMA, пороги и решение FSM — короткий цикл по числам Python: над массивами из 1-16
+    элементов каждый ufunc и .any() стоят около микросекунды, и векторный шаг (~15 мкс) был
+    медленнее отдельных детекторов вплоть до 4 зон. Пороги меняются только при калибровке и
+    перезагрузке — цикл берёт их из готовых списков. Замер benchmarks/bench_zones (блок 1024):
+    ~3.5 мкс на 1 зону, ~6 на 8, ~9 на 16 против 6, 20 и 45 мкс у отдельных LevelDetector +
+    OnOffFSM; цена растёт примерно на 0.4 мкс на зону.
+
+    Пороги и ema_alpha — свои у каждой зоны (LevelConfig), тайминги FSM общие.
+    Baseline зоны — EMA калибровки, как у LevelDetector; noise_floor для зон не ведётся.
+    """
+
+    def __init__(self, zones: List[ZoneSpec], n_channels: int, level_cfgs: List[LevelConfig],
+                 fsm_cfg: FSMConfig, clock: Callable[[], float] = time.time):
+        if not zones:
+            raise ValueError("Zone detector needs at least one zone")
+        if len(level_cfgs) != len(zones):
+            raise ValueError("Zone detector needs one LevelConfig per zone")
+        self.names = [z.name for z in zones]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError(f"Duplicate zone names: {self.names}")
+        n = len(zones)
+        self.weights = np.zeros((n_channels, n), dtype=np.float32)
+        for j, z in enumerate(zones):
+            if not z.channels:
+                raise ValueError(f"Zone '{z.name}' has no channels")
+            for c in z.channels:
+                if not 0 <= c < n_channels:
+                    raise ValueError(f"Zone '{z.name}' channel {c + 1} is outside 1..{n_channels}")
+            self.weights[z.channels, j] = 1.0 / len(z.channels)
+        self.fsm_cfg = fsm_cfg
+        self.clock = clock
+        self.baseline = np.full(n, np.nan)
+        self.set_level_cfgs(level_cfgs)
+
+        # уровень и состояние FSM — списки: шаг читает и пишет их поэлементно
+        self.smooth = [0.0] * n
+        # +1 — выше on_th, -1 — ниже off_th, 0 — ещё ни разу не выходил из гистерезиса;
+        # regime_since — когда зона вошла в текущий режим (above_since/below_since LevelDetector'а)
+        self.regime = [0] * n
+        self.regime_since = [0.0] * n
+        self.on = [False] * n
+        self.since = [clock()] * n
+        self.started_at = clock()
+        self.transitions_on = [0] * n
+        self.transitions_off = [0] * n
+        # буферы шага
+        self._ms = np.zeros(n, dtype=np.float32)
+        self.rms = np.zeros(n)
+        self._tmp = np.zeros(n)
+
+    def set_level_cfgs(self, level_cfgs: List[LevelConfig]):
+        """Пороги и ema_alpha зон (при перезагрузке конфига — без потери калибровки и состояния)."""
+        if len(level_cfgs) != len(self.names):
+            raise ValueError("Zone detector needs one LevelConfig per zone")
+        self.cfgs = level_cfgs
+
+        def col(name):
+            return np.array([getattr(c, name) for c in level_cfgs], dtype=np.float64)
+
+        self._alpha_l = [c.ema_alpha for c in level_cfgs]
+        self._beta_l = [1.0 - a for a in self._alpha_l]
+        self._dynamic = np.array([c.dynamic_threshold for c in level_cfgs])
+        self._on_mult, self._off_mult = col("on_multiplier"), col("off_multiplier")
+        self._min_on_th, self._min_off_th = col("min_on_threshold"), col("min_off_threshold")
+        self._fixed_on, self._fixed_off = col("on_threshold"), col("off_threshold")
+        self._calib_s = max(c.calibration_seconds for c in level_cfgs)
+        self.on_th = np.empty(len(level_cfgs))
+        self.off_th = np.empty(len(level_cfgs))
+        self._update_thresholds()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _levels(self, chan_ms: np.ndarray) -> np.ndarray:
+        np.dot(chan_ms, self.weights, out=self._ms)
+        np.sqrt(self._ms, out=self.rms, dtype=np.float64)
+        self.rms += 1e-12
+        return self.rms
+
+    def _update_thresholds(self):
+        fixed = ~self._dynamic | np.isnan(self.baseline)
+        np.multiply(self.baseline, self._on_mult, out=self.on_th)
+        np.maximum(self._min_on_th, self.on_th, out=self.on_th)
+        np.copyto(self.on_th, self._fixed_on, where=fixed)
+        np.multiply(self.baseline, self._off_mult, out=self.off_th)
+        np.maximum(self._min_off_th, self.off_th, out=self.off_th)
+        np.copyto(self.off_th, self._fixed_off, where=fixed)
+        self._on_th = self.on_th.tolist()
+        self._off_th = self.off_th.tolist()
+
+    def calibrate_step(self, chan_ms: np.ndarray):
+        rms = self._levels(chan_ms)
+        # EMA калибровки тем же выражением, что и LevelDetector: 0.9*baseline + 0.1*rms
+        fresh = np.isnan(self.baseline)
+        self.baseline *= 0.9
+        np.multiply(0.1, rms, out=self._tmp)
+        self.baseline += self._tmp
+        np.copyto(self.baseline, rms, where=fresh)
+        self._update_thresholds()
+
+    def warm_start(self, baselines: Dict[str, float]):
+        """Baseline зон из прошлой калибровки (как LevelDetector.warm_start)."""
+        for j, name in enumerate(self.names):
+            if name in baselines:
+                self.baseline[j] = float(baselines[name])
+        self._update_thresholds()
+        self.started_at = self.clock() - self._calib_s
+
+    def baselines(self) -> Dict[str, float]:
+        return {name: float(b) for name, b in zip(self.names, self.baseline) if not math.isnan(b)}
+
+    def update(self, chan_ms: np.ndarray, on_event: Callable[[int], None], off_event: Callable[[int], None],
+               now: Optional[float] = None):
+        """Шаг по одному блоку: chan_ms — (channels,); on_event/off_event получают номер зоны."""
+        if now is None:
+            now = self.clock()
+        np.dot(chan_ms, self.weights, out=self._ms)
+        smooth, alpha, beta = self.smooth, self._alpha_l, self._beta_l
+        regime, regime_since, on, since = self.regime, self.regime_since, self.on, self.since
+        on_th, off_th = self._on_th, self._off_th
+        live = now - self.started_at >= self._calib_s + self.fsm_cfg.startup_grace_seconds
+        cfg = self.fsm_cfg
+        for j, ms in enumerate(self._ms.tolist()):
+            # RMS и EMA теми же выражениями, что и LevelDetector: a*rms + (1-a)*smooth
+            v = alpha[j] * (math.sqrt(ms) + 1e-12) + beta[j] * smooth[j]
+            smooth[j] = v
+            # в гистерезисе режим не меняется; выше on_th — приоритетнее
+            if v > on_th[j]:
+                if regime[j] != 1:
+                    regime[j] = 1
+                    regime_since[j] = now
+            elif v < off_th[j]:
+                if regime[j] != -1:
+                    regime[j] = -1
+                    regime_since[j] = now
+            # фаза калибровки и стартовая задержка; кандидат — зона в режиме, противоположном состоянию
+            if not live or regime[j] != (-1 if on[j] else 1):
+                continue
+            in_regime = now - regime_since[j]
+            held = now - since[j]
+            if on[j]:
+                # тишина держится silence_hold и сцена горела не меньше min_on
+                if in_regime < cfg.silence_hold_seconds or held < cfg.min_on_seconds:
+                    continue
+                on[j] = False
+                self.transitions_off[j] += 1
+                since[j] = now
+                off_event(j)
+            else:
+                # короткий антидребезг и пауза не меньше min_off
+                if in_regime < _ON_DEBOUNCE_S or held < cfg.min_off_seconds:
+                    continue
+                on[j] = True
+                self.transitions_on[j] += 1
+                since[j] = now
+                on_event(j)
+
+    def update_many(self, chan_ms: np.ndarray, on_event: Callable[[int], None], off_event: Callable[[int], None],
+                    times: Optional[np.ndarray] = None):
+        """Пакет блоков (n, channels) при догоняющей обработке; times — момент каждого блока (по умолчанию clock())."""
+        if times is None:
+            times = np.full(len(chan_ms), self.clock())
+        for row, now in zip(chan_ms, times.tolist()):
+            self.update(row, on_event, off_event, now)